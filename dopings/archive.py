@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import os
+import json
+import mmap
+import numpy as np
+from pathlib import Path
+
+from dopings.structure import Structure
+from dopings.struct_cache import source_files
+from dopings.opt_manifest import MANIFEST_NAME
+from dopings.config import dirs_data
+
+"Este módulo contém a classe DatasetArchive"
+
+# Identificação e versão do formato do arquivo
+ARCHIVE_MAGIC = b"DOPARCH\0"
+ARCHIVE_FORMAT_VERSION = 1
+
+# Alinhamento (em bytes) do início de cada array no arquivo
+ARCHIVE_ALIGN = 64
+
+# Propriedades de texto de cada estrutura, guardadas no cabeçalho (além
+# do grupo, nome e diretório)
+TEXT_PROPERTIES = ("material", "base", "dop_elem", "site", "param")
+
+# Propriedades numéricas de cada estrutura, guardadas como arrays
+NUMERIC_PROPERTIES = ("total_energy", "homo", "lumo")
+
+class DatasetArchive:
+
+    """
+    Arquivo único e indexado com os dados de um conjunto de estruturas
+    otimizadas, para que as análises não precisem percorrer os
+    diretórios de otimização.
+
+    Formato do arquivo:
+
+    - Identificação (8 bytes), versão (uint32) e tamanho do cabeçalho
+      (uint64).
+    - Cabeçalho JSON, com a tabela de propriedades de texto de cada
+      estrutura e a posição, tipo e formato de cada array.
+    - Arrays binários, alinhados a 64 bytes: códigos de elementos,
+      coordenadas e cargas de todas as estruturas concatenadas, tabela
+      de posições (a estrutura i ocupa as linhas offsets[i]:offsets[i+1]),
+      energia total, HOMO, LUMO e dipolo de cada estrutura.
+
+    O arquivo é aberto por memory-map, e os arrays são vistas dele.
+
+    As estruturas são separadas em grupos (por exemplo "dopings",
+    "bases" e "h2").
+
+    Attributes
+    ----------
+
+    path : Path
+        Endereço do arquivo.
+
+    records : list[dict]
+        Propriedades de texto de cada estrutura (grupo, nome, material,
+        base, dop_elem, site, param e diretório).
+
+    arrays : dict[str, np.ndarray]
+        Arrays do arquivo, somente leitura.
+
+    Methods
+    -------
+
+    __init__(self, path: str|Path) -> None
+
+        Abre um arquivo existente.
+
+    pack(path: str|Path, groups: dict[str, list[Structure]], names: dict[str, list[str]]=None) -> None
+
+        Escreve um arquivo com as estruturas de cada grupo.
+
+    select(self, **filters) -> list[int]
+
+        Índices das estruturas cujas propriedades de texto correspondem
+        aos filtros.
+
+    structure(self, index: int) -> Structure
+
+        Cria a Structure de índice "index".
+
+    structs(self, **filters) -> list[Structure]
+
+        Cria as Structures cujas propriedades correspondem aos filtros.
+
+    is_stale(self) -> bool
+
+        Verifica se a árvore de otimizações mudou depois que o arquivo
+        foi escrito.
+
+    open_if_fresh(path: str|Path) -> DatasetArchive|None
+
+        Abre um arquivo, se existir e estiver atualizado.
+    """
+
+    def __init__(self, path: str|Path) -> None:
+        """
+        Abre um arquivo existente.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo.
+
+        Raises
+        ------
+
+        ValueError
+            "Not a dataset archive."
+
+        ValueError
+            "Unsupported archive version."
+        """
+
+        self.path = Path(path).expanduser()
+
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = self._mmap
+
+        if buffer[:8] != ARCHIVE_MAGIC:
+            raise ValueError("Not a dataset archive.")
+
+        version = int(np.frombuffer(buffer, dtype="<u4", count=1, offset=8)[0])
+        header_len = int(np.frombuffer(buffer, dtype="<u8", count=1, offset=12)[0])
+
+        if version != ARCHIVE_FORMAT_VERSION:
+            raise ValueError("Unsupported archive version.")
+
+        header = json.loads(bytes(buffer[20:20 + header_len]).decode())
+
+        self.records = header["records"]
+
+        # Início da seção de arrays
+        start = DatasetArchive._align(20 + header_len)
+
+        # Vistas dos arrays
+        self.arrays = {}
+
+        for name, info in header["arrays"].items():
+
+            shape = tuple(info["shape"])
+            count = int(np.prod(shape))
+
+            self.arrays[name] = np.frombuffer(buffer, dtype=info["dtype"],
+                                              count=count,
+                                              offset=start + info["offset"]).reshape(shape)
+
+    def __len__(self) -> int:
+
+        return len(self.records)
+
+    @staticmethod
+    def _align(n: int) -> int:
+        """
+        Menor múltiplo de ARCHIVE_ALIGN maior ou igual a "n".
+        """
+
+        return -(-n // ARCHIVE_ALIGN) * ARCHIVE_ALIGN
+
+    @staticmethod
+    def pack(path: str|Path, groups: dict[str, list[Structure]], 
+             names: dict[str, list[str]]=None) -> None:
+        """
+        Escreve um arquivo com as estruturas de cada grupo. A escrita é
+        atômica.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo.
+
+        groups : dict[str, list[Structure]]
+            Estruturas de cada grupo, por nome do grupo.
+
+        names : dict[str, list[str]], default = None
+            Nomes das estruturas de cada grupo. Para grupos não 
+            incluídos, usa "Structure.name".
+        """
+
+        path = Path(path).expanduser()
+
+        structs = []
+        records = []
+
+        names = names if names is not None else {}
+
+        for group, group_structs in groups.items():
+            for i, struct in enumerate(group_structs):
+
+                record = { prop : getattr(struct, prop, None)
+                           for prop in TEXT_PROPERTIES }
+
+                record["group"] = group
+                record["name"] = (names[group][i] if group in names 
+                                  else struct.name())
+                record["dir"] = None if struct.dir is None else str(struct.dir)
+
+                structs.append(struct)
+                records.append(record)
+
+        def as_float(value) -> float:
+            return np.nan if value is None else float(value)
+
+        # Posição de cada estrutura nos arrays de átomos
+        sizes = np.array([struct.size for struct in structs], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+        arrays = {
+
+            "codes"    : (np.concatenate([s.elem_codes for s in structs])
+                          if structs else np.zeros(0, dtype=np.uint8)),
+            "coords"   : (np.concatenate([s.coords for s in structs])
+                          if structs else np.zeros((0, 3))),
+            "charges"  : (np.concatenate([s.charges for s in structs])
+                          if structs else np.zeros(0)),
+            "offsets"  : offsets,
+            "dipole"   : np.array([ [np.nan]*3 if s.dipole is None else s.dipole
+                                    for s in structs ], dtype=np.float64).reshape(-1, 3),
+        }
+
+        for prop in NUMERIC_PROPERTIES:
+            arrays[prop] = np.array([ as_float(getattr(s, prop)) for s in structs ],
+                                    dtype=np.float64)
+
+        # Posição de cada array, a partir do início da seção de arrays
+        info = {}
+        position = 0
+
+        for name, array in arrays.items():
+
+            array = np.ascontiguousarray(array)
+            arrays[name] = array
+
+            info[name] = {"offset" : position,
+                          "dtype"  : array.dtype.newbyteorder("<").str,
+                          "shape"  : list(array.shape)}
+
+            position = DatasetArchive._align(position + array.nbytes)
+
+        header = json.dumps({"records" : records, "arrays" : info}).encode()
+        start = DatasetArchive._align(20 + len(header))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        Path.mkdir(path.parent, parents=True, exist_ok=True)
+
+        with open(tmp_path, "wb") as file:
+
+            file.write(ARCHIVE_MAGIC)
+            file.write(np.array(ARCHIVE_FORMAT_VERSION, dtype="<u4").tobytes())
+            file.write(np.array(len(header), dtype="<u8").tobytes())
+            file.write(header)
+
+            for name, array in arrays.items():
+                file.write(b"\0" * (start + info[name]["offset"] - file.tell()))
+                file.write(array.astype(info[name]["dtype"], copy=False).tobytes())
+
+        os.replace(tmp_path, path)
+
+    def select(self, **filters) -> list[int]:
+        """
+        Índices das estruturas cujas propriedades de texto correspondem
+        aos filtros.
+
+        Parameters
+        ----------
+
+        **filters
+            Propriedade e valor esperado, por exemplo
+            group="dopings", material="graphine", dop_elem="B".
+
+        Returns
+        -------
+
+        list[int]
+            Índices das estruturas, na ordem do arquivo.
+        """
+
+        return [ i for i, record in enumerate(self.records)
+                 if all(record.get(key) == value for key, value in filters.items()) ]
+
+    def structure(self, index: int) -> Structure:
+        """
+        Cria a Structure de índice "index", com seus átomos e
+        propriedades.
+
+        Parameters
+        ----------
+
+        index : int
+            Índice da estrutura no arquivo.
+
+        Returns
+        -------
+
+        Structure
+            Estrutura lida do arquivo.
+        """
+
+        record = self.records[index]
+        start, stop = self.arrays["offsets"][index:index+2]
+
+        struct = Structure(dir=record["dir"], material=record["material"],
+                           base=record["base"], dop_elem=record["dop_elem"],
+                           site=record["site"], param=record["param"])
+
+        struct.append_arrays(elems=self.arrays["codes"][start:stop],
+                             coords=self.arrays["coords"][start:stop],
+                             charges=self.arrays["charges"][start:stop])
+
+        for prop in NUMERIC_PROPERTIES:
+            value = float(self.arrays[prop][index])
+            setattr(struct, prop, None if np.isnan(value) else value)
+
+        dipole = self.arrays["dipole"][index]
+        struct.dipole = None if np.isnan(dipole).all() else dipole.copy()
+
+        return struct
+
+    def structs(self, **filters) -> list[Structure]:
+        """
+        Cria as Structures cujas propriedades correspondem aos filtros
+        (ver "select").
+        """
+
+        return [ self.structure(i) for i in self.select(**filters) ]
+
+    def is_stale(self) -> bool:
+        """
+        Verifica se a árvore de otimizações mudou depois que o arquivo
+        foi escrito: se algum manifesto de otimizações (ver OptManifest)
+        foi modificado depois, ou se algum arquivo de origem das 
+        estruturas guardadas (ver "struct_cache.source_files") foi 
+        modificado depois ou removido.
+
+        Returns
+        -------
+
+        bool
+            True se o arquivo está desatualizado.
+        """
+
+        archive_mtime = os.stat(self.path).st_mtime_ns
+
+        # Otimizações registradas depois do arquivo
+        root = Path(dirs_data["dopings_opt"]).expanduser()
+
+        for manifest in root.glob(f"*/*/{MANIFEST_NAME}"):
+            if os.stat(manifest).st_mtime_ns > archive_mtime:
+                return True
+
+        # Arquivos de origem das estruturas guardadas
+        for record in self.records:
+
+            if record["dir"] is None:
+                continue
+
+            for name in source_files():
+
+                try:
+                    mtime = os.stat(Path(record["dir"]) / name).st_mtime_ns
+                except FileNotFoundError:
+                    # Estrutura removida
+                    if name == "geo_end.xyz":
+                        return True
+                    continue
+
+                if mtime > archive_mtime:
+                    return True
+
+        return False
+
+    @staticmethod
+    def open_if_fresh(path: str|Path) -> DatasetArchive|None:
+        """
+        Abre um arquivo, se existir e estiver atualizado em relação à
+        árvore de otimizações (ver "is_stale"). Se estiver 
+        desatualizado, um aviso é impresso e as análises devem ler os 
+        diretórios.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo.
+
+        Returns
+        -------
+
+        DatasetArchive
+            Arquivo aberto.
+
+        None
+            Se o arquivo não existir ou estiver desatualizado.
+        """
+
+        path = Path(path).expanduser()
+
+        if not path.is_file():
+            return None
+
+        archive = DatasetArchive(path)
+
+        if archive.is_stale():
+            print(f"WARNING: {path} is older than the optimization tree, "
+                  f"reading directories instead (run sets_pack.py to update it)")
+            return None
+
+        return archive
@@ -1,14 +1,223 @@
 
 import numpy as np
 
+from dopings.config import atoms_data
+
 "Este módulo contém a classe Atom"
 
+# Tabela de símbolos, onde o índice de cada símbolo é o número atômico do
+# elemento. O índice 0 ("X") é reservado para elementos desconhecidos.
+ELEMENTS = (
+    "X",
+    "H",  "He", "Li", "Be", "B",  "C",  "N",  "O",  "F",  "Ne",
+    "Na", "Mg", "Al", "Si", "P",  "S",  "Cl", "Ar", "K",  "Ca",
+    "Sc", "Ti", "V",  "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn",
+    "Ga", "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y",  "Zr",
+    "Nb", "Mo", "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn",
+    "Sb", "Te", "I",  "Xe", "Cs", "Ba", "La", "Ce", "Pr", "Nd",
+    "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb",
+    "Lu", "Hf", "Ta", "W",  "Re", "Os", "Ir", "Pt", "Au", "Hg",
+    "Tl", "Pb", "Bi", "Po", "At", "Rn", "Fr", "Ra", "Ac", "Th",
+    "Pa", "U",  "Np", "Pu", "Am", "Cm", "Bk", "Cf", "Es", "Fm",
+    "Md", "No", "Lr", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds",
+    "Rg", "Cn", "Nh", "Fl", "Mc", "Lv", "Ts", "Og"
+)
+
+# Dicionário inverso, de símbolo para código
+ELEMENT_CODES = { elem : code for code, elem in enumerate(ELEMENTS) }
+
+# Array de símbolos, para converter códigos em símbolos de forma vetorizada
+ELEMENTS_ARRAY = np.array(ELEMENTS)
+
+def elem_to_code(elem: str) -> int:
+    """
+    Converte o símbolo de um elemento em seu código (número atômico).
+
+    Parameters
+    ----------
+
+    elem : str
+        Símbolo do elemento (maiúsculas e minúsculas são diferenciadas).
+
+    Returns
+    -------
+
+    int
+        Código do elemento.
+
+    Raises
+    ------
+
+    ValueError
+        Unknown element symbol.
+    """
+
+    try:
+        return ELEMENT_CODES[elem]
+    except KeyError:
+        raise ValueError(f"Unknown element symbol: {elem}")
+
+def elems_to_codes(elems: list[str]|np.ndarray) -> np.ndarray:
+    """
+    Converte um array de símbolos de elementos em um array de códigos.
+    Cada símbolo distinto é consultado uma única vez.
+
+    Parameters
+    ----------
+
+    elems : list[str] | np.ndarray[str]
+        Símbolos dos elementos.
+
+    Returns
+    -------
+
+    np.ndarray[np.uint8]
+        Códigos dos elementos, na mesma ordem dos símbolos.
+
+    Raises
+    ------
+
+    ValueError
+        Unknown element symbol.
+    """
+
+    unique, inverse = np.unique(np.asarray(elems, dtype=str), return_inverse=True)
+
+    codes = np.array([ elem_to_code(elem) for elem in unique ], dtype=np.uint8)
+
+    return codes[inverse.reshape(-1)]
+
+def codes_to_elems(codes: np.ndarray) -> np.ndarray:
+    """
+    Converte um array de códigos em um array de símbolos de elementos.
+
+    Parameters
+    ----------
+
+    codes : np.ndarray[int]
+        Array de códigos de elementos.
+
+    Returns
+    -------
+
+    np.ndarray[str]
+        Array de símbolos, na mesma ordem dos códigos.
+    """
+
+    return ELEMENTS_ARRAY[np.asarray(codes, dtype=np.intp)]
+
+def count_elements(codes: np.ndarray) -> np.ndarray:
+    """
+    Conta os átomos de cada elemento a partir dos seus códigos.
+
+    Parameters
+    ----------
+
+    codes : np.ndarray[int]
+        Array de códigos de elementos.
+
+    Returns
+    -------
+
+    np.ndarray[np.int64]
+        Vetor de tamanho len(ELEMENTS), com o número de átomos de cada
+        elemento na posição do seu código.
+    """
+
+    return np.bincount(np.asarray(codes, dtype=np.intp), minlength=len(ELEMENTS))
+
+# Energias de referência já montadas, por conjunto de parâmetros
+_reference_energies = {}
+
+def reference_energies(param: str) -> np.ndarray:
+    """
+    Energias dos átomos isolados de um conjunto de parâmetros 
+    ("energ_atom" de atoms_data.json), como um vetor indexado pelo 
+    código do elemento. O vetor é montado uma única vez por conjunto de
+    parâmetros.
+
+    Parameters
+    ----------
+
+    param : str
+        Conjunto de parâmetros.
+
+    Returns
+    -------
+
+    np.ndarray[float]
+        Vetor de tamanho len(ELEMENTS), com a energia (eV) de cada 
+        elemento, ou NaN se o elemento não tiver energia de referência.
+
+    Raises
+    ------
+
+    KeyError
+        Se o conjunto de parâmetros não tiver energias de referência.
+    """
+
+    if param not in _reference_energies:
+
+        energies = np.full(len(ELEMENTS), np.nan)
+
+        for elem, energy in atoms_data["energ_atom"][param].items():
+            energies[elem_to_code(elem)] = energy
+
+        _reference_energies[param] = energies
+
+    return _reference_energies[param]
+
+def atoms_energy(counts: np.ndarray, param: str) -> np.ndarray|float:
+    """
+    Soma das energias dos átomos isolados de uma ou várias estruturas, 
+    como um único produto da matriz de contagens pelo vetor de energias
+    de referência (ver "count_elements" e "reference_energies").
+
+    Parameters
+    ----------
+
+    counts : np.ndarray[int]
+        Vetor de contagens de uma estrutura, ou matriz com uma linha por
+        estrutura.
+
+    param : str
+        Conjunto de parâmetros.
+
+    Returns
+    -------
+
+    np.ndarray[float] | float
+        Soma das energias (eV) de cada estrutura.
+
+    Raises
+    ------
+
+    KeyError
+        energ_atom of element [element] not found for [param].
+    """
+
+    energies = reference_energies(param)
+    missing = np.isnan(energies)
+
+    # Elementos presentes sem energia de referência
+    used = np.flatnonzero(missing & (np.atleast_2d(counts).sum(axis=0) > 0))
+
+    if used.size > 0:
+        raise KeyError(f"energ_atom of element {ELEMENTS[used[0]]} not found for {param}.")
+
+    return counts @ np.where(missing, 0.0, energies)
+
 class Atom:
 
     """
     Representa um átomo, a partir do seu símbolo de elemento, posição e 
     carga.
 
+    Um Atom pode ser independente, guardando seus próprios dados, ou ser
+    uma vista leve de uma linha de uma Structure, gerada sob demanda
+    (ver "Atom.view"). No segundo caso, ler e atribuir elem, coord e
+    charge lê e escreve diretamente nos arrays da estrutura.
+
     Attributes
     ----------
     elem : str
@@ -29,11 +238,17 @@ class Atom:
 
         Inicializa objeto Atom.
 
+    def view(struct: Structure, index: int) -> Atom
+
+        Cria um Atom que é uma vista da linha "index" da estrutura.
+
     def dist_to(self, atom2: Atom) -> float
 
         Calcula distância de si, até outro Atom.        
     """
 
+    __slots__ = ("_elem", "_coord", "_charge", "_struct", "_index")
+
     def __init__(self, elem: str=None, coord: list[float]=None, 
                  charge: float = None) -> None: 
 
@@ -64,15 +279,17 @@ class Atom:
         """
 
         # Declarando atributos
-        self.elem = None
-        self.coord = None
-        self.charge = None
+        self._struct = None
+        self._index = None
+        self._elem = None
+        self._coord = None
+        self._charge = None
 
         # Checando o tipo da variável elem e atribuindo
         if elem is not None:
             
             if isinstance(elem, str):
-                self.elem = elem
+                self._elem = elem
             else:
                 raise TypeError("Elem type must be string.")
         
@@ -83,7 +300,7 @@ class Atom:
                 and all(isinstance(coord, float) for coord in coord)):
                     
                 # Transformar em array e salvar
-                self.coord = np.array(coord, dtype=float)
+                self._coord = np.array(coord, dtype=float)
 
             else:
                 raise TypeError("coord must be list of 3 floats.")
@@ -92,10 +309,98 @@ class Atom:
         if charge is not None:
             
             if isinstance(charge, float):
-                self.charge = charge
+                self._charge = charge
             else:
                 raise TypeError("Charge must be float.")  
 
+    @classmethod
+    def view(cls, struct: "Structure", index: int) -> "Atom":
+        """
+        Cria um Atom que é uma vista da linha "index" da estrutura.
+        Nenhum dado é copiado.
+
+        Obs: Se a estrutura crescer e seus arrays forem realocados,
+        vistas de coordenadas obtidas antes disso deixam de refletir a
+        estrutura.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura da qual o átomo é vista.
+
+        index : int
+            Índice (a partir de 0) do átomo na estrutura.
+
+        Returns
+        -------
+
+        Atom
+            Vista do átomo.
+        """
+
+        atom = cls.__new__(cls)
+        atom._struct = struct
+        atom._index = index
+        atom._elem = None
+        atom._coord = None
+        atom._charge = None
+
+        return atom
+
+    ############# Propriedades
+
+    @property
+    def elem(self) -> str|None:
+
+        if self._struct is None:
+            return self._elem
+
+        return ELEMENTS[self._struct._codes[self._index]]
+
+    @elem.setter
+    def elem(self, value: str) -> None:
+
+        if self._struct is None:
+            self._elem = value
+        else:
+            self._struct._codes[self._index] = elem_to_code(value)
+
+    @property
+    def coord(self) -> np.ndarray|None:
+
+        if self._struct is None:
+            return self._coord
+
+        # Vista da linha do array de coordenadas da estrutura
+        return self._struct._coords[self._index]
+
+    @coord.setter
+    def coord(self, value) -> None:
+
+        if self._struct is None:
+            self._coord = None if value is None else np.asarray(value, dtype=float)
+        else:
+            self._struct._coords[self._index] = value
+
+    @property
+    def charge(self) -> float|None:
+
+        if self._struct is None:
+            return self._charge
+
+        # Cargas não definidas são guardadas como NaN na estrutura
+        charge = self._struct._charges[self._index]
+        return None if np.isnan(charge) else float(charge)
+
+    @charge.setter
+    def charge(self, value: float|None) -> None:
+
+        if self._struct is None:
+            self._charge = value
+        else:
+            self._struct._charges[self._index] = np.nan if value is None else value
+
     ############# Distância até outro átomo
 
     def dist_to(self, atom2: "Atom") -> float:
@@ -125,12 +430,13 @@ class Atom:
             atom2 must be an Atom object.
         """
 
+        # Se não for passado um objeto Atom, reportar
+        if not isinstance(atom2, Atom):
+             raise TypeError("atom2 must be an Atom object.")
+
         # Se alguma coordenada for None
         if (self.coord is None) or (atom2.coord is None):
             raise TypeError("Both atoms must have defined positions.")
 
-        # Se for passado um objeto Atom, retornar a distância
-        if isinstance(atom2, Atom):
-            return np.linalg.norm(self.coord - atom2.coord)
-        else:
-             raise TypeError("atom2 must be an Atom object.")
+        # Retornar a distância
+        return np.linalg.norm(self.coord - atom2.coord)
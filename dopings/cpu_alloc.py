@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+"Este módulo contém a classe CoreAllocator"
+
+# Diretório com a topologia dos processadores, no Linux
+_SYS_CPU = Path("/sys/devices/system/cpu")
+
+def available_cpus() -> list[int]:
+    """
+    Processadores lógicos que o processo atual pode usar (afinidade do
+    processo). Em sistemas sem "sched_getaffinity", todos os
+    processadores.
+    """
+
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+def cpu_topology(cpus: list[int]=None) -> list[tuple[int, int, int]]:
+    """
+    Topologia dos processadores lógicos: (pacote, núcleo físico, cpu)
+    de cada um, lida de /sys. Se não estiver disponível, cada cpu é
+    tratada como um núcleo físico.
+
+    Parameters
+    ----------
+
+    cpus : list[int], default = None
+        Processadores lógicos considerados. Se None, os disponíveis
+        para o processo (ver "available_cpus").
+
+    Returns
+    -------
+
+    list[tuple[int, int, int]]
+        Pacote, núcleo e cpu de cada processador lógico.
+    """
+
+    cpus = available_cpus() if cpus is None else cpus
+
+    topology = []
+
+    for cpu in cpus:
+
+        dir = _SYS_CPU / f"cpu{cpu}" / "topology"
+
+        try:
+            package = int((dir / "physical_package_id").read_text())
+            core = int((dir / "core_id").read_text())
+        except (OSError, ValueError):
+            package, core = 0, cpu
+
+        topology.append((package, core, cpu))
+
+    return topology
+
+class CoreAllocator:
+
+    """
+    Divide os processadores da máquina em "n_jobs" conjuntos disjuntos
+    de "threads_per_job" processadores, um para cada otimização
+    simultânea (por exemplo 4 x 8 ou 32 x 1).
+
+    Os processadores são ordenados pela topologia: primeiro uma thread
+    de cada núcleo físico, agrupados por pacote, e depois as demais
+    threads (hyperthreading) de cada núcleo. Assim, cada conjunto fica
+    em núcleos físicos vizinhos, e threads irmãs só são usadas quando
+    os núcleos físicos acabam.
+
+    Attributes
+    ----------
+
+    n_jobs : int
+        Número de conjuntos.
+
+    threads_per_job : int
+        Número de processadores de cada conjunto.
+
+    slots : list[list[int]]
+        Processadores de cada conjunto.
+
+    Methods
+    -------
+
+    __init__(self, n_jobs: int, threads_per_job: int=None, cpus: list[int]=None) -> None
+
+        Divide os processadores em conjuntos.
+
+    acquire(self) -> list[int]
+
+        Reserva um conjunto livre, esperando se necessário.
+
+    release(self, cores: list[int]) -> None
+
+        Libera um conjunto reservado.
+
+    slot(self)
+
+        Context manager que reserva e libera um conjunto.
+    """
+
+    def __init__(self, n_jobs: int, threads_per_job: int=None,
+                 cpus: list[int]=None) -> None:
+        """
+        Divide os processadores em conjuntos.
+
+        Parameters
+        ----------
+
+        n_jobs : int
+            Número de conjuntos (otimizações simultâneas).
+
+        threads_per_job : int, default = None
+            Número de processadores de cada conjunto. Se None, divide
+            igualmente os processadores disponíveis.
+
+        cpus : list[int], default = None
+            Processadores a serem divididos. Se None, os disponíveis
+            para o processo.
+
+        Raises
+        ------
+
+        ValueError
+            "n_jobs and threads_per_job must be positive."
+        """
+
+        topology = cpu_topology(cpus)
+
+        if threads_per_job is None:
+            threads_per_job = max(1, len(topology) // max(n_jobs, 1))
+
+        if n_jobs < 1 or threads_per_job < 1:
+            raise ValueError("n_jobs and threads_per_job must be positive.")
+
+        self.n_jobs = n_jobs
+        self.threads_per_job = threads_per_job
+
+        # Primeira thread de cada núcleo físico, depois as irmãs
+        seen = set()
+        first, siblings = [], []
+
+        for package, core, cpu in sorted(topology):
+
+            if (package, core) in seen:
+                siblings.append(cpu)
+            else:
+                seen.add((package, core))
+                first.append(cpu)
+
+        order = first + siblings
+
+        # Se não houver processadores para todos, os conjuntos se repetem
+        if n_jobs * threads_per_job > len(order):
+            print(f"WARNING: {n_jobs} jobs x {threads_per_job} threads "
+                  f"oversubscribe the {len(order)} available cpus")
+
+        self.slots = [ sorted({ order[(i*threads_per_job + k) % len(order)]
+                                for k in range(threads_per_job) })
+                       for i in range(n_jobs) ]
+
+        # Conjuntos livres
+        self._free = list(range(n_jobs))
+        self._condition = threading.Condition()
+
+    def acquire(self) -> list[int]:
+        """
+        Reserva um conjunto livre, esperando se todos estiverem em uso.
+
+        Returns
+        -------
+
+        list[int]
+            Processadores do conjunto.
+        """
+
+        with self._condition:
+
+            self._condition.wait_for(lambda: len(self._free) > 0)
+
+            return self.slots[self._free.pop(0)]
+
+    def release(self, cores: list[int]) -> None:
+        """
+        Libera um conjunto reservado com "acquire".
+        """
+
+        with self._condition:
+
+            self._free.append(next(i for i, slot in enumerate(self.slots)
+                                   if slot is cores))
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self):
+        """
+        Reserva um conjunto, liberando-o ao final do bloco.
+        """
+
+        cores = self.acquire()
+
+        try:
+            yield cores
+        finally:
+            self.release(cores)
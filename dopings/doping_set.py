@@ -1,9 +1,266 @@
+import os
+import copy
+import hashlib
 from pathlib import Path
 
+import numpy as np
+
+from dopings.atom import ELEMENTS, count_elements, atoms_energy
 from dopings.structure import Structure
+from dopings.archive import DatasetArchive
+from dopings.opt_scheduler import OptScheduler
+from dopings.job_queue import JobQueue
 from dopings.config import atoms_data, dops_data, dirs_data, main_config
 
 ####################################################################################
+
+def _read_struct(job: tuple[dict, bool]) -> tuple[str, Structure|None]:
+    """
+    Lê uma estrutura dopada do seu diretório, se a otimização tiver 
+    convergido. Definida no nível do módulo para poder ser executada em 
+    outros processos.
+
+    Parameters
+    ----------
+
+    job : tuple[dict, bool]
+        Argumentos da Structure (material, dop_elem, base, site, dir), e
+        se deve ser forçada a leitura dos arquivos originais.
+
+    Returns
+    -------
+
+    tuple[str, Structure|None]
+        Estado ("converged", "not_converged" ou "not_found") e a 
+        estrutura lida, ou None se não convergiu.
+    """
+
+    kwargs, force_read_source = job
+
+    # Verificando convergência
+    if not Structure(**kwargs).report(return_conv=True):
+
+        if not os.path.exists(kwargs["dir"] / main_config["output_name"]):
+            return "not_found", None
+
+        return "not_converged", None
+
+    struct = Structure(**kwargs, read_from_dir=True, 
+                       force_read_source=force_read_source)
+
+    return "converged", struct
+
+# Modelos hsd já lidos neste processo, por modelo
+_hsd_templates = {}
+
+def _hsd_template(param: str, dop_elem: str) -> dict:
+    """
+    Modelo hsd de um conjunto de parâmetros, lido uma única vez por 
+    processo e já com os blocos que não dependem da estrutura 
+    (endereço dos arquivos Slater-Koster e temperatura). Não deve ser
+    alterado: "_hsd_text" trabalha sobre uma cópia.
+
+    Parameters
+    ----------
+
+    param : str
+        Conjunto de parâmetros.
+
+    dop_elem : str
+        Elemento de dopagem (o Li usa um modelo próprio).
+
+    Returns
+    -------
+
+    dict
+        Modelo hsd, como dicionário.
+    """
+
+    template = param if dop_elem != "Li" else "3ob+Li"
+
+    if (template, param) not in _hsd_templates:
+
+        import hsd
+
+        # Lendo arquivo genérico para um dicionário
+        with open(dirs_data["generic_hsd"][template]) as file:
+            hsd_dict = hsd.load(file)
+
+        # SKF DIR
+        skf_dir = dirs_data["skf_dirs"][param]
+        hsd_dict["Hamiltonian"]["DFTB"]["SlaterKosterFiles"]["Type2FileNames"]["Prefix"] = '"' + str(skf_dir.resolve()) + '/"'
+
+        # Temperatura como forma de melhorar a convergência
+        hsd_dict["Hamiltonian"]["DFTB"]["Filling"] = {"Fermi" : {"Temperature[K]" : 2000}}
+
+        _hsd_templates[(template, param)] = hsd_dict
+
+    return _hsd_templates[(template, param)]
+
+# Textos hsd já gerados neste processo, por combinação de parâmetros, 
+# dopante, elementos e tipo de otimização
+_hsd_texts = {}
+
+def _hsd_text(param: str, dop_elem: str, elements: tuple[str], 
+              read_initial_charges: bool, redo: bool) -> str:
+    """
+    Texto do arquivo hsd de uma otimização, gerado uma única vez por 
+    processo para cada combinação de argumentos (ver "_hsd_template"). 
+    A geometria é incluída a partir do "inp.xyz", de forma que o texto
+    não depende das posições dos átomos.
+
+    Parameters
+    ----------
+
+    param : str
+        Conjunto de parâmetros.
+
+    dop_elem : str
+        Elemento de dopagem.
+
+    elements : tuple[str]
+        Elementos presentes na estrutura, ordenados.
+
+    read_initial_charges : bool
+        Se as cargas iniciais devem ser lidas de arquivo.
+
+    redo : bool
+        Se o limite de passos deve ser o de otimizações refeitas.
+
+    Returns
+    -------
+
+    str
+        Texto do arquivo hsd.
+    """
+
+    key = (param, dop_elem, elements, read_initial_charges, redo)
+
+    if key in _hsd_texts:
+        return _hsd_texts[key]
+
+    import hsd
+
+    # Cópia do modelo principal, já com os blocos fixos
+    hsd_dict = copy.deepcopy(_hsd_template(param, dop_elem))
+
+    # Importando dados
+    max_ang_momentum = atoms_data["max_ang_momentum"]
+
+    # Definindo momentos angulares máximos para cada elemento
+    for elem in elements:
+
+        # Criando entrada, com momento angular entre aspas
+        hsd_dict["Hamiltonian"]["DFTB"]["MaxAngularMomentum"][elem] = f'"{max_ang_momentum[elem]}"'
+        
+    # Se for 3ob, adicionar as derivadas de hubbard para cada elemento
+    if param == "3ob" and dop_elem != "Li":
+        for elem in elements:
+            hsd_dict["Hamiltonian"]["DFTB"]["HubbardDerivs"][elem] = atoms_data["hubbard_derivs"][elem]
+
+    ############################################################################
+
+    # Ler cargas iniciais, se for passado como parâmetro
+    if read_initial_charges:
+
+        # Ler cargas iniciais
+        hsd_dict["Hamiltonian"]["DFTB"]["ReadInitialCharges"] = "Yes"
+
+        # Ler cargas como texto
+        hsd_dict["Options"]["ReadChargesAsText"] = "Yes"
+
+    ############################################################################
+
+    # Se estiver refazendo os arquivos pra resumir a otimização
+    if redo:
+
+        # Usar como limite de passos o valor designado nas variáveis de configuração
+        hsd_dict["Driver"]["GeometryOptimization"]["MaxSteps"] = main_config["redo_steps_limits"]
+
+    ############################################################################
+
+    # Carregando informação como string formatada
+    txt = hsd.dump_string(hsd_dict)
+    # Substituindo informação desejada
+    txt = txt.replace('xyzFormat {}', 'xyzFormat {\n    <<< "inp.xyz"\n  }')
+
+    _hsd_texts[key] = txt
+
+    return txt
+
+def _gen_files(job: tuple[Structure, str]) -> tuple[int, int]:
+    """
+    Gera os arquivos de otimização de uma estrutura (ver 
+    "DopingSet.gen_files"), e as cargas iniciais, se houver. Definida 
+    no nível do módulo para poder ser executada em outros processos.
+
+    Parameters
+    ----------
+
+    job : tuple[Structure, str]
+        Estrutura, e o conteúdo do "charges.dat" com as cargas iniciais
+        (ver "DopingSet.initial_charges_text"), ou None.
+
+    Returns
+    -------
+
+    tuple[int, int]
+        Número de arquivos escritos, e de arquivos considerados.
+    """
+
+    struct, charges = job
+
+    written, considered = 0, 2
+
+    # Cargas iniciais
+    if charges is not None:
+        written += _write_if_changed(struct.dir / "charges.dat", charges)
+        considered += 1
+
+    written += DopingSet.gen_files(struct, read_initial_charges=charges is not None)
+
+    return written, considered
+
+def _write_if_changed(path: Path, text: str) -> bool:
+    """
+    Escreve um arquivo apenas se o conteúdo for diferente do que já 
+    está no disco (comparado por hash), de forma que arquivos iguais 
+    não são tocados e mantêm a data de modificação.
+
+    Parameters
+    ----------
+
+    path : Path
+        Endereço do arquivo.
+
+    text : str
+        Conteúdo do arquivo.
+
+    Returns
+    -------
+
+    bool
+        Se o arquivo foi escrito.
+    """
+
+    data = text.encode()
+
+    # Comparando com o arquivo existente, se tiver o mesmo tamanho
+    try:
+        if (os.stat(path).st_size == len(data) and
+            hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest()):
+            return False
+    except FileNotFoundError:
+        pass
+
+    Path.mkdir(path.parent, parents=True, exist_ok=True)
+
+    with open(path, "wb") as file:
+        file.write(data)
+
+    return True
+
+####################################################################################
         
 class DopingSet:
     """
@@ -61,9 +318,29 @@ class DopingSet:
         Executa uma função para cada estrutura do conjunto, recolhendo 
         os retornos para escrever em um arquivo csv final.
     
-    map_opt(self, only_report: bool=True, overwrite: bool=False, verbose: bool=True, skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=False, inverse_order: bool=False) -> None
+    formation_energies(self) -> pd.DataFrame
+
+        Tabela com as energias de formação das estruturas do conjunto.
+
+    formation_energy_table(sets: list[DopingSet]) -> pd.DataFrame
+
+        Tabela com as energias de formação das estruturas de vários 
+        conjuntos, calculadas de uma vez.
+
+    flush_cache(self) -> int
+
+        Grava no cache as propriedades eletrônicas lidas das estruturas
+        do conjunto.
+    
+    map_opt(self, only_report: bool=True, overwrite: bool=False, verbose: bool=True, skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=False, inverse_order: bool=False, n_jobs: int=None, threads_per_job: int=None, bin_dir: str|Path=None) -> None
+
+        Otimiza um conjunto inteiro de dopagens em fila, possivelmente
+        com várias otimizações simultâneas.
+    
+    read_archive(self, archive: DatasetArchive|str|Path) -> None
 
-        Otimiza um conjunto inteiro de dopagens em fila.
+        Carrega as bases e as estruturas dopadas do conjunto a partir de
+        um arquivo consolidado.
     
     atom_id(self, base, site: dict) -> int
 
@@ -89,14 +366,36 @@ class DopingSet:
 
         Faz inferência do diretório de dopagem da estrutura.
     
-    gen_files(struct, read_initial_charges=False, redo=False) -> None
+    gen_files(struct, read_initial_charges=False, redo=False) -> int
 
         Gera os arquivos de otimização de uma estrutura.
+
+    gen_files_batch(jobs: list[tuple[Structure, str]], workers: int=None) -> None
+
+        Gera os arquivos de otimização de várias estruturas, 
+        possivelmente em paralelo.
+
+    write_sets(sets: list[DopingSet], workers: int=None) -> None
+
+        Escreve de uma vez os arquivos pendentes de vários conjuntos, e
+        coloca as otimizações nas filas.
+
+    gen_initial_charges(struct, base, id: int) -> bool
+
+        Gera as cargas iniciais de uma estrutura dopada a partir das
+        cargas convergidas da base.
+
+    initial_charges_text(struct, base, id: int) -> str
+
+        Conteúdo do arquivo de cargas iniciais de uma estrutura dopada.
     """
 
     def __init__(self, dop_elem: str, dops_info: dict=None, mode: str="read",
                  param=None, force_write: bool=False, 
-                 force_read_source: bool=False) -> None:
+                 force_read_source: bool=False, 
+                 archive: DatasetArchive|str|Path=None, 
+                 workers: int=None, queue: JobQueue|str|Path=None,
+                 warm_start: bool=None, defer_write: bool=False) -> None:
 
         """
         Contrutor de objetos DopingSet.
@@ -150,6 +449,34 @@ class DopingSet:
             Se True, para cada estrutura, lê dos arquivo originais e 
             escreve objeto no armazenamento, mesmo que ele já esteja 
             escrito. Também sobrescreve versão salva no armazenamento.
+
+        archive : DatasetArchive|str|Path, default = None
+            Arquivo consolidado (ver DatasetArchive e sets_pack.py). Se
+            for passado no modo read, as bases e estruturas do conjunto
+            são lidas dele, sem acessar os diretórios de otimização.
+
+        workers : int, default = None
+            Número de processos usados para ler as estruturas no modo 
+            read, ou para gerar os arquivos no modo write. Se maior que
+            1, as estruturas são processadas em paralelo. Se None, usa 
+            "read_workers" ou "write_workers" de main_config.json.
+
+        queue : JobQueue|str|Path, default = None
+            Fila de otimizações (ver JobQueue e sets_worker.py). Se for 
+            passada no modo write, as otimizações do conjunto são 
+            colocadas na fila (com force_write, voltam a ficar 
+            pendentes).
+
+        warm_start : bool, default = None
+            Se, no modo write, as otimizações devem começar das cargas
+            convergidas da base (ver "gen_initial_charges"), em vez de
+            começar o SCC do zero. Se None, usa "warm_start" de
+            main_config.json (padrão False).
+
+        defer_write : bool, default = False
+            Se True, no modo write os arquivos não são escritos (nem as
+            otimizações colocadas na fila) na criação do conjunto, e sim
+            depois, junto dos de outros conjuntos (ver "write_sets").
             
         Raises
         ------
@@ -173,8 +500,6 @@ class DopingSet:
             dop_elem can't be None.
         """
 
-        import os
-
         # Propriedades
         self.main_dir = None
         self.param = None
@@ -183,6 +508,16 @@ class DopingSet:
         self.dops_info = None
         self.mode = None
 
+        # Fila de otimizações
+        if queue is not None and not isinstance(queue, JobQueue):
+            queue = JobQueue(queue)
+
+        # Arquivos a serem escritos no modo write, e como colocá-los na
+        # fila (ver "write_sets")
+        self._write_jobs = []
+        self._queue = queue
+        self._force_write = force_write
+
         # Dop_elem
         if dop_elem is not None:
             if isinstance(dop_elem, str) and len(dop_elem) in [1, 2]:
@@ -223,6 +558,16 @@ class DopingSet:
         else:
             raise ValueError("dops_info cannot be None")
 
+        # Cargas iniciais a partir da base
+        if warm_start is None:
+            warm_start = main_config.get("warm_start", False)
+
+        # No modo leitura com arquivo consolidado, não percorrer os
+        # diretórios
+        if archive is not None and self.mode == "read":
+            self.read_archive(archive)
+            return
+
         ## Base struts
         for base in self.dops_info["bases"]:
 
@@ -232,6 +577,9 @@ class DopingSet:
             
             self.bases[base] = base_struct
 
+        # Estruturas a serem lidas no modo leitura
+        read_jobs = []
+
         # Para cada estrutura base
         for base in self.dops_info["bases"]:
 
@@ -277,35 +625,202 @@ class DopingSet:
 
                     # Se o backup não existe, ou foi pedido para forçar a escrita
                     if (not backups_exists) or force_write:
-                        self.gen_files(doped_struct)
+
+                        # Cargas iniciais, se disponíveis
+                        charges = (self.initial_charges_text(doped_struct, 
+                                                             self.bases[base], 
+                                                             replace_atom_id)
+                                   if warm_start else None)
+
+                        self._write_jobs.append((doped_struct, charges))
 
                     else:
                         print(f"WARNING: not writing over {doped_struct.dir}, cause this optimization was restarted")
 
-                # Se modo leitura
+                # Se modo leitura, guardar para ler depois (possivelmente 
+                # em paralelo)
                 elif mode == "read":
 
-                    # Se não tiver convergido, pular iteração
-                    if not doped_struct.report(return_conv=True):
-
-                        print(doped_struct.dir / main_config["output_name"])
-                        if not os.path.exists(doped_struct.dir / main_config["output_name"]):
-                            print(f"Skipping Structure with not found output: {doped_struct.dir}")
-                        
-                        else:
-                            print(f"Not reading not converged Structure: {doped_struct.dir}")
-                        
-                        continue
+                    read_jobs.append((kwargs, force_read_source))
+
+        # Modo escrita: gerar os arquivos (possivelmente em paralelo) e 
+        # só então colocar na fila
+        if mode == "write" and not defer_write:
+            DopingSet.write_sets([self], workers=workers)
+
+        # Modo leitura
+        if mode == "read":
+
+            # Número de processos
+            if workers is None:
+                workers = main_config.get("read_workers", 1)
+
+            # Lendo estruturas, em paralelo se houver mais de um processo.
+            # Os resultados voltam na ordem dos sítios
+            if workers > 1 and len(read_jobs) > 1:
+
+                from concurrent.futures import ProcessPoolExecutor
+
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(_read_struct, read_jobs, 
+                                                chunksize=max(1, len(read_jobs) // (4*workers))))
+            else:
+                results = map(_read_struct, read_jobs)
+
+            for (kwargs, _), (status, doped_struct) in zip(read_jobs, results):
+
+                # Se não tiver convergido, pular
+                if status != "converged":
+
+                    print(kwargs["dir"] / main_config["output_name"])
+                    if status == "not_found":
+                        print(f"Skipping Structure with not found output: {kwargs['dir']}")
                     
-                    # Sobrescrever com estrutura dopada
-                    doped_struct = Structure(**kwargs, read_from_dir=True, 
-                                             force_read_source=force_read_source)
+                    else:
+                        print(f"Not reading not converged Structure: {kwargs['dir']}")
+                    
+                    continue
 
-                    # Definindo
-                    doped_struct.param = self.param
+                # Definindo
+                doped_struct.param = self.param
 
-                    # Anexar à lista
-                    self.structs.append(doped_struct)
+                # Anexar à lista
+                self.structs.append(doped_struct)
+
+    def read_archive(self, archive: DatasetArchive|str|Path) -> None:
+        """
+        Carrega as bases e as estruturas dopadas do conjunto a partir de
+        um arquivo consolidado.
+
+        Parameters
+        ----------
+
+        archive : DatasetArchive|str|Path
+            Arquivo consolidado, ou seu endereço.
+
+        Raises
+        ------
+
+        KeyError
+            base [base] not found in archive.
+        """
+
+        if not isinstance(archive, DatasetArchive):
+            archive = DatasetArchive(archive)
+
+        material = self.dops_info["material"]
+
+        # Bases
+        for base in self.dops_info["bases"]:
+
+            found = archive.select(group="bases", material=material, base=base)
+
+            if not found:
+                raise KeyError(f"base {base} not found in archive.")
+
+            self.bases[base] = archive.structure(found[0])
+
+        # Estruturas dopadas (apenas as convergidas são arquivadas)
+        self.structs = archive.structs(group="dopings", material=material, 
+                                       dop_elem=self.dop_elem)
+
+        for struct in self.structs:
+            struct.param = self.param
+
+    def formation_energies(self) -> "pd.DataFrame":
+        """
+        Tabela com as energias de formação das estruturas do conjunto
+        (ver "formation_energy_table").
+
+        Returns
+        -------
+
+        pd.DataFrame
+            Uma linha por estrutura, na ordem de "structs".
+        """
+
+        return DopingSet.formation_energy_table([self])
+
+    @staticmethod
+    def formation_energy_table(sets: list["DopingSet"]) -> "pd.DataFrame":
+        """
+        Tabela com as energias de formação das estruturas de vários 
+        conjuntos (por exemplo, de uma campanha inteira). A composição
+        de todas as estruturas é montada como uma matriz de contagens de
+        elementos, e a soma das energias dos átomos isolados vem de um 
+        único produto por conjunto de parâmetros (ver "atoms_energy").
+        Os valores são os mesmos de "Structure.formation_energy".
+
+        Parameters
+        ----------
+
+        sets : list[DopingSet]
+            Conjuntos de dopagens.
+
+        Returns
+        -------
+
+        pd.DataFrame
+            Uma linha por estrutura, na ordem dos conjuntos e de 
+            "structs", com as colunas material, dop_elem, base, site, 
+            energy (eV) e per_atom (eV).
+
+        Raises
+        ------
+
+        KeyError
+            energ_atom of element [element] not found for [param].
+        """
+
+        import pandas as pd
+
+        structs = [ struct for set in sets for struct in set.structs ]
+
+        # Matriz de contagens (com a forma certa mesmo sem estruturas), e
+        # parâmetros de cada estrutura
+        counts = np.zeros((len(structs), len(ELEMENTS)), dtype=np.int64)
+        for i, struct in enumerate(structs):
+            counts[i] = count_elements(struct.elem_codes)
+
+        params = np.array([ struct.param for struct in structs ], dtype=object)
+
+        # Soma das energias dos átomos isolados, por conjunto de parâmetros
+        atoms_energies_sum = np.zeros(len(structs))
+
+        for param in dict.fromkeys(params):
+            rows = params == param
+            atoms_energies_sum[rows] = atoms_energy(counts[rows], param)
+
+        total_energies = np.array([ struct.total_energy for struct in structs ], dtype=float)
+        sizes = np.array([ struct.size for struct in structs ])
+
+        # A energia total, menos a soma da energia de cada átomo
+        energies = np.round(total_energies - atoms_energies_sum, 4)
+
+        return pd.DataFrame({"material" : [ struct.material for struct in structs ],
+                             "dop_elem" : [ struct.dop_elem for struct in structs ],
+                             "base"     : [ struct.base for struct in structs ],
+                             "site"     : [ struct.site for struct in structs ],
+                             "energy"   : energies,
+                             "per_atom" : np.round(energies / sizes, 4)})
+
+    def flush_cache(self) -> int:
+        """
+        Grava no cache, com uma escrita por estrutura, as propriedades 
+        eletrônicas lidas dos arquivos desde a leitura do conjunto (ver
+        "Structure.flush_cache"). Deve ser chamada ao fim do 
+        processamento do conjunto.
+
+        Returns
+        -------
+
+        int
+            Número de entradas do cache atualizadas.
+        """
+
+        structs = list(self.bases.values()) + self.structs
+
+        return sum( struct.flush_cache() for struct in structs )
 
     # Mapeia funções
     def map(self, method: "function", suffix: str, **kwargs) -> None:
@@ -433,11 +948,14 @@ class DopingSet:
 
     def map_opt(self, only_report: bool=True, overwrite: bool=False, 
                 verbose: bool=True, skip_hard_to_conv_SCC: bool=True, 
-                resume_unfineshed: bool=False, inverse_order: bool=False
-                ) -> None:
+                resume_unfineshed: bool=False, inverse_order: bool=False,
+                n_jobs: int=None, threads_per_job: int=None, 
+                bin_dir: str|Path=None) -> None:
 
         """
-        Otimiza um conjunto inteiro de dopagens em fila.
+        Otimiza um conjunto inteiro de dopagens em fila. Com n_jobs 
+        maior que 1, mantém várias otimizações rodando ao mesmo tempo 
+        (ver OptScheduler).
 
         Parameters
         ----------
@@ -476,8 +994,18 @@ class DopingSet:
         inverse_order : bool, default=False
             Se a ordem das otimizações devem seguir a ordem inversa da 
             lista de estruturas.
-        """
 
+        n_jobs : int, default = None
+            Número máximo de otimizações simultâneas. Se None, usa 
+            "opt_jobs" de main_config.json.
+
+        threads_per_job : int, default = None
+            Número de threads de cada otimização (ver OptScheduler).
+
+        bin_dir : str|Path, default = None
+            Executável usado nas otimizações. Se None, usa o "bin_dir" 
+            da máquina de main_config.json.
+        """
 
         # Salvando lista de estruturas
         structs = self.structs
@@ -487,16 +1015,21 @@ class DopingSet:
             # Inverter lista
             structs = structs[::-1]
 
-        # Pra cada estrutura...
-        for struct in structs:
+        # Apenas report
+        if only_report:
 
-            if only_report:
+            for struct in structs:
                 struct.report(verbose=verbose)
 
-            else:
-                struct.opt(overwrite=overwrite, verbose=verbose, 
-                           skip_hard_to_conv_SCC=skip_hard_to_conv_SCC, 
-                           resume_unfineshed=resume_unfineshed)
+            return
+
+        # Otimizando, com até n_jobs otimizações simultâneas
+        scheduler = OptScheduler(n_jobs=n_jobs, threads_per_job=threads_per_job,
+                                 bin_dir=bin_dir)
+
+        scheduler.run(structs, overwrite=overwrite, verbose=verbose, 
+                      skip_hard_to_conv_SCC=skip_hard_to_conv_SCC, 
+                      resume_unfineshed=resume_unfineshed)
        
     ###########################################################################
 
@@ -695,11 +1228,130 @@ class DopingSet:
         return Path(dirs_data["dopings_opt"]).expanduser() / material / dop_elem / base / site
 
     @staticmethod
-    def gen_files(struct, read_initial_charges=False, redo=False) -> None:
+    def gen_initial_charges(struct, base, id: int) -> bool:
+        """
+        Gera as cargas iniciais de uma estrutura dopada ("charges.dat",
+        no formato texto do DFTB+) a partir das cargas convergidas da
+        base (ver "initial_charges_text"). O arquivo só é escrito se 
+        tiver mudado.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura dopada, com diretório definido.
+
+        base : Structure
+            Estrutura base que origina a dopagem, com diretório 
+            definido.
+
+        id : int
+            ID (a partir de 1) do átomo substituído.
+
+        Returns
+        -------
+
+        bool
+            Se as cargas foram geradas.
+        """
+
+        text = DopingSet.initial_charges_text(struct, base, id)
+
+        if text is None:
+            return False
+
+        _write_if_changed(struct.dir / "charges.dat", text)
+
+        return True
+
+    @staticmethod
+    def initial_charges_text(struct, base, id: int) -> str:
+        """
+        Gera o conteúdo do arquivo de cargas iniciais de uma estrutura 
+        dopada ("charges.dat", no formato texto do DFTB+) a partir das 
+        cargas convergidas da base, que diferem apenas no átomo 
+        substituído.
+
+        As cargas dos demais átomos são copiadas. O átomo substituído 
+        recebe a população da base corrigida pela diferença de valência
+        entre o dopante e o elemento original, com uma entrada por 
+        orbital do dopante. O total do cabeçalho é recalculado.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura dopada, com diretório definido.
+
+        base : Structure
+            Estrutura base que origina a dopagem, com diretório 
+            definido.
+
+        id : int
+            ID (a partir de 1) do átomo substituído.
+
+        Returns
+        -------
+
+        str
+            Conteúdo do arquivo. None se a base não tiver cargas
+            convergidas, ou se elas não forem de um cálculo sem spin 
+            com cargas por orbital.
+        """
+
+        base_charges = Path(base.dir) / "charges.dat"
+
+        if not base_charges.is_file():
+            print(f"WARNING: no base charges in {base_charges}, starting SCC from scratch")
+            return None
+
+        # Lendo cargas da base
+        with open(base_charges) as file:
+            lines = file.read().splitlines()
+
+        header = lines[1].split()
+        flags, n_atoms, n_spin = header[:4], int(header[4]), int(header[5])
+
+        if n_spin != 1 or n_atoms != len(base.elems) or len(lines) < n_atoms + 2:
+            print(f"WARNING: unsupported base charges in {base_charges}, starting SCC from scratch")
+            return None
+
+        rows = [ [ float(value) for value in line.split() ] 
+                 for line in lines[2:2 + n_atoms] ]
+
+        # Correção de valência no átomo substituído
+        valency = atoms_data["valency"]
+        n_orbitals = { "s" : 1, "p" : 4, "d" : 9, "f" : 16 }
+
+        population = (rows[id - 1][0] - valency[base.elems[id - 1]] 
+                      + valency[struct.dop_elem])
+
+        rows[id - 1] = ([population] + [0.0] * 
+                        (n_orbitals[atoms_data["max_ang_momentum"][struct.dop_elem]] - 1))
+
+        total = sum( sum(row) for row in rows )
+
+        # Montando cargas iniciais
+        text = [lines[0], f" {' '.join(flags)} {n_atoms:11d} {n_spin:11d} {total:24.16f}"]
+        text += [ "".join( f"{value:26.16f}" for value in row ) for row in rows ]
+        text += lines[2 + n_atoms:]
+
+        return "\n".join(text) + "\n"
+
+    @staticmethod
+    def gen_files(struct, read_initial_charges=False, redo=False) -> int:
 
         """
         Gera os arquivos de otimização de uma estrutura.
 
+        O texto hsd é gerado uma única vez por processo para cada 
+        combinação de parâmetros, dopante, elementos e tipo de 
+        otimização (ver "_hsd_text"), e reaproveitado pelas demais 
+        estruturas. Para cada estrutura só o frame é gerado.
+
+        Os arquivos são gerados em memória, e só são escritos se forem
+        diferentes dos que já estão no disco.
+
         Parameters
         ----------
 
@@ -715,100 +1367,104 @@ class DopingSet:
         redo : bool
             Se os arquivos estão sendo refeitos, e portanto o limite de
             passos na otimização deve ser maior que o normal.
-        """
-
-        ################### Funções para lidar com arquivo hsd ################
-
-        def hsd_to_dict(dir_in):
 
-            import hsd
-
-            # Lendo arquivo genérico
-            with open(dir_in) as file:
-
-                # Lendo para um dicionário
-                hsd_dict = hsd.load(file)
-
-            # Retornando dicionário
-            return hsd_dict
-
-        def write_hsd_dict(hsd_dict, dir_out):
-
-            import hsd
-
-            # Carregando informação como string formatada
-            txt = hsd.dump_string(hsd_dict)
-            # Substituindo informação desejada
-            txt = txt.replace('xyzFormat {}', 'xyzFormat {\n    <<< "inp.xyz"\n  }')
+        Returns
+        -------
 
-            # Escrevendo em arquivo
-            with open(dir_out, "w") as file:
-                file.write(txt)
+        int
+            Número de arquivos escritos (os demais não mudaram).
+        """
 
         #################### Gerar frame ######################################
 
-        struct.frame(struct.dir / "inp.xyz")
+        written = _write_if_changed(struct.dir / "inp.xyz", struct.frame_text())
         
         #################### Gerar hsd ########################################
 
         # Target
         target = struct.dir / "dftb_in.hsd"
 
-        # Lendo para um dicionário o modelo principal
-        if struct.dop_elem != "Li":
-            hsd_dict = hsd_to_dict(dirs_data["generic_hsd"][struct.param])
+        # Obtendo valores únicos de elementos na estrutura
+        # (ordenados, para que o texto gerado seja sempre o mesmo)
+        elements = tuple( str(elem) for elem in sorted(set(struct.elems)) )
 
-        else:
-            hsd_dict = hsd_to_dict(dirs_data["generic_hsd"]["3ob+Li"])
+        # Texto já gerado para a mesma combinação, ou gerado agora
+        txt = _hsd_text(struct.param, struct.dop_elem, elements, 
+                        bool(read_initial_charges), bool(redo))
 
+        # Escrevendo arquivo de propriedades
+        written += _write_if_changed(target, txt)
 
-        # Obtendo valores únicos de elementos na estrutura
-        elements = list(set([ atom.elem for atom in struct.atoms ]))
+        return written
 
-        # Importando dados
-        max_ang_momentum = atoms_data["max_ang_momentum"]
+    @staticmethod
+    def gen_files_batch(jobs: list[tuple[Structure, str]], workers: int=None) -> None:
+        """
+        Gera os arquivos de otimização de várias estruturas (por exemplo,
+        de todos os conjuntos de uma campanha, ver "write_sets"), em 
+        paralelo se houver mais de um processo. Cada processo lê os 
+        modelos hsd uma única vez. Ao final, é impressa uma linha com o
+        número de arquivos escritos e inalterados.
 
-        # Definindo momentos angulares máximos para cada elemento
-        for elem in elements:
+        Parameters
+        ----------
 
-            # Criando entrada, com momento angular entre aspas
-            hsd_dict["Hamiltonian"]["DFTB"]["MaxAngularMomentum"][elem] = f'"{max_ang_momentum[elem]}"'
-            
-        # Se for 3ob, adicionar as derivadas de hubbard para cada elemento
-        if struct.param == "3ob" and struct.dop_elem != "Li":
-            for elem in elements:
-                hsd_dict["Hamiltonian"]["DFTB"]["HubbardDerivs"][elem] = atoms_data["hubbard_derivs"][elem]
-                
-        # SKF DIR
-        skf_dir = dirs_data["skf_dirs"][struct.param]
-        hsd_dict["Hamiltonian"]["DFTB"]["SlaterKosterFiles"]["Type2FileNames"]["Prefix"] = '"' + str(skf_dir.resolve()) + '/"'
+        jobs : list[tuple[Structure, str]]
+            Estruturas, e o conteúdo do arquivo de cargas iniciais de 
+            cada uma, ou None (ver "initial_charges_text").
 
-        # Temperatura como forma de melhorar a convergência
-        hsd_dict["Hamiltonian"]["DFTB"]["Filling"] = {"Fermi" : {"Temperature[K]" : 2000}}
+        workers : int, default = None
+            Número de processos. Se None, usa "write_workers" de 
+            main_config.json (padrão 1).
+        """
 
-        ############################################################################
+        if workers is None:
+            workers = main_config.get("write_workers", 1)
 
-        # Ler cargas iniciais, se for passado como parâmetro
-        if read_initial_charges:
+        if workers > 1 and len(jobs) > 1:
 
-            # Ler cargas iniciais
-            hsd_dict["Hamiltonian"]["DFTB"]["ReadInitialCharges"] = "Yes"
+            from concurrent.futures import ProcessPoolExecutor
 
-            # Ler cargas como texto
-            hsd_dict["Options"]["ReadChargesAsText"] = "Yes"
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                counts = list(executor.map(_gen_files, jobs, 
+                                           chunksize=max(1, len(jobs) // (4*workers))))
+        else:
+            counts = list(map(_gen_files, jobs))
 
-        ############################################################################
+        written = sum( count[0] for count in counts )
+        considered = sum( count[1] for count in counts )
 
-        # Se estiver refazendo os arquivos pra resumir a otimização
-        if redo:
+        # Relatar
+        print(f"Optimization files: {written} written, "
+              f"{considered - written} unchanged ({len(jobs)} structures)")
 
-            # Usar como limite de passos o valor designado nas variáveis de configuração
-            hsd_dict["Driver"]["GeometryOptimization"]["MaxSteps"] = main_config["redo_steps_limits"]
+    @staticmethod
+    def write_sets(sets: list["DopingSet"], workers: int=None) -> None:
+        """
+        Escreve os arquivos de otimização pendentes de conjuntos criados
+        no modo write com "defer_write", todos de uma vez (ver 
+        "gen_files_batch"), e só então coloca as otimizações na fila de
+        cada conjunto, se houver.
 
-        ############################################################################
+        Parameters
+        ----------
 
-        # Escrevendo arquivo de propriedades
-        write_hsd_dict(hsd_dict, target)
+        sets : list[DopingSet]
+            Conjuntos com arquivos pendentes.
 
-        # Relatar
-        print(target)
+        workers : int, default = None
+            Número de processos. Se None, usa "write_workers" de 
+            main_config.json (padrão 1).
+        """
+
+        DopingSet.gen_files_batch([ job for set in sets for job in set._write_jobs ], 
+                                  workers=workers)
+
+        for set in sets:
+
+            # Colocar na fila de otimizações
+            if set._queue is not None:
+                for struct in set.structs:
+                    set._queue.enqueue(struct, force=set._force_write)
+
+            set._write_jobs = []
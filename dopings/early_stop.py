@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import time
+import numpy as np
+from pathlib import Path
+
+from dopings.opt_log import OptimizationLog
+from dopings.opt_manifest import OptManifest
+from dopings.config import main_config
+
+"Este módulo contém as políticas de parada antecipada de otimizações"
+
+# Nome do arquivo, no diretório da otimização, com as decisões de parada
+EARLY_STOP_LOG = "early_stop.log"
+
+class StopPolicy:
+
+    """
+    Política de parada antecipada: a partir do resumo de uma otimização
+    em andamento, decide se ela deve ser encerrada.
+
+    As subclasses definem "name" (chave em "early_stop" de
+    main_config.json) e implementam "check".
+
+    Methods
+    -------
+
+    __init__(self, **params) -> None
+
+        Inicializa a política com os seus limites.
+
+    check(self, log: OptimizationLog) -> str|None
+
+        Motivo para encerrar a otimização, ou None para continuar.
+    """
+
+    name = None
+
+    def __init__(self, **params) -> None:
+        """
+        Inicializa a política com os seus limites, que substituem os
+        valores padrão da classe.
+        """
+
+        for key, value in params.items():
+            setattr(self, key, value)
+
+    def check(self, log: OptimizationLog) -> str|None:
+        """
+        Motivo para encerrar a otimização, ou None para continuar.
+
+        Parameters
+        ----------
+
+        log : OptimizationLog
+            Resumo da otimização até o momento.
+        """
+
+        raise NotImplementedError
+
+class SCCFailuresPolicy(StopPolicy):
+
+    """
+    Regra fixa de SCC difícil: mais de "max_failures" passos com SCC não
+    convergido; ou mais de "early_failures" passos não convergidos,
+    sendo o último antes do passo "early_step".
+    """
+
+    name = "scc_failures"
+
+    max_failures = 30
+    early_failures = 20
+    early_step = 30
+
+    def check(self, log: OptimizationLog) -> str|None:
+
+        failures = log.not_conv_SCC_steps
+
+        if len(failures) > self.max_failures:
+            return f"{len(failures)} SCC failures > {self.max_failures}"
+
+        if (len(failures) > self.early_failures
+            and failures[-1] < self.early_step):
+            return (f"{len(failures)} SCC failures > {self.early_failures} "
+                    f"before step {self.early_step}")
+
+        return None
+
+class SCCRatePolicy(StopPolicy):
+
+    """
+    Taxa de falhas do SCC nos últimos "window" passos maior que
+    "max_rate", a partir do passo "min_steps".
+    """
+
+    name = "scc_rate"
+
+    min_steps = 50
+    window = 50
+    max_rate = 0.8
+
+    def check(self, log: OptimizationLog) -> str|None:
+
+        # Passos completos (o último ainda está sendo escrito)
+        n_steps = len(log.SCC_converged) - 1
+
+        if n_steps < max(self.min_steps, self.window):
+            return None
+
+        recent = log.SCC_converged[n_steps - self.window:n_steps]
+        rate = 1 - sum(recent) / self.window
+
+        if rate > self.max_rate:
+            return (f"SCC failure rate {rate:.2f} > {self.max_rate} "
+                    f"in the last {self.window} steps")
+
+        return None
+
+class EnergyTrendPolicy(StopPolicy):
+
+    """
+    Energia total subindo mais que "max_rise" (eV) nos últimos "window"
+    passos, a partir do passo "min_steps".
+    """
+
+    name = "energy_trend"
+
+    min_steps = 100
+    window = 50
+    max_rise = 0.5
+
+    def check(self, log: OptimizationLog) -> str|None:
+
+        energies = [ energy for energy in log.energies if energy is not None ]
+
+        if len(energies) < max(self.min_steps, self.window + 1):
+            return None
+
+        rise = energies[-1] - energies[-1 - self.window]
+
+        if rise > self.max_rise:
+            return (f"energy rose {rise:.4f} eV > {self.max_rise} eV "
+                    f"in the last {self.window} steps")
+
+        return None
+
+class PeerStepsPolicy(StopPolicy):
+
+    """
+    Número de passos maior que "factor" vezes o quantil "quantile" dos
+    passos das otimizações já convergidas da mesma árvore (ver
+    OptManifest). Só é aplicada com pelo menos "min_peers" otimizações
+    convergidas.
+    """
+
+    name = "peer_steps"
+
+    min_peers = 5
+    quantile = 0.9
+    factor = 2.0
+
+    def __init__(self, peer_steps: list[int]=None, **params) -> None:
+        """
+        Inicializa a política com os passos das otimizações convergidas
+        da mesma árvore.
+        """
+
+        super().__init__(**params)
+
+        self.limit = None
+
+        peer_steps = peer_steps if peer_steps is not None else []
+
+        if len(peer_steps) >= self.min_peers:
+            self.limit = self.factor * float(np.quantile(peer_steps, self.quantile))
+
+    def check(self, log: OptimizationLog) -> str|None:
+
+        if self.limit is None:
+            return None
+
+        n_steps = len(log.steps_offsets)
+
+        if n_steps > self.limit:
+            return (f"{n_steps} steps > {self.factor} x q{self.quantile} "
+                    f"of converged peers ({self.limit:.0f})")
+
+        return None
+
+# Políticas disponíveis, por nome
+POLICIES = { policy.name : policy for policy in (SCCFailuresPolicy, SCCRatePolicy,
+                                                 EnergyTrendPolicy, PeerStepsPolicy) }
+
+class EarlyStop:
+
+    """
+    Conjunto de políticas de parada antecipada aplicado a uma otimização
+    em andamento (ver "Structure.opt").
+
+    As políticas e seus limites vêm de "early_stop" em
+    main_config.json, no formato
+    {nome: {"enabled": bool, limite: valor, ...}}. A otimização é
+    encerrada pela primeira política que pedir, e o motivo é impresso e
+    escrito em "early_stop.log", no diretório da otimização.
+
+    Attributes
+    ----------
+
+    policies : list[StopPolicy]
+        Políticas ativas.
+
+    dir : Path|None
+        Diretório da otimização.
+
+    Methods
+    -------
+
+    __init__(self, policies: list[StopPolicy], dir: str|Path=None) -> None
+
+        Inicializa o conjunto com as políticas passadas.
+
+    for_struct(struct: Structure, config: dict=None) -> EarlyStop
+
+        Conjunto de políticas configurado para uma estrutura.
+
+    check(self, log: OptimizationLog) -> str|None
+
+        Motivo para encerrar a otimização, ou None para continuar.
+    """
+
+    def __init__(self, policies: list[StopPolicy], dir: str|Path=None) -> None:
+        """
+        Inicializa o conjunto com as políticas passadas.
+
+        Parameters
+        ----------
+
+        policies : list[StopPolicy]
+            Políticas ativas, na ordem de avaliação.
+
+        dir : str|Path, default = None
+            Diretório da otimização, onde as decisões são registradas.
+            Se None, são apenas impressas.
+        """
+
+        self.policies = policies
+        self.dir = Path(dir).expanduser() if dir is not None else None
+
+    @staticmethod
+    def for_struct(struct: "Structure", config: dict=None) -> EarlyStop:
+        """
+        Conjunto de políticas configurado para uma estrutura. A política
+        de passos usa como pares as otimizações convergidas do manifesto
+        da árvore da estrutura.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura a ser otimizada.
+
+        config : dict, default = None
+            Configuração das políticas. Se None, usa "early_stop" de
+            main_config.json (ou, se ausente, apenas a regra fixa de SCC
+            difícil).
+
+        Raises
+        ------
+
+        KeyError
+            "unknown early stop policy [name]."
+        """
+
+        if config is None:
+            config = main_config.get("early_stop", {"scc_failures" : {"enabled" : True}})
+
+        policies = []
+
+        for name, params in config.items():
+
+            if name not in POLICIES:
+                raise KeyError(f"unknown early stop policy {name}.")
+
+            params = dict(params)
+
+            if not params.pop("enabled", True):
+                continue
+
+            # Passos das otimizações convergidas da mesma árvore
+            if name == "peer_steps":
+
+                manifest = OptManifest.for_struct(struct)
+                summaries = manifest.summaries() if manifest is not None else {}
+
+                params["peer_steps"] = [ summary["n_steps"] for summary in summaries.values()
+                                         if summary["converged"] is True ]
+
+            policies.append(POLICIES[name](**params))
+
+        return EarlyStop(policies, dir=struct.dir)
+
+    def check(self, log: OptimizationLog) -> str|None:
+        """
+        Avalia as políticas, na ordem. Se alguma pedir o encerramento,
+        registra e retorna o motivo.
+
+        Parameters
+        ----------
+
+        log : OptimizationLog
+            Resumo da otimização até o momento.
+
+        Returns
+        -------
+
+        str
+            Motivo do encerramento, no formato "política: motivo".
+
+        None
+            Se a otimização deve continuar.
+        """
+
+        for policy in self.policies:
+
+            reason = policy.check(log)
+
+            if reason is None:
+                continue
+
+            reason = f"{policy.name}: {reason}"
+
+            message = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} | step "
+                       f"{len(log.steps_offsets) - 1} | stopping ({reason})")
+
+            print(f"EARLY STOP {self.dir} - {reason}")
+
+            if self.dir is not None:
+                try:
+                    with open(self.dir / EARLY_STOP_LOG, "a") as file:
+                        file.write(message + "\n")
+                except OSError:
+                    pass
+
+            return reason
+
+        return None
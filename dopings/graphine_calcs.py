@@ -2,19 +2,117 @@
 import numpy as np
 from dopings.config import graphine_data, dops_data, atoms_data
 from dopings.structure import Structure
-from dopings.atom import Atom
+from dopings.atom import Atom, elem_to_code
 
 # Dados de sítios extras
 sites_id = dops_data["graphine"]["sites_id"]
 extra_sites_id = graphine_data["sites_id"]
 
+# Código do carbono
+_CARBON = elem_to_code("C")
+
+def _compile_site_tables(base: str) -> dict:
+    """
+    Compila, para uma base de grafino, os sítios de "sites_id" de
+    dops_data.json e de graphine_data.json em arrays de IDs (a partir de
+    0) dos átomos usados em cada cálculo de GraphineCalcs. Os arrays não
+    podem ser alterados.
+
+    Parameters
+    ----------
+
+    base : str
+        Base de grafino.
+
+    Returns
+    -------
+
+    dict
+        Tabelas da base, com as chaves:
+
+        {
+            "axis_torsion"  : np.ndarray (6, 4), diedral do eixo de cada braço,
+            "int_arm"       : np.ndarray, caminho do braço interno,
+            "int_arm_check" : np.ndarray[bool], posições que só contam se forem carbono,
+            "ext_arm"       : np.ndarray, caminho do braço externo,
+            "ext_arm_check" : np.ndarray[bool], posições que só contam se forem carbono,
+            "dop_angle"     : { sítio : np.ndarray (3,) }, dopante e vizinhos (sítios B e D),
+            "dop_torsion"   : { sítio : np.ndarray (4,) }, torção no anel (sítios A1 e C1 a C4)
+        }
+    """
+
+    def ids(values):
+
+        array = np.array(values, dtype=np.intp) - 1
+        array.flags.writeable = False
+
+        return array
+
+    # Sítios de dopagem, acrescidos dos sítios extras do braço 0
+    sites = sites_id[base].copy()
+    sites.update(extra_sites_id[base][0])
+
+    # Torção dos eixos: o sítio D seguinte ao último da base no próprio
+    # braço e no oposto, e os sítios A1 dos braços vizinhos
+    next_d = f"D{str(int(base[1:]) + 1)}"
+
+    axis_torsion = ids([ [ extra_sites_id[base][(arm + 0) % 6][next_d],
+                           extra_sites_id[base][(arm + 2) % 6][ "A1" ],
+                           extra_sites_id[base][(arm + 5) % 6][ "A1" ],
+                           extra_sites_id[base][(arm + 3) % 6][next_d] ] for arm in range(6) ])
+
+    # Braço interno: A1, sítios B (se forem carbono) e C4
+    int_sites = ["A1"] + [ name for name in dops_data["graphine"]["sites"][base] 
+                           if name[0:1] == "B" ] + ["C4"]
+    int_check = np.array([ name[0:1] == "B" for name in int_sites ])
+
+    # Braço externo: C2 e sítios D (se forem carbono)
+    ext_sites = [ name for name in sites.keys() if name == "C2" or name[0:1] == "D" ]
+    ext_check = np.array([ name[0:1] == "D" for name in ext_sites ])
+
+    int_check.flags.writeable = False
+    ext_check.flags.writeable = False
+
+    # Ligação do dopante com seus vizinhos na sequência de sítios, sem
+    # os sítios não usados
+    sites_names = [ name for name in sites.keys() 
+                    if name not in ["C3", "C4", "C5", "C6"] ]
+
+    dop_angle = { site : ids([ sites[sites_names[index + i]] for i in [-1, 0, 1] ])
+                  for index, site in enumerate(sites_names)
+                  if site[0:1] in ["B", "D"] and index + 1 < len(sites_names) }
+
+    # Torção no anel benzênico, com o dopante na segunda posição
+    aux_sites = {
+
+        "C1" : ["C5", "C6", "C1", "C2"],
+        "C2" : ["C6", "C1", "C2", "C3"],
+        "C3" : ["C1", "C2", "C3", "C4"],
+        "C4" : ["C2", "C3", "C4", "C5"]
+    }
+
+    dop_torsion = { site : ids([ sites[aux_site] for aux_site in aux_sites[site] ]) 
+                    for site in aux_sites }
+    dop_torsion["A1"] = ids([ extra_sites_id[base][i]["A1"] for i in [2, 1, 0, 5] ])
+
+    return {"axis_torsion"  : axis_torsion,
+            "int_arm"       : ids([ sites_id[base][name] for name in int_sites ]),
+            "int_arm_check" : int_check,
+            "ext_arm"       : ids([ sites[name] for name in ext_sites ]),
+            "ext_arm_check" : ext_check,
+            "dop_angle"     : dop_angle,
+            "dop_torsion"   : dop_torsion}
+
+# Tabelas de IDs de cada base, compiladas uma única vez na importação
+SITE_TABLES = { base : _compile_site_tables(base) for base in dops_data["graphine"]["bases"] }
+
 def dihedral_angle(atoms: list[Atom]) -> float:
     """
     Calcula o ângulo diedral, ou ângulo de torção, entre 4 átomos.
 
     Código adaptado de:
     https://stackoverflow.com/questions/20305272/dihedral-torsion-angle-from-four-points-in-cartesian-coordinates-in-python
-    
+
     Parameters
     ----------
 
@@ -27,12 +125,29 @@ def dihedral_angle(atoms: list[Atom]) -> float:
 
     float
         Ângulo diedral entre os 4 átomos.
-    """    
+    """
 
-    p0 = atoms[0].coord
-    p1 = atoms[1].coord
-    p2 = atoms[2].coord
-    p3 = atoms[3].coord
+    return float(dihedral_angles(np.array([[ atom.coord for atom in atoms ]]))[0])
+
+def dihedral_angles(coords: np.ndarray) -> np.ndarray:
+    """
+    Calcula os ângulos diedrais de várias sequências de 4 átomos de uma
+    vez (ver "dihedral_angle").
+
+    Parameters
+    ----------
+
+    coords : np.ndarray[float]
+        Coordenadas dos átomos, com formato (M, 4, 3).
+
+    Returns
+    -------
+
+    np.ndarray[float]
+        Ângulo diedral (em graus) de cada uma das M sequências.
+    """
+
+    p0, p1, p2, p3 = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
 
     b0 = -(p1 - p0)
     b1 = p2 - p1
@@ -40,184 +155,382 @@ def dihedral_angle(atoms: list[Atom]) -> float:
 
     # normalize b1 so that it does not influence magnitude of vector
     # rejections that come next
-    b1 /= np.linalg.norm(b1)
+    b1 = b1 / np.linalg.norm(b1, axis=1, keepdims=True)
 
     # vector rejections
     # v = projection of b0 onto plane perpendicular to b1
     #   = b0 minus component that aligns with b1
     # w = projection of b2 onto plane perpendicular to b1
     #   = b2 minus component that aligns with b1
-    v = b0 - np.dot(b0, b1)*b1
-    w = b2 - np.dot(b2, b1)*b1
+    v = b0 - np.einsum("ij,ij->i", b0, b1)[:, None] * b1
+    w = b2 - np.einsum("ij,ij->i", b2, b1)[:, None] * b1
 
     # angle between v and w in a plane is the torsion angle
     # v and w may not be normalized but that's fine since tan is y/x
-    x = np.dot(v, w)
-    y = np.dot(np.cross(b1, v), w)
+    x = np.einsum("ij,ij->i", v, w)
+    y = np.einsum("ij,ij->i", np.cross(b1, v), w)
     return np.degrees(np.arctan2(y, x))
 
+def bond_angles(coords: np.ndarray) -> np.ndarray:
+    """
+    Calcula os ângulos de ligação de várias sequências de 3 átomos de
+    uma vez, com vértice no átomo do meio.
+
+    Parameters
+    ----------
+
+    coords : np.ndarray[float]
+        Coordenadas dos átomos, com formato (M, 3, 3).
+
+    Returns
+    -------
+
+    np.ndarray[float]
+        Ângulo de ligação (em graus) de cada uma das M sequências.
+    """
+
+    vec1 = coords[:, 0] - coords[:, 1]
+    vec2 = coords[:, 2] - coords[:, 1]
+
+    cos = (np.einsum("ij,ij->i", vec1, vec2)
+           / (np.linalg.norm(vec1, axis=1) * np.linalg.norm(vec2, axis=1)))
+
+    return (180/np.pi) * np.arccos(cos)
+
+def chain_lengths(coords: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Calcula a soma das distâncias entre átomos consecutivos de várias
+    cadeias de uma vez. Cadeias menores são completadas até o tamanho da
+    maior, e as posições completadas são ignoradas.
+
+    Parameters
+    ----------
+
+    coords : np.ndarray[float]
+        Coordenadas dos átomos, com formato (M, k, 3).
+
+    mask : np.ndarray[bool]
+        Posições válidas de cada cadeia, com formato (M, k).
+
+    Returns
+    -------
+
+    np.ndarray[float]
+        Comprimento de cada uma das M cadeias.
+    """
+
+    segments = np.linalg.norm(np.diff(coords, axis=1), axis=2)
+
+    return (segments * (mask[:, 1:] & mask[:, :-1])).sum(axis=1)
+
 class GraphineCalcs:
     """
     Classe de métodos estáticos que trás implementações de calculos 
     sobre estruturas dopadas de grafinos.
 
+    Cada cálculo tem uma versão para uma lista de estruturas (por
+    exemplo, as de um DopingSet): os IDs dos átomos envolvidos, 
+    consultados nas tabelas compiladas de cada base (ver SITE_TABLES), 
+    são reunidos para todas as estruturas, e os ângulos e distâncias 
+    são calculados de uma vez sobre as coordenadas empilhadas.
+
     Methods
     -------
 
     axis_torsion_angle(struct: Structure, arm: int) -> float
         Calcula a torção de um eixo da estrutura, usando o braço "arm"
         e o seu oposto para cacular um ângulo diedral.
-    
+
     int_arm_length(struct: Structure) -> float
         Calcula a soma de distâncias entre os carbonos no braço interno
         da dopagem, ou seja, no braço 0, dentre os seguintes sítios:
 
         [A1, B1, B2, B3, ..., B{2N}, D4]
-    
+
     ext_arm_length(struct: Structure) -> float
         Calcula a soma de distâncias entre os carbonos no braço externo
         da dopagem, ou seja, no braço 0, dentre os seguintes sítios:
 
         [C2, D1, D2, ..., D{2N+1}]
-    
+
     dop_atom_angle(struct: Structure) -> float|None
         Se o átomo dopante pertencer a um sítio B ou D, calcula o 
         ângulo da ligação do átomo dopado com seus dois vizinhos.
-    
+
     dop_atom_torsion(struct: Structure) -> float|None
         Quando o dopante se encontra em um anel benzênico, calcula a 
         torção de um sequência de 4 átomos, onde o dopante é o segundo.
+
+    axis_torsion_angles(structs: list[Structure], arm: int) -> np.ndarray
+        Versão de "axis_torsion_angle" para várias estruturas.
+
+    int_arm_lengths(structs: list[Structure]) -> np.ndarray
+        Versão de "int_arm_length" para várias estruturas.
+
+    ext_arm_lengths(structs: list[Structure]) -> np.ndarray
+        Versão de "ext_arm_length" para várias estruturas.
+
+    dop_atom_angles(structs: list[Structure]) -> np.ndarray
+        Versão de "dop_atom_angle" para várias estruturas (NaN onde
+        não se aplica).
+
+    dop_atom_torsions(structs: list[Structure]) -> np.ndarray
+        Versão de "dop_atom_torsion" para várias estruturas (NaN onde
+        não se aplica).
     """
 
+    ##### IDs (a partir de 0) dos átomos envolvidos em cada cálculo, 
+    ##### consultados nas tabelas compiladas (ver SITE_TABLES)
+
     @staticmethod
-    def axis_torsion_angle(struct: Structure, arm: int) -> float:
+    def _axis_torsion_ids(struct: Structure, arm: int) -> np.ndarray:
+        """
+        Átomos do ângulo diedral do eixo do braço "arm".
+        """
+
+        return SITE_TABLES[struct.base]["axis_torsion"][arm % 6]
+
+    @staticmethod
+    def _int_arm_ids(struct: Structure) -> np.ndarray:
+        """
+        Átomos do braço interno: A1, os sítios B que são carbonos, e C4.
+        """
+
+        table = SITE_TABLES[struct.base]
+        path = table["int_arm"]
+
+        return path[~table["int_arm_check"] | (struct.elem_codes[path] == _CARBON)]
+
+    @staticmethod
+    def _ext_arm_ids(struct: Structure) -> np.ndarray:
+        """
+        Átomos do braço externo: C2 e os sítios D que são carbonos.
+        """
+
+        table = SITE_TABLES[struct.base]
+        path = table["ext_arm"]
+
+        return path[~table["ext_arm_check"] | (struct.elem_codes[path] == _CARBON)]
+
+    @staticmethod
+    def _dop_angle_ids(struct: Structure) -> np.ndarray|None:
+        """
+        Átomos da ligação do dopante com seus dois vizinhos, se o
+        dopante estiver em um sítio B ou D.
         """
-        Calcula a torção de um eixo da estrutura, usando o braço "arm"
-        e o seu oposto para cacular um ângulo diedral.
+
+        return SITE_TABLES[struct.base]["dop_angle"].get(struct.site)
+
+    @staticmethod
+    def _dop_torsion_ids(struct: Structure) -> np.ndarray|None:
+        """
+        Átomos da torção no anel benzênico, se o dopante estiver em um
+        sítio A1 ou C1 a C4.
+        """
+
+        return SITE_TABLES[struct.base]["dop_torsion"].get(struct.site)
+
+    @staticmethod
+    def _gather(structs: list[Structure],
+                ids: list[list[int]|None]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Empilha as coordenadas dos átomos de cada estrutura em um array
+        (M, k, 3), onde k é o maior número de átomos. Estruturas sem
+        átomos (None) e posições completadas ficam zeradas, e são
+        indicadas na máscara (M, k).
+        """
+
+        k = max([ len(struct_ids) for struct_ids in ids if struct_ids is not None ], default=1)
+
+        coords = np.zeros((len(structs), k, 3))
+        mask = np.zeros((len(structs), k), dtype=bool)
+
+        for m, (struct, struct_ids) in enumerate(zip(structs, ids)):
+
+            if struct_ids is None:
+                continue
+
+            coords[m, :len(struct_ids)] = struct.coords[struct_ids]
+            mask[m, :len(struct_ids)] = True
+
+        return coords, mask
+
+    ##### Versões para várias estruturas
+
+    @staticmethod
+    def axis_torsion_angles(structs: list[Structure], arm: int) -> np.ndarray:
+        """
+        Calcula a torção do eixo do braço "arm" (ver
+        "axis_torsion_angle") de várias estruturas de uma vez.
 
         Parameters
         ----------
 
-        struct : strucutre
-            Estrutura de grafino sobre a qual se deseja fazer o cálculo.
+        structs : list[Structure]
+            Estruturas de grafino sobre as quais se deseja fazer o
+            cálculo.
 
         arm : int
             Braço da estrutura usado de referência para o cálculo da 
-            torção. Considera o próprio braço, e o seu oposto no 
-            cálculo.
+            torção.
 
         Returns
         -------
 
-        float
-            Ângulo de torção no eixo do braço especificado.
+        np.ndarray[float]
+            Ângulo de torção de cada estrutura.
+        """
+
+        coords, _ = GraphineCalcs._gather(structs, [ GraphineCalcs._axis_torsion_ids(struct, arm)
+                                                     for struct in structs ])
+
+        return dihedral_angles(coords)
+
+    @staticmethod
+    def int_arm_lengths(structs: list[Structure]) -> np.ndarray:
         """
+        Calcula o comprimento do braço interno (ver "int_arm_length") de
+        várias estruturas de uma vez.
 
-        def f(angle):
-            """
-            Transforma uma torção que parte do 0 para uma torção que parte do 
-            180.
-            """
+        Parameters
+        ----------
+
+        structs : list[Structure]
+            Estruturas de grafino sobre as quais se deseja fazer o
+            cálculo.
 
-            # Deixando todos os ângulos positivos
-            if angle < 0:
-                angle += 360
+        Returns
+        -------
 
-            # Retornando sua diferença em relação ao ângulo raso
-            return (angle + 360) if (angle < 0) else (angle - 180)
+        np.ndarray[float]
+            Comprimento do braço interno de cada estrutura.
+        """
 
-        def arms_seq(initial: int, n: int):
-            """
-            Partindo do braço "initial", encontra o "n"-ésimo braço na
-            sequência, em sentido horário.
-            """
+        return chain_lengths(*GraphineCalcs._gather(structs, [ GraphineCalcs._int_arm_ids(struct)
+                                                               for struct in structs ]))
 
-            # Trazendo pro intervalo 0, 5
-            return (initial + n) % 6
+    @staticmethod
+    def ext_arm_lengths(structs: list[Structure]) -> np.ndarray:
+        """
+        Calcula o comprimento do braço externo (ver "ext_arm_length") de
+        várias estruturas de uma vez.
 
-        # Extra_sites
-        base = struct.base
+        Parameters
+        ----------
 
-        # Próximo sítio D
-        next_d = f"D{str(int(base[1:]) + 1)}"
+        structs : list[Structure]
+            Estruturas de grafino sobre as quais se deseja fazer o
+            cálculo.
 
-        # Átomos
-        atom1 = struct.atoms[extra_sites_id[base][arms_seq(arm, 0)][next_d] - 1]
-        atom2 = struct.atoms[extra_sites_id[base][arms_seq(arm, 2)][ "A1" ] - 1]
-        atom3 = struct.atoms[extra_sites_id[base][arms_seq(arm, 5)][ "A1" ] - 1]
-        atom4 = struct.atoms[extra_sites_id[base][arms_seq(arm, 3)][next_d] - 1]
+        Returns
+        -------
 
-        angle = dihedral_angle([atom1, atom2, atom3, atom4])
+        np.ndarray[float]
+            Comprimento do braço externo de cada estrutura.
+        """
 
-        return angle
+        return chain_lengths(*GraphineCalcs._gather(structs, [ GraphineCalcs._ext_arm_ids(struct)
+                                                               for struct in structs ]))
 
     @staticmethod
-    def int_arm_length(struct: Structure) -> float:
+    def dop_atom_angles(structs: list[Structure]) -> np.ndarray:
         """
-        Calcula a soma de distâncias entre os carbonos no braço interno
-        da dopagem, ou seja, no braço 0, dentre os seguintes sítios:
+        Calcula o ângulo da ligação do dopante (ver "dop_atom_angle") de
+        várias estruturas de uma vez.
 
-        [A1, B1, B2, B3, ..., B{2N}, D4]
+        Parameters
+        ----------
+
+        structs : list[Structure]
+            Estruturas de grafino sobre as quais se deseja fazer o
+            cálculo.
+
+        Returns
+        -------
+
+        np.ndarray[float]
+            Ângulo de cada estrutura, ou NaN se o dopante não pertencer
+            a um sítio B ou D.
+        """
+
+        ids = [ GraphineCalcs._dop_angle_ids(struct) for struct in structs ]
+        coords, mask = GraphineCalcs._gather(structs, ids)
+
+        angles = np.full(len(structs), np.nan)
+        valid = mask[:, 0]
+
+        if valid.any():
+            angles[valid] = bond_angles(coords[valid, :3])
+
+        return angles
+
+    @staticmethod
+    def dop_atom_torsions(structs: list[Structure]) -> np.ndarray:
+        """
+        Calcula a torção do dopante no anel benzênico (ver
+        "dop_atom_torsion") de várias estruturas de uma vez.
 
         Parameters
         ----------
 
-        struct : strucutre
-            Estrutura de grafino sobre a qual se deseja fazer o cálculo.
+        structs : list[Structure]
+            Estruturas de grafino sobre as quais se deseja fazer o
+            cálculo.
 
         Returns
         -------
 
-        float
-            Soma das distâncias entre carbonos no braço interno da 
-            dopagem.
+        np.ndarray[float]
+            Torção de cada estrutura, ou NaN se o dopante não pertencer
+            a um sítio A1 ou C1 a C4.
         """
-        # Inicializando comprimento total como 0
-        total_length = 0
 
-        # Base
-        base = struct.base
+        ids = [ GraphineCalcs._dop_torsion_ids(struct) for struct in structs ]
+        coords, mask = GraphineCalcs._gather(structs, ids)
 
-        # Sites_names list
-        sites_names = dops_data["graphine"]["sites"][base]
+        torsions = np.full(len(structs), np.nan)
+        valid = mask[:, 0]
 
-        # Separando sites B
-        sites = []
-        # Adicionando
-        sites.append("A1")
+        if valid.any():
+            torsions[valid] = dihedral_angles(coords[valid, :4])
 
-        # Para cada site da lista, se for site B, adicionar a lista B_sites
-        for site_name in sites_names:
-            if site_name[0:1] == "B":
+        return torsions
 
-                # Apenas se for carbono
-                if struct.atoms[sites_id[base][site_name] - 1].elem == "C":
+    ##### Versões para uma estrutura
 
-                    # Adicionar à lista
-                    sites.append(site_name)
+    @staticmethod
+    def axis_torsion_angle(struct: Structure, arm: int) -> float:
+        """
+        Calcula a torção de um eixo da estrutura, usando o braço "arm"
+        e o seu oposto para cacular um ângulo diedral.
 
-        # Adicionar C4
-        sites.append("C4")
+        Parameters
+        ----------
 
-        # Para cada sítio B, exceto o último
-        for i in range(len(sites) - 1):
+        struct : strucutre
+            Estrutura de grafino sobre a qual se deseja fazer o cálculo.
 
-            # Átomo do i, e do i+1 na lista de sítios
-            atom1 = struct.atoms[sites_id[base][sites[i  ]] - 1]
-            atom2 = struct.atoms[sites_id[base][sites[i+1]] - 1]
+        arm : int
+            Braço da estrutura usado de referência para o cálculo da 
+            torção. Considera o próprio braço, e o seu oposto no 
+            cálculo.
 
-            # Incrementar o comprimento total com a distância entre eles
-            total_length += atom1.dist_to(atom2)
+        Returns
+        -------
 
-        return total_length
+        float 
+            Ângulo de torção no eixo do braço especificado.
+        """
+
+        return float(GraphineCalcs.axis_torsion_angles([struct], arm)[0])
 
     @staticmethod
-    def ext_arm_length(struct: Structure) -> float:
+    def int_arm_length(struct: Structure) -> float:
         """
-        Calcula a soma de distâncias entre os carbonos no braço externo
+        Calcula a soma de distâncias entre os carbonos no braço interno
         da dopagem, ou seja, no braço 0, dentre os seguintes sítios:
 
-        [C2, D1, D2, ..., D{2N+1}]
+        [A1, B1, B2, B3, ..., B{2N}, D4]
 
         Parameters
         ----------
@@ -228,56 +541,43 @@ class GraphineCalcs:
         Returns
         -------
 
-        float
+        float 
             Soma das distâncias entre carbonos no braço interno da 
             dopagem.
         """
 
-        # Inicializando comprimento total como 0
-        total_length = 0
-
-        # Base
-        base = struct.base
+        return float(GraphineCalcs.int_arm_lengths([struct])[0])
 
-        # Sites_names list
-        sites_id_copy = sites_id[base].copy()
-        extra_sites_id_copy = extra_sites_id[base][0].copy()
-
-        # Juntando os dois dicionários
-        sites_id_copy.update(extra_sites_id_copy)
-
-        # Criando novo dicionário
-        sites = {}
-
-        # Para cada chave  no dict original
-        for key in sites_id_copy.keys():
+    @staticmethod
+    def ext_arm_length(struct: Structure) -> float:
+        """
+        Calcula a soma de distâncias entre os carbonos no braço externo
+        da dopagem, ou seja, no braço 0, dentre os seguintes sítios:
 
-            # Se atender ao critério
-            if key == "C2" or (key[0:1] == "D" and struct.atoms[sites_id_copy[key] - 1].elem == "C"): 
+        [C2, D1, D2, ..., D{2N+1}]
 
-                # Usar para formar novo par chave-valor
-                sites[key] = sites_id_copy[key]
-        
-        keys = list(sites.keys())
+        Parameters
+        ----------
 
-        # Incrementando comprimento total baseado nos sitios separados
-        for i in range(len(keys) - 1):
+        struct : strucutre
+            Estrutura de grafino sobre a qual se deseja fazer o cálculo.
 
-            # Átomo do i, e do i+1 na lista de sítios
-            atom1 = struct.atoms[sites[keys[i  ]] - 1]
-            atom2 = struct.atoms[sites[keys[i+1]] - 1]
+        Returns
+        -------
 
-            # Incrementar o comprimento total com a distância entre eles
-            total_length += atom1.dist_to(atom2)
+        float 
+            Soma das distâncias entre carbonos no braço interno da 
+            dopagem.
+        """
 
-        return total_length
+        return float(GraphineCalcs.ext_arm_lengths([struct])[0])
 
     @staticmethod
     def dop_atom_angle(struct: Structure) -> float|None:
         """
         Se o átomo dopante pertencer a um sítio B ou D, calcula o 
         ângulo da ligação do átomo dopado com seus dois vizinhos.
-        
+
         Se não for o caso, retorna None.
 
         Parameters
@@ -296,56 +596,12 @@ class GraphineCalcs:
         None
             Se o dopante não pertencer a um sítio B ou D.
         """
-        def bond_angle(atoms: list[Atom]) -> float:
-            """
-            Calcula o ângulo da ligação de uma sequência de 3 átomos.
-            """
-
-            vec1 = atoms[0].coord - atoms[1].coord
-            vec2 = atoms[2].coord - atoms[1].coord
-
-            return (180/np.pi) * np.arccos(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
-
-        # Base
-        base = struct.base
-        # Sítio
-        site = struct.site
-
-        if site[0:1] == "B" or site[0:1] == "D":
-
-            # Dicionários de sítios
-            sites = dops_data["graphine"]["sites_id"][base].copy()
-            sites2 = graphine_data["sites_id"][base][0].copy()
-
-            # Juntando dicionários
-            sites.update(sites2)
-
-            # Lista de nomes de sites
-            sites_names = list(sites.keys())
-
-            # Removendo sitíos não usados
-            for rm_site in ["C3", "C4", "C5", "C6"]:
-                sites_names.remove(rm_site)
-
-            # Achando a posição do site do átomo dopante na lista de 
-            # nomes de sites
-            index = sites_names.index(site)
-
-            # Listando átomos envolvidos na ligação
-            atoms = []
-
-            for i in [-1, 0, 1]:
-
-                atoms.append(struct.atoms[sites[sites_names[index + i]] -1 ])
-
-            #print(base, site, struct.dop_elem, bond_angle(atoms))
-            # Retornar a diferença para o ângulo na estrutura base
-            return bond_angle(atoms)
-
-        else: 
 
+        if GraphineCalcs._dop_angle_ids(struct) is None:
             return None
 
+        return float(GraphineCalcs.dop_atom_angles([struct])[0])
+
     @staticmethod
     def dop_atom_torsion(struct: Structure) -> float|None:
         """
@@ -364,7 +620,7 @@ class GraphineCalcs:
 
         Returns
         -------
-        
+
         float 
             Ângulo de torção, caso o dopantes esteja em um sítio A ou C.
 
@@ -376,43 +632,9 @@ class GraphineCalcs:
             Caso o dopantes não esteja em um sítio A ou C.
         """
 
-        base = struct.base
-        site = struct.site
-
-        # Dicionários de sítios
-        sites = dops_data["graphine"]["sites_id"][base].copy()
-        sites2 = graphine_data["sites_id"][base].copy()
-
-        atoms = []
-
-        # Se sítio A1
-        if site == "A1":
-
-            for i in [2, 1, 0, 5]:
-                atoms.append(struct.atoms[sites2[i]["A1"] - 1])
-
-            return dihedral_angle(atoms)
-
-        elif site in ["C1","C2","C3","C4"]:
-
-            # Juntando dicionários
-            sites.update(sites2[0])
-
-            aux_sites = {
-
-                "C1" : ["C5", "C6", "C1", "C2"],
-                "C2" : ["C6", "C1", "C2", "C3"],
-                "C3" : ["C1", "C2", "C3", "C4"],
-                "C4" : ["C2", "C3", "C4", "C5"]
-            }
-
-            for aux_site in aux_sites[site]:
-
-                atoms.append(struct.atoms[sites[aux_site] - 1])
-
-            return dihedral_angle(atoms)
-
-        else:
+        if GraphineCalcs._dop_torsion_ids(struct) is None:
             return None
 
-    ################################################################################################
\ No newline at end of file
+        return float(GraphineCalcs.dop_atom_torsions([struct])[0])
+
+    ################################################################################################
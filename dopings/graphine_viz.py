@@ -40,8 +40,17 @@ class GraphineViz:
             return value2 - value1
 
         # Listas para anexar todos os dados
-        bases = []
-        sites = []
+        structs = set.structs
+        bases = [ struct.base for struct in structs ]
+        sites = [ struct.site for struct in structs ]
+
+        # Descritores de todas as estruturas, calculados de uma vez
+        int_arms = gc.int_arm_lengths(structs)
+        ext_arms = gc.ext_arm_lengths(structs)
+        axis_torsions = [ gc.axis_torsion_angles(structs, arm=i) for i in [0, 1, 2] ]
+        dop_torsions = gc.dop_atom_torsions(structs)
+        dop_angles = gc.dop_atom_angles(structs)
+
         # Torções
         torsions0 = []
         torsions1 = []
@@ -53,32 +62,19 @@ class GraphineViz:
         bonds_angle = []
 
         # Para cada estrutura
-        for struct in set.structs:
-
-            # Base e site da struct
-            bases.append(struct.base)
-            sites.append(struct.site)
+        for m, (base, site) in enumerate(zip(bases, sites)):
 
             # Referência da base
-            ref_inter = graphine_data["int_arm_length"][bases[-1]]
-            ref_exter = graphine_data["ext_arm_length"][bases[-1]]
+            ref_inter = graphine_data["int_arm_length"][base]
+            ref_exter = graphine_data["ext_arm_length"][base]
 
             # Erro em relação à base
-            int_lengths.append((gc.int_arm_length(struct) - ref_inter) / ref_inter)
-            ext_lengths.append((gc.ext_arm_length(struct) - ref_exter) / ref_exter)
-            
-            # Lista de torções desta estrutura
-            torsions = []
-
-            # Calculando torções
-            for i in [0, 1, 2]:
-
-                torsions.append(gc.axis_torsion_angle(struct, arm=i))
+            int_lengths.append((int_arms[m] - ref_inter) / ref_inter)
+            ext_lengths.append((ext_arms[m] - ref_exter) / ref_exter)
 
             # Calculando diferença da base
-            for i in [0, 1, 2]:
-
-                torsions[i] = delta_arc(graphine_data["base_torsions"][bases[-1]][i], torsions[i])
+            torsions = [ delta_arc(graphine_data["base_torsions"][base][i], axis_torsions[i][m])
+                         for i in [0, 1, 2] ]
 
             # Passando para listas separadas
             torsions0.append(torsions[0])
@@ -86,15 +82,15 @@ class GraphineViz:
             torsions2.append(torsions[2])
 
             # Se o sítio deste está na lista
-            if sites[-1] in ["A1", "C1", "C2", "C3", "C4"]:
+            if site in ["A1", "C1", "C2", "C3", "C4"]:
 
-                base_atom_torsion = graphine_data["dop_atom_torsion_on_ring"][bases[-1]][sites[-1]]
-                bonds_angle.append(gc.dop_atom_torsion(struct) - base_atom_torsion)
+                base_atom_torsion = graphine_data["dop_atom_torsion_on_ring"][base][site]
+                bonds_angle.append(dop_torsions[m] - base_atom_torsion)
 
             else:
 
-                base_bond_angle = graphine_data["bases_bonds_angles"][bases[-1]][sites[-1]]
-                bonds_angle.append(gc.dop_atom_angle(struct) - base_bond_angle)
+                base_bond_angle = graphine_data["bases_bonds_angles"][base][site]
+                bonds_angle.append(dop_angles[m] - base_bond_angle)
 
         #################### PLOTAGEM
 
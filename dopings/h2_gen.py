@@ -107,12 +107,10 @@ def struct_radius(struct: "Structure"):
         Raio estimado para a estrutura.
     """
 
-    maior = 0
-    for atom in struct.atoms:
-        if atom.elem == "C":
-            length = np.linalg.norm(atom.coord)
-            if length > maior:
-                maior = length
+    # Distâncias dos carbonos até a origem
+    lengths = np.linalg.norm(struct.coords[struct.elems == "C"], axis=1)
+
+    maior = lengths.max() if lengths.size > 0 else 0
 
     # Rotrnar a estimativa           
     return maior
@@ -264,24 +262,11 @@ class H2Gen:
         # Copia a Structure para não alterar a original
         struct = struct.copy()
 
-        # Inicializando variáveis
-        center_of_mass = np.array([0,0,0], dtype=float)
-        n_atoms = 0
-
-        # Para cada átomo de carbono
-        for atom in struct.atoms:
-            if atom.elem == "C":
-
-                # Incrementar soma das posições e quantidade de carbonos
-                center_of_mass += atom.coord
-                n_atoms += 1
+        # Calcular centro de massa dos átomos de carbono
+        center_of_mass = struct.coords[struct.elems == "C"].mean(axis=0)
 
-        # Calcular centro de massa
-        center_of_mass = center_of_mass / n_atoms
-
-        # Transladar cada átomo da estrutura
-        for i in range(struct.size):
-            struct.atoms[i].coord -= np.round(center_of_mass, decimals=8)
+        # Transladar todos os átomos da estrutura
+        struct.coords -= np.round(center_of_mass, decimals=8)
 
         return struct
 
@@ -304,22 +289,8 @@ class H2Gen:
             Arrays das coordenadas x, y e z dos átomos da estrutura.
         """
 
-        import numpy as np
-
-        # Listas
-        xs, ys, zs = [], [], []
-
-        # Dividindo as váriaveis em arrays diferentes
-        for atom in struct.atoms:
-
-            xs.append(atom.coord[0])
-            ys.append(atom.coord[1])
-            zs.append(atom.coord[2])
-
-        # Transformando em array
-        xs = np.array(xs, dtype=float)
-        ys = np.array(ys, dtype=float)
-        zs = np.array(zs, dtype=float)
+        # Copiando cada coluna do bloco de coordenadas
+        xs, ys, zs = struct.coords.T.copy()
 
         # Retornando
         return xs, ys, zs
@@ -0,0 +1,552 @@
+from __future__ import annotations
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from dopings.structure import Structure
+from dopings.cpu_alloc import CoreAllocator, available_cpus
+from dopings.config import dirs_data
+
+"Este módulo contém a classe JobQueue"
+
+# Estados possíveis de uma otimização na fila
+JOB_STATES = ("pending", "running", "converged", "failed", "skipped")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT UNIQUE NOT NULL,
+    dir         TEXT NOT NULL,
+    material    TEXT,
+    dop_elem    TEXT,
+    base        TEXT,
+    site        TEXT,
+    param       TEXT,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    dftb_pid    INTEGER,
+    enqueued_at REAL,
+    started_at  REAL,
+    finished_at REAL,
+    wall_time   REAL,
+    message     TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+class _JobProcesses:
+
+    """
+    Registro do processo do DFTB+ de uma otimização em andamento (ver
+    "processes" em "Structure.opt"). O processo é acrescentado aos 
+    processos em execução do trabalhador, e o seu pid é guardado na 
+    fila (ver "JobQueue.recover"). Se o trabalhador estiver sendo 
+    encerrado, o processo é encerrado assim que é registrado.
+    """
+
+    def __init__(self, queue: "JobQueue", struct: Structure, running: dict, 
+                 stop: threading.Event) -> None:
+
+        self.queue = queue
+        self.struct = struct
+        self.running = running
+        self.stop = stop
+
+    def add(self, process) -> None:
+
+        self.running[process] = self.struct
+        self.queue._set_pid(self.struct, process.pid)
+
+        if self.stop.is_set():
+            process.terminate()
+
+    def discard(self, process) -> None:
+
+        self.running.pop(process, None)
+
+class JobQueue:
+
+    """
+    Fila persistente de otimizações, em um banco SQLite.
+
+    Cada otimização (identificada pelo nome da estrutura, ver
+    "Structure.name") tem um estado ("pending", "running", "converged",
+    "failed" ou "skipped"), o número de tentativas, o processo que a
+    executa e os tempos de entrada na fila, início, fim e de wall do
+    DFTB+.
+
+    O modo write de DopingSet coloca as otimizações na fila, e os
+    processos de trabalho (ver "drain" e sets_worker.py) as retiram,
+    uma por vez e de forma atômica, de forma que vários processos (em
+    uma ou mais máquinas com o mesmo sistema de arquivos) podem esvaziar
+    a mesma fila. Recolocar uma otimização já existente não altera o seu
+    estado, então um script interrompido recomeça de onde parou; as que
+    falharam podem ser devolvidas à fila com "requeue".
+
+    Attributes
+    ----------
+
+    path : Path
+        Endereço do banco.
+
+    Methods
+    -------
+
+    __init__(self, path: str|Path=None) -> None
+
+        Abre (ou cria) a fila.
+
+    enqueue(self, struct: Structure, force: bool=False) -> None
+
+        Coloca a otimização de uma estrutura na fila.
+
+    dequeue(self) -> Structure|None
+
+        Retira da fila a próxima otimização pendente.
+
+    finish(self, struct: Structure, state: str, wall_time: float=None, message: str=None) -> None
+
+        Registra o fim de uma otimização.
+
+    recover(self) -> int
+
+        Devolve à fila otimizações de processos encerrados.
+
+    requeue(self, states: tuple[str]=("failed",)) -> int
+
+        Devolve à fila otimizações encerradas nos estados informados.
+
+    counts(self) -> dict[str, int]
+
+        Número de otimizações em cada estado.
+
+    drain(self, n_jobs: int=1, threads_per_job: int=None, pin_cores: bool=True, **opt_kwargs) -> None
+
+        Executa otimizações da fila até esvaziá-la.
+    """
+
+    def __init__(self, path: str|Path=None) -> None:
+        """
+        Abre (ou cria) a fila.
+
+        Parameters
+        ----------
+
+        path : str|Path, default = None
+            Endereço do banco. Se None, usa "job_queue" de
+            dirs_data.json.
+        """
+
+        self.path = Path(path if path is not None
+                         else dirs_data["job_queue"]).expanduser()
+
+        Path.mkdir(self.path.parent, parents=True, exist_ok=True)
+
+        with self._connect() as db:
+            for statement in _SCHEMA.split(";"):
+                db.execute(statement)
+
+            # Filas criadas antes da coluna do pid do DFTB+
+            columns = [ row["name"] for row in db.execute("PRAGMA table_info(jobs)") ]
+            if "dftb_pid" not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN dftb_pid INTEGER")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Conexão com o banco, em uma transação. Cada operação abre a sua
+        conexão, de forma que a fila pode ser usada por várias threads.
+        """
+
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+
+        try:
+            # Trava de escrita desde o início da transação, para que a
+            # retirada de uma otimização seja atômica entre processos
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        finally:
+            db.close()
+
+    @staticmethod
+    def _worker_id() -> str:
+        """
+        Identificação do processo de trabalho atual (máquina:pid).
+        """
+
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def enqueue(self, struct: Structure, force: bool=False) -> None:
+        """
+        Coloca a otimização de uma estrutura na fila. Se ela já estiver
+        na fila, mantém o estado atual, a menos que "force" seja True.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura com nome e diretório definidos.
+
+        force : bool, default = False
+            Se deve voltar ao estado "pending" mesmo que já esteja na
+            fila (por exemplo, após reescrever os arquivos).
+
+        Raises
+        ------
+
+        ValueError
+            "Structure must have name and dir to be enqueued."
+        """
+
+        if struct.name() is None or struct.dir is None:
+            raise ValueError("Structure must have name and dir to be enqueued.")
+
+        with self._connect() as db:
+
+            db.execute("""INSERT OR IGNORE INTO jobs (name, dir, material, dop_elem,
+                                                     base, site, param, enqueued_at)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                       (struct.name(), str(struct.dir), struct.material,
+                        struct.dop_elem, struct.base, struct.site,
+                        struct.param, time.time()))
+
+            if force:
+                db.execute("""UPDATE jobs SET state = 'pending', worker = NULL,
+                                             enqueued_at = ?
+                              WHERE name = ? AND state != 'running'""",
+                           (time.time(), struct.name()))
+
+    def dequeue(self) -> Structure|None:
+        """
+        Retira da fila a próxima otimização pendente (na ordem de
+        entrada), marcando-a como "running".
+
+        Returns
+        -------
+
+        Structure
+            Estrutura a ser otimizada (sem átomos, apenas diretório e
+            propriedades da dopagem).
+
+        None
+            Se não houver otimizações pendentes.
+        """
+
+        with self._connect() as db:
+
+            row = db.execute("""SELECT * FROM jobs WHERE state = 'pending'
+                                ORDER BY id LIMIT 1""").fetchone()
+
+            if row is None:
+                return None
+
+            db.execute("""UPDATE jobs SET state = 'running', worker = ?,
+                                         dftb_pid = NULL, attempts = attempts + 1,
+                                         started_at = ?, finished_at = NULL
+                          WHERE id = ?""",
+                       (JobQueue._worker_id(), time.time(), row["id"]))
+
+        return Structure(dir=row["dir"], material=row["material"],
+                         dop_elem=row["dop_elem"], base=row["base"],
+                         site=row["site"], param=row["param"])
+
+    def finish(self, struct: Structure, state: str, wall_time: float=None,
+               message: str=None) -> None:
+        """
+        Registra o fim de uma otimização.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura retirada com "dequeue".
+
+        state : { "converged", "failed", "skipped", "pending" }
+            Estado final. "pending" devolve a otimização à fila.
+
+        wall_time : float, default = None
+            Tempo de wall do DFTB+, em segundos.
+
+        message : str, default = None
+            Mensagem (por exemplo, o erro ocorrido).
+
+        Raises
+        ------
+
+        ValueError
+            "state must be one of [states]."
+        """
+
+        if state not in JOB_STATES or state == "running":
+            raise ValueError(f"state must be one of {[s for s in JOB_STATES if s != 'running']}.")
+
+        with self._connect() as db:
+            db.execute("""UPDATE jobs SET state = ?, finished_at = ?, wall_time = ?,
+                                         message = ?, worker = NULL, dftb_pid = NULL
+                          WHERE name = ?""",
+                       (state, time.time(), wall_time, message, struct.name()))
+
+    def _set_pid(self, struct: Structure, pid: int) -> None:
+        """
+        Guarda o pid do DFTB+ de uma otimização em andamento.
+        """
+
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET dftb_pid = ? WHERE name = ?", 
+                       (pid, struct.name()))
+
+    def recover(self) -> int:
+        """
+        Devolve à fila ("pending") as otimizações marcadas como
+        "running" por processos desta máquina que não existem mais
+        (por exemplo, um trabalhador interrompido). Otimizações cujo 
+        DFTB+ ainda está rodando (sem o trabalhador) não são devolvidas,
+        para que outro DFTB+ não seja iniciado no mesmo diretório.
+
+        Returns
+        -------
+
+        int
+            Número de otimizações devolvidas.
+        """
+
+        host = socket.gethostname()
+        recovered = 0
+
+        with self._connect() as db:
+
+            rows = db.execute("""SELECT id, name, worker, dftb_pid FROM jobs
+                                 WHERE state = 'running'""").fetchall()
+
+            for row in rows:
+
+                worker_host, _, pid = (row["worker"] or "").rpartition(":")
+
+                if worker_host != host or not pid.isdigit():
+                    continue
+
+                # Verificando se o trabalhador, e depois o DFTB+, ainda 
+                # existem
+                if JobQueue._alive(int(pid)):
+                    continue
+
+                if row["dftb_pid"] is not None and JobQueue._alive(row["dftb_pid"]):
+                    print(f"WARNING: {row['name']} still running in DFTB+ process "
+                          f"{row['dftb_pid']}, not recovered")
+                    continue
+
+                db.execute("""UPDATE jobs SET state = 'pending', worker = NULL,
+                                             dftb_pid = NULL
+                              WHERE id = ?""", (row["id"],))
+                recovered += 1
+
+        return recovered
+
+    def requeue(self, states: tuple[str]=("failed",)) -> int:
+        """
+        Devolve à fila ("pending") as otimizações encerradas nos estados
+        informados, sem reescrever os seus arquivos (ver "enqueue" com 
+        "force"). Por padrão, as que falharam (por exemplo, por um erro
+        ou pelo fim do processo), que de outra forma não seriam 
+        tentadas novamente.
+
+        Parameters
+        ----------
+
+        states : tuple[str], default = ("failed",)
+            Estados das otimizações a serem devolvidas, entre "failed",
+            "skipped" e "converged".
+
+        Returns
+        -------
+
+        int
+            Número de otimizações devolvidas.
+
+        Raises
+        ------
+
+        ValueError
+            "states must be among ['converged', 'failed', 'skipped']."
+        """
+
+        finished = ("converged", "failed", "skipped")
+
+        if any( state not in finished for state in states ):
+            raise ValueError(f"states must be among {list(finished)}.")
+
+        with self._connect() as db:
+            cursor = db.execute(f"""UPDATE jobs SET state = 'pending', worker = NULL,
+                                                  enqueued_at = ?
+                                   WHERE state IN ({', '.join('?' * len(states))})""",
+                                (time.time(), *states))
+
+        return cursor.rowcount
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        """
+        Verifica se um processo desta máquina ainda existe.
+        """
+
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+
+        return True
+
+    def counts(self) -> dict[str, int]:
+        """
+        Número de otimizações em cada estado.
+        """
+
+        with self._connect() as db:
+            rows = db.execute("""SELECT state, COUNT(*) AS n FROM jobs
+                                 GROUP BY state""").fetchall()
+
+        counts = { state : 0 for state in JOB_STATES }
+        counts.update({ row["state"] : row["n"] for row in rows })
+
+        return counts
+
+    def drain(self, n_jobs: int=1, threads_per_job: int=None, 
+              pin_cores: bool=True, **opt_kwargs) -> None:
+        """
+        Executa otimizações da fila até que não haja mais pendentes,
+        mantendo até "n_jobs" otimizações simultâneas neste processo.
+        Antes, devolve à fila otimizações de processos encerrados (ver
+        "recover").
+
+        Com "pin_cores", cada otimização simultânea usa um conjunto 
+        disjunto de processadores (ver CoreAllocator). Para vários 
+        processos de trabalho na mesma máquina, cada um deve ser 
+        iniciado com a sua própria afinidade (por exemplo, com taskset).
+
+        Ao fim de cada otimização, o estado é registrado: "converged"
+        se a geometria convergiu, "skipped" se foi encerrada por uma
+        política de parada antecipada (ver EarlyStop), e "failed" nos
+        demais casos.
+
+        Se a execução for interrompida (Ctrl-C), nenhuma otimização 
+        nova é retirada da fila, os DFTB+ em execução são encerrados e
+        as suas otimizações voltam a "pending".
+
+        Parameters
+        ----------
+
+        n_jobs : int, default = 1
+            Número máximo de otimizações simultâneas.
+
+        threads_per_job : int, default = None
+            Número de threads de cada otimização. Se None, divide os
+            processadores disponíveis entre as otimizações.
+
+        pin_cores : bool, default = True
+            Se cada otimização deve ficar restrita ao seu conjunto de
+            processadores.
+
+        **opt_kwargs
+            Argumentos de "Structure.opt".
+        """
+
+        recovered = self.recover()
+        if recovered:
+            print(f"Recovered {recovered} interrupted optimizations")
+
+        # Conjuntos de processadores, apenas se as otimizações forem 
+        # restritas. Sem restrição, os processadores disponíveis são 
+        # apenas divididos entre as otimizações
+        if pin_cores:
+            slots = CoreAllocator(n_jobs, threads_per_job).slots
+        else:
+            slots = [None] * n_jobs
+
+            if threads_per_job is None:
+                threads_per_job = max(1, len(available_cpus()) // n_jobs)
+
+        # Sinal de encerramento, e processos do DFTB+ em execução (com a
+        # estrutura de cada um)
+        stop = threading.Event()
+        running = {}
+
+        def worker(cores):
+
+            while not stop.is_set():
+
+                struct = self.dequeue()
+
+                if struct is None:
+                    return
+
+                processes = _JobProcesses(self, struct, running, stop)
+
+                try:
+                    log = struct.opt(threads=len(cores) if threads_per_job is None 
+                                             else threads_per_job, 
+                                     cores=cores, processes=processes, 
+                                     **opt_kwargs)
+
+                except Exception as error:
+                    self.finish(struct, "failed", message=repr(error))
+                    print(f"ERROR: {struct.name()} - {error!r}")
+                    continue
+
+                if log is not None and log.converged is True:
+                    state = "converged"
+                elif stop.is_set():
+                    # Interrompida: volta para a fila
+                    self.finish(struct, "pending", message="interrupted")
+                    return
+                elif log is not None and log.stop_reason is not None:
+                    state = "skipped"
+                else:
+                    state = "failed"
+
+                self.finish(struct, state,
+                            wall_time=log.wall_time if log is not None else None,
+                            message=log.stop_reason if log is not None else None)
+
+                print(f"{struct.name()} -> {state} | {self.counts()}")
+
+        # Uma thread por otimização simultânea
+        threads = [ threading.Thread(target=worker, args=(cores,)) 
+                    for cores in slots ]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                thread.join()
+
+        except KeyboardInterrupt:
+
+            # Não retirar novas otimizações, e encerrar as que estão 
+            # rodando
+            stop.set()
+
+            print(f"Interrupted: terminating {len(running)} running optimizations")
+            for process in list(running):
+                process.terminate()
+
+            # Os trabalhadores devolvem as otimizações à fila
+            for thread in threads:
+                thread.join()
+
+            raise
@@ -0,0 +1,295 @@
+import numpy as np
+
+"Este módulo contém a classe NeighborIndex"
+
+# Deslocamentos de "meia vizinhança" entre células: a própria célula e 13
+# das 26 vizinhas, de forma que cada par de células vizinhas é visitado
+# uma única vez
+_HALF_OFFSETS = np.array([ (dx, dy, dz)
+                           for dx in (-1, 0, 1)
+                           for dy in (-1, 0, 1)
+                           for dz in (-1, 0, 1)
+                           if (dx, dy, dz) >= (0, 0, 0) ], dtype=np.int64)
+
+class NeighborIndex:
+
+    """
+    Índice espacial de um conjunto de coordenadas, baseado em lista de
+    células (cell list). Os átomos são distribuídos em uma grade de
+    células cúbicas de aresta igual ao raio de corte, de forma que os
+    vizinhos de um átomo só podem estar na sua própria célula ou nas 26
+    vizinhas. Assim, as buscas custam aproximadamente O(N), ao invés de
+    O(N²).
+
+    As grades são construídas sob demanda, uma por tamanho de célula, e
+    guardadas para as próximas buscas.
+
+    Obs: Não considera condições periódicas de contorno.
+
+    Attributes
+    ----------
+
+    coords : np.ndarray[float]
+        Array Nx3 das coordenadas indexadas (cópia).
+
+    size : int
+        Número de pontos indexados.
+
+    Methods
+    -------
+
+    __init__(self, coords: np.ndarray) -> None
+
+        Inicializa o índice a partir de um array Nx3 de coordenadas.
+
+    pairs(self, cutoff: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]
+
+        Retorna todos os pares (i < j) de pontos com distância menor ou
+        igual a "cutoff", e suas distâncias.
+
+    knn(self, k: int, queries: np.ndarray=None, targets: np.ndarray=None) -> tuple[np.ndarray, np.ndarray]
+
+        Retorna, para cada ponto de consulta, os "k" pontos alvo mais
+        próximos e suas distâncias.
+    """
+
+    def __init__(self, coords: np.ndarray) -> None:
+        """
+        Inicializa o índice a partir de um array Nx3 de coordenadas.
+
+        Parameters
+        ----------
+
+        coords : np.ndarray[float]
+            Array Nx3 das coordenadas dos pontos.
+
+        Raises
+        ------
+
+        ValueError
+            "coords must be an Nx3 array."
+        """
+
+        coords = np.array(coords, dtype=np.float64)
+
+        if coords.ndim != 2 or coords.shape[1] != 3:
+            raise ValueError("coords must be an Nx3 array.")
+
+        self.coords = coords
+        self.size = coords.shape[0]
+
+        # Caixa que envolve os pontos
+        if self.size > 0:
+            self._origin = coords.min(axis=0)
+            self._diagonal = float(np.linalg.norm(coords.max(axis=0) - self._origin))
+        else:
+            self._origin = np.zeros(3)
+            self._diagonal = 0.0
+
+        # Grades já construídas, por tamanho de célula
+        self._grids = {}
+
+    def _grid(self, cell: float) -> tuple:
+        """
+        Constrói (ou recupera) a grade de células de aresta "cell".
+
+        Retorna a ordem dos pontos ordenados por célula, o identificador
+        de célula de cada ponto (na ordem original), os identificadores
+        das células ocupadas, o início e a contagem de cada uma delas no
+        vetor ordenado, e os passos para linearizar índices de célula.
+        """
+
+        if cell in self._grids:
+            return self._grids[cell]
+
+        # Índice inteiro de célula em cada eixo. O deslocamento de 1
+        # garante que células vizinhas das bordas não tenham índices
+        # negativos
+        cells = np.floor((self.coords - self._origin) / cell).astype(np.int64) + 1
+        dims = cells.max(axis=0) + 2
+
+        # Passos para linearizar o índice (x, y, z)
+        strides = np.array([dims[1] * dims[2], dims[2], 1], dtype=np.int64)
+        cell_ids = cells @ strides
+
+        # Ordenando pontos por célula
+        order = np.argsort(cell_ids, kind="stable")
+        occupied, starts, counts = np.unique(cell_ids[order], return_index=True,
+                                             return_counts=True)
+
+        grid = (order, cell_ids, occupied, starts, counts, strides)
+        self._grids[cell] = grid
+
+        return grid
+
+    def pairs(self, cutoff: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retorna todos os pares (i < j) de pontos com distância menor ou
+        igual a "cutoff", e suas distâncias.
+
+        Parameters
+        ----------
+
+        cutoff : float
+            Raio de corte.
+
+        Returns
+        -------
+
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            Índices i, índices j e distâncias de cada par.
+
+        Raises
+        ------
+
+        ValueError
+            "cutoff must be positive."
+        """
+
+        if cutoff <= 0:
+            raise ValueError("cutoff must be positive.")
+
+        empty = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp),
+                 np.zeros(0, dtype=np.float64))
+
+        if self.size < 2:
+            return empty
+
+        # Raios maiores que a caixa são equivalentes a ela, e evitam
+        # grades diferentes para raios diferentes
+        cell = float(min(cutoff, self._diagonal)) or 1.0
+
+        order, cell_ids, occupied, starts, counts, strides = self._grid(cell)
+
+        # Células vizinhas (meia vizinhança) da célula de cada ponto
+        neigh_ids = cell_ids[:, None] + (_HALF_OFFSETS @ strides)[None, :]
+        pos = np.searchsorted(occupied, neigh_ids)
+        pos = np.minimum(pos, occupied.size - 1)
+        found = occupied[pos] == neigh_ids
+
+        # Pares (ponto, célula vizinha ocupada)
+        points, offsets = np.nonzero(found)
+        neigh_cells = pos[points, offsets]
+
+        # Expandindo cada par (ponto, célula) em pares de pontos
+        reps = counts[neigh_cells]
+        total = int(reps.sum())
+
+        if total == 0:
+            return empty
+
+        i = np.repeat(points, reps)
+        first = np.repeat(starts[neigh_cells], reps)
+        within = np.arange(total) - np.repeat(np.cumsum(reps) - reps, reps)
+        j = order[first + within]
+
+        # Na própria célula (deslocamento 0, o primeiro), cada par
+        # aparece duas vezes: mantém apenas i < j. Entre células
+        # diferentes, cada par aparece uma única vez
+        same_cell = np.repeat(offsets == 0, reps)
+        keep = ~same_cell | (i < j)
+        i, j = i[keep], j[keep]
+
+        # Calculando distâncias e aplicando o raio de corte
+        dist = np.linalg.norm(self.coords[i] - self.coords[j], axis=1)
+        keep = dist <= cutoff
+        i, j, dist = i[keep], j[keep], dist[keep]
+
+        # Padronizando a ordem dos índices de cada par
+        i, j = np.minimum(i, j), np.maximum(i, j)
+
+        return i, j, dist
+
+    def knn(self, k: int, queries: np.ndarray=None,
+            targets: np.ndarray=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna, para cada ponto de consulta, os "k" pontos alvo mais
+        próximos e suas distâncias. Um ponto nunca é vizinho de si
+        mesmo.
+
+        O raio de busca parte de uma estimativa pela densidade de
+        pontos, e é dobrado até que todas as consultas tenham "k"
+        vizinhos (ou todos os alvos disponíveis).
+
+        Parameters
+        ----------
+
+        k : int
+            Número de vizinhos.
+
+        queries : np.ndarray[bool], default = None
+            Máscara dos pontos de consulta. Se None, todos os pontos.
+
+        targets : np.ndarray[bool], default = None
+            Máscara dos pontos que podem ser vizinhos. Se None, todos os
+            pontos.
+
+        Returns
+        -------
+
+        tuple[np.ndarray, np.ndarray]
+            Arrays (Q, k) com os índices e as distâncias dos vizinhos
+            de cada consulta, em ordem crescente de distância. Posições
+            sem vizinho têm índice -1 e distância infinita.
+
+        Raises
+        ------
+
+        ValueError
+            "k must be positive."
+        """
+
+        if k <= 0:
+            raise ValueError("k must be positive.")
+
+        queries = np.ones(self.size, dtype=bool) if queries is None else np.asarray(queries, dtype=bool)
+        targets = np.ones(self.size, dtype=bool) if targets is None else np.asarray(targets, dtype=bool)
+
+        query_ids = np.flatnonzero(queries)
+
+        indices = np.full((query_ids.size, k), -1, dtype=np.intp)
+        distances = np.full((query_ids.size, k), np.inf)
+
+        if query_ids.size == 0 or self.size < 2:
+            return indices, distances
+
+        # Vizinhos necessários por consulta (o próprio ponto não conta)
+        needed = np.minimum(k, targets.sum() - targets[query_ids])
+
+        # Estimativa inicial do raio pelo volume médio por ponto
+        radius = max((k * self._diagonal**3 / self.size)**(1/3), 1e-3)
+
+        while True:
+
+            i, j, dist = self.pairs(radius)
+
+            # Pares nos dois sentidos (consulta -> alvo)
+            q = np.concatenate([i, j])
+            t = np.concatenate([j, i])
+            d = np.concatenate([dist, dist])
+
+            keep = queries[q] & targets[t]
+            q, t, d = q[keep], t[keep], d[keep]
+
+            found = np.bincount(q, minlength=self.size)[query_ids]
+
+            if np.all(found >= needed) or radius >= self._diagonal:
+                break
+
+            radius *= 2
+
+        # Ordenando por consulta e, dentro de cada consulta, por distância
+        order = np.lexsort((d, q))
+        q, t, d = q[order], t[order], d[order]
+
+        # Posição de cada vizinho dentro da sua consulta
+        starts = np.searchsorted(q, q, side="left")
+        rank = np.arange(q.size) - starts
+
+        keep = rank < k
+        rows = np.searchsorted(query_ids, q[keep])
+
+        indices[rows, rank[keep]] = t[keep]
+        distances[rows, rank[keep]] = d[keep]
+
+        return indices, distances
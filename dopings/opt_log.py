@@ -0,0 +1,484 @@
+from __future__ import annotations
+
+import os
+import gzip
+import subprocess
+from pathlib import Path
+from typing import Iterator
+
+"Este módulo contém as classes OptimizationLog e OutputFollower"
+
+class OptimizationLog:
+
+    """
+    Resumo de um arquivo de output de otimização do DFTB+, obtido em uma
+    única leitura do arquivo.
+
+    O parser é incremental: as linhas podem ser passadas uma a uma (ver
+    "feed"), na ordem do arquivo, de forma que o mesmo objeto pode ser
+    atualizado enquanto a otimização ainda está escrevendo o arquivo.
+
+    Attributes
+    ----------
+
+    steps_offsets : list[int]
+        Posição (em bytes) do início de cada passo de otimização no
+        arquivo.
+
+    SCC_converged : list[bool]
+        Para cada passo, se o SCC convergiu.
+
+    energies : list[float|None]
+        Para cada passo, a energia total (eV). None se o passo ainda não
+        tiver escrito a energia.
+
+    extrapolated_energy : float|None
+        Última energia extrapolada para o 0K (eV) escrita no arquivo.
+
+    converged : bool|None
+        True se foi encontrado que a geometria convergiu, False se foi
+        encontrado que não convergiu, e None se nenhum dos dois foi
+        encontrado (otimização em andamento ou interrompida).
+
+    stop_reason : str|None
+        Motivo do encerramento da otimização por uma política de parada
+        antecipada (ver EarlyStop), ou None se não foi encerrada.
+
+    wall_time : float|None
+        Tempo total de wall da otimização, em segundos.
+
+    cpu_time : float|None
+        Tempo total de cpu da otimização, em segundos.
+
+    steps : list[int]
+        Números dos passos escritos no arquivo => [0, 1, 2, ...]
+
+    not_conv_SCC_steps : list[int]
+        Passos onde o SCC não convergiu.
+
+    Methods
+    -------
+
+    __init__(self) -> None
+
+        Inicializa um OptimizationLog vazio.
+
+    feed(self, line: str, offset: int=None) -> None
+
+        Processa uma linha do arquivo de output.
+
+    from_file(path: str|Path) -> OptimizationLog
+
+        Lê um arquivo de output inteiro, em uma única passagem.
+
+    from_files(paths: list[str|Path]) -> OptimizationLog
+
+        Lê, como um único output, um output dividido em partes.
+
+    summary(self) -> dict
+
+        Resumo compacto, serializável em JSON (ver OptManifest).
+
+    from_summary(summary: dict) -> OptimizationLog
+
+        Reconstrói um OptimizationLog a partir de um resumo compacto.
+    """
+
+    def __init__(self) -> None:
+        """
+        Inicializa um OptimizationLog vazio.
+        """
+
+        self.steps_offsets = []
+        self.SCC_converged = []
+        self.energies = []
+        self.extrapolated_energy = None
+        self.not_conv_SCC_steps = []
+        self.converged = None
+        self.stop_reason = None
+        self.wall_time = None
+        self.cpu_time = None
+
+        # Posição da próxima linha, caso não seja informada em "feed"
+        self._offset = 0
+
+    @property
+    def steps(self) -> list[int]:
+
+        return list(range(len(self.steps_offsets)))
+
+    def feed(self, line: str, offset: int=None) -> None:
+        """
+        Processa uma linha do arquivo de output. As linhas devem ser
+        passadas na ordem em que aparecem no arquivo.
+
+        Parameters
+        ----------
+
+        line : str
+            Linha do arquivo.
+
+        offset : int, default = None
+            Posição (em bytes) do início da linha no arquivo. Se None, é
+            estimada pela soma dos tamanhos das linhas anteriores.
+        """
+
+        if offset is None:
+            offset = self._offset
+
+        self._offset = offset + len(line.encode())
+
+        # Início de um passo de otimização
+        if "Geometry step:" in line:
+            self.steps_offsets.append(offset)
+            self.SCC_converged.append(True)
+            self.energies.append(None)
+
+        # Marcadores que só fazem sentido dentro de um passo
+        elif "SCC is NOT converged" in line:
+            if self.SCC_converged and self.SCC_converged[-1]:
+                self.SCC_converged[-1] = False
+                self.not_conv_SCC_steps.append(len(self.SCC_converged) - 1)
+
+        elif line.startswith("Total Energy:"):
+            if self.energies:
+                self.energies[-1] = float(line.split()[4])
+
+        elif line.startswith("Extrapolated to 0K:"):
+            self.extrapolated_energy = float(line.split()[5])
+
+        # Veredito da otimização. Se "convergiu" for encontrado, ele
+        # prevalece
+        elif "Geometry converged" in line:
+            self.converged = True
+
+        elif ("Geometry NOT converged" in line
+              or "Geometry did NOT converge" in line):
+            if self.converged is None:
+                self.converged = False
+
+        # Tempos totais, ao final do arquivo
+        elif line.startswith("Total") and "=" in line:
+
+            terms = line.split()
+
+            if len(terms) > 4 and terms[1] == "=":
+                self.cpu_time = float(terms[2])
+                self.wall_time = float(terms[4])
+
+    @staticmethod
+    def from_file(path: str|Path) -> OptimizationLog:
+        """
+        Lê um arquivo de output inteiro, em uma única passagem. Arquivos
+        terminados em ".gz" são descomprimidos durante a leitura.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo de output.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo da otimização.
+        """
+
+        return OptimizationLog.from_files([path])
+
+    @staticmethod
+    def from_files(paths: list[str|Path]) -> OptimizationLog:
+        """
+        Lê, como um único output, um output dividido em partes (por 
+        exemplo, os segmentos guardados a cada reinício, ver
+        "Structure.redo_files_for_resume"), na ordem passada. As 
+        posições dos passos são contadas a partir do início da primeira
+        parte, e os tempos são a soma dos tempos de cada parte.
+
+        Parameters
+        ----------
+
+        paths : list[str|Path]
+            Endereços das partes, na ordem em que foram escritas. 
+            Arquivos terminados em ".gz" são descomprimidos durante a
+            leitura.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo da otimização.
+        """
+
+        log = OptimizationLog()
+
+        offset = 0
+        wall_times, cpu_times = [], []
+
+        for path in paths:
+
+            opener = gzip.open if str(path).endswith(".gz") else open
+
+            # Tempos de cada parte
+            log.wall_time, log.cpu_time = None, None
+
+            # Lendo em binário para ter as posições em bytes
+            with opener(path, "rb") as file:
+
+                for linha in file:
+
+                    log.feed(linha.decode(errors="replace"), offset)
+                    offset += len(linha)
+
+            if log.wall_time is not None:
+                wall_times.append(log.wall_time)
+                cpu_times.append(log.cpu_time)
+
+        log.wall_time = sum(wall_times) if wall_times else None
+        log.cpu_time = sum(cpu_times) if cpu_times else None
+
+        return log
+
+    def summary(self) -> dict:
+        """
+        Resumo compacto, serializável em JSON: convergência, número de 
+        passos, passos com SCC não convergido, energias finais e tempos.
+        As posições dos passos no arquivo não são guardadas.
+
+        Returns
+        -------
+
+        dict
+            Resumo da otimização.
+        """
+
+        return {"converged"           : self.converged,
+                "stop_reason"         : self.stop_reason,
+                "n_steps"             : len(self.steps_offsets),
+                "not_conv_SCC_steps"  : list(self.not_conv_SCC_steps),
+                "energy"              : self.energies[-1] if self.energies else None,
+                "extrapolated_energy" : self.extrapolated_energy,
+                "wall_time"           : self.wall_time,
+                "cpu_time"            : self.cpu_time}
+
+    @staticmethod
+    def from_summary(summary: dict) -> OptimizationLog:
+        """
+        Reconstrói um OptimizationLog a partir de um resumo compacto 
+        (ver "summary"). As posições dos passos ficam como None, e só a
+        energia do último passo é conhecida.
+
+        Parameters
+        ----------
+
+        summary : dict
+            Resumo da otimização.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo da otimização.
+        """
+
+        log = OptimizationLog()
+
+        n_steps = summary["n_steps"]
+
+        log.steps_offsets = [None] * n_steps
+        log.not_conv_SCC_steps = list(summary["not_conv_SCC_steps"])
+
+        log.SCC_converged = [True] * n_steps
+        for step in log.not_conv_SCC_steps:
+            log.SCC_converged[step] = False
+
+        log.energies = [None] * n_steps
+        if n_steps > 0:
+            log.energies[-1] = summary["energy"]
+
+        log.extrapolated_energy = summary["extrapolated_energy"]
+        log.converged = summary["converged"]
+        log.stop_reason = summary.get("stop_reason")
+        log.wall_time = summary["wall_time"]
+        log.cpu_time = summary["cpu_time"]
+
+        return log
+
+class OutputFollower:
+
+    """
+    Acompanha um arquivo de output que ainda está sendo escrito, 
+    mantendo um OptimizationLog atualizado.
+
+    Guarda a posição (em bytes) até onde o arquivo já foi lido e o 
+    estado do parser, de forma que cada consulta lê apenas os bytes 
+    escritos desde a consulta anterior. Linhas incompletas ficam 
+    guardadas até serem terminadas.
+
+    Se o arquivo for truncado ou substituído, a leitura recomeça do 
+    início.
+
+    Attributes
+    ----------
+
+    path : Path
+        Endereço do arquivo de output.
+
+    offset : int
+        Posição (em bytes) até onde o arquivo já foi lido.
+
+    log : OptimizationLog
+        Resumo do conteúdo lido até então.
+
+    Methods
+    -------
+
+    __init__(self, path: str|Path) -> None
+
+        Inicializa o acompanhamento do arquivo, ainda sem lê-lo.
+
+    poll(self, final: bool=False) -> OptimizationLog
+
+        Lê o que foi escrito desde a última consulta e retorna o resumo
+        atualizado.
+
+    follow(self, process, interval: float=1.0) -> Iterator[OptimizationLog]
+
+        Acompanha o arquivo enquanto um processo o escreve.
+    """
+
+    def __init__(self, path: str|Path) -> None:
+        """
+        Inicializa o acompanhamento do arquivo, ainda sem lê-lo.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo de output.
+        """
+
+        self.path = Path(path).expanduser()
+        self._reset()
+
+    def _reset(self) -> None:
+        """
+        Volta ao início do arquivo, descartando o que foi lido.
+        """
+
+        self.offset = 0
+        self.log = OptimizationLog()
+
+        # Trecho de linha ainda não terminada
+        self._partial = b""
+
+        # Identificação do arquivo lido (device, inode)
+        self._file_id = None
+
+    def poll(self, final: bool=False) -> OptimizationLog:
+        """
+        Lê o que foi escrito desde a última consulta e retorna o resumo
+        atualizado. Se o arquivo não existir, retorna o resumo atual.
+
+        Parameters
+        ----------
+
+        final : bool, default = False
+            Se o arquivo não vai mais ser escrito (o processo encerrou).
+            Nesse caso, uma última linha sem quebra de linha também é 
+            processada.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo do conteúdo lido até então.
+        """
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.log
+
+        file_id = (stat.st_dev, stat.st_ino)
+
+        # Se o arquivo foi substituído ou truncado, recomeçar
+        if ((self._file_id is not None and file_id != self._file_id) 
+            or stat.st_size < self.offset):
+            self._reset()
+
+        self._file_id = file_id
+
+        # Lendo apenas os bytes novos, se houver
+        data = b""
+
+        if stat.st_size != self.offset:
+            with open(self.path, "rb") as file:
+                file.seek(self.offset)
+                data = file.read()
+
+        # Posição do início do trecho ainda não processado
+        line_offset = self.offset - len(self._partial)
+        self.offset += len(data)
+
+        lines = (self._partial + data).split(b"\n")
+
+        # O último trecho não terminou (ou é vazio)
+        self._partial = lines.pop()
+
+        # Sem mais escritas, o último trecho é a última linha
+        if final and self._partial:
+            lines.append(self._partial)
+            self._partial = b""
+
+        for linha in lines:
+
+            self.log.feed(linha.decode(errors="replace") + "\n", line_offset)
+            line_offset += len(linha) + 1
+
+        return self.log
+
+    def follow(self, process, interval: float=1.0) -> Iterator[OptimizationLog]:
+        """
+        Acompanha o arquivo enquanto um processo o escreve (por exemplo,
+        o DFTB+ com a saída redirecionada para o arquivo, ver 
+        "Structure.opt"). A cada intervalo o arquivo é consultado (ver 
+        "poll"), e o resumo é retornado sempre que algo novo foi lido.
+        Termina assim que o processo encerra, após uma última leitura.
+
+        Parameters
+        ----------
+
+        process : subprocess.Popen
+            Processo que escreve o arquivo.
+
+        interval : float, default = 1.0
+            Intervalo (em segundos) entre as consultas.
+
+        Yields
+        ------
+
+        OptimizationLog
+            Resumo do conteúdo lido até então.
+        """
+
+        while True:
+
+            # Verificar antes de ler, para não perder o final do arquivo
+            running = process.poll() is None
+
+            offset, partial = self.offset, self._partial
+            log = self.poll(final=not running)
+
+            if self.offset != offset or self._partial != partial:
+                yield log
+
+            if not running:
+                return
+
+            # Esperar o intervalo, ou menos se o processo encerrar antes
+            try:
+                process.wait(timeout=interval)
+            except subprocess.TimeoutExpired:
+                pass
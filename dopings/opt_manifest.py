@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import os
+import json
+import fcntl
+from pathlib import Path
+
+from dopings.opt_log import OptimizationLog
+from dopings.config import dirs_data, main_config
+
+"Este módulo contém a classe OptManifest"
+
+# Versão do formato do manifesto. Se mudar, as entradas antigas são
+# ignoradas
+MANIFEST_FORMAT_VERSION = 1
+
+# Nome do arquivo de manifesto, na raiz de cada árvore de otimizações
+MANIFEST_NAME = "manifest.json"
+
+# Manifestos já abertos, por raiz
+_manifests = {}
+
+class OptManifest:
+
+    """
+    Manifesto de uma árvore de otimizações (por exemplo
+    "opt_files/<material>/<dop_elem>"): um único arquivo JSON na raiz da
+    árvore com o resumo do output de cada otimização (convergência,
+    passos, SCC não convergidos, energias e tempos, ver
+    "OptimizationLog.summary").
+
+    Cada entrada é identificada pelo diretório da otimização (relativo à
+    raiz) e guarda o tamanho e a data de modificação do output resumido.
+    Se o output mudar, a entrada é ignorada e o output é lido de novo.
+
+    As entradas são gravadas quando uma otimização termina (ver
+    "Structure.opt") ou quando um output terminado é lido pela primeira
+    vez. A gravação é feita com trava de arquivo e escrita atômica, de
+    forma que vários processos podem atualizar o mesmo manifesto.
+
+    Attributes
+    ----------
+
+    root : Path
+        Raiz da árvore de otimizações.
+
+    path : Path
+        Endereço do arquivo de manifesto.
+
+    Methods
+    -------
+
+    __init__(self, root: str|Path) -> None
+
+        Inicializa o manifesto da árvore com raiz "root".
+
+    for_struct(struct: Structure) -> OptManifest|None
+
+        Manifesto da árvore de otimizações de uma estrutura dopada.
+
+    lookup(self, dir: Path) -> OptimizationLog|None
+
+        Resumo guardado do output de uma otimização, se ainda for
+        válido.
+
+    record(self, dir: Path, log: OptimizationLog) -> None
+
+        Guarda o resumo do output de uma otimização.
+
+    read_log(self, dir: Path) -> OptimizationLog|None
+
+        Resumo do output de uma otimização, do manifesto ou, se
+        necessário, do arquivo.
+
+    summaries(self) -> dict[str, dict]
+
+        Resumos guardados de todas as otimizações da árvore.
+    """
+
+    def __init__(self, root: str|Path) -> None:
+        """
+        Inicializa o manifesto da árvore com raiz "root". O arquivo só é
+        lido quando necessário.
+
+        Parameters
+        ----------
+
+        root : str|Path
+            Raiz da árvore de otimizações.
+        """
+
+        self.root = Path(root).expanduser()
+        self.path = self.root / MANIFEST_NAME
+
+        # Entradas lidas, e data de modificação do arquivo lido
+        self._entries = {}
+        self._mtime_ns = None
+
+    @staticmethod
+    def for_struct(struct: "Structure") -> OptManifest|None:
+        """
+        Manifesto da árvore de otimizações de uma estrutura dopada,
+        "<dopings_opt>/<material>/<dop_elem>" (ver
+        "DopingSet.infer_dops_dir"). Os manifestos são abertos uma única
+        vez por processo.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura com diretório, material e elemento de dopagem.
+
+        Returns
+        -------
+
+        OptManifest
+            Manifesto da árvore.
+
+        None
+            Se a estrutura não pertencer a uma árvore de otimizações.
+        """
+
+        if struct.dir is None or struct.material is None or struct.dop_elem is None:
+            return None
+
+        root = Path(dirs_data["dopings_opt"]).expanduser() / struct.material / struct.dop_elem
+
+        # A estrutura deve estar dentro da árvore
+        root_abs = os.path.abspath(root)
+        if os.path.commonpath([root_abs, os.path.abspath(struct.dir)]) != root_abs:
+            return None
+
+        if root_abs not in _manifests:
+            _manifests[root_abs] = OptManifest(root)
+
+        return _manifests[root_abs]
+
+    def _key(self, dir: Path) -> str:
+        """
+        Identificação de uma otimização: diretório relativo à raiz.
+        """
+
+        return Path(os.path.relpath(os.path.abspath(dir),
+                                    os.path.abspath(self.root))).as_posix()
+
+    def _load(self) -> dict:
+        """
+        Lê o arquivo de manifesto, se tiver mudado desde a última
+        leitura. Arquivos ausentes, corrompidos ou de outra versão são
+        tratados como vazios.
+        """
+
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._entries, self._mtime_ns = {}, None
+            return self._entries
+
+        if mtime_ns == self._mtime_ns:
+            return self._entries
+
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            data = {}
+
+        if data.get("version") != MANIFEST_FORMAT_VERSION:
+            data = {"entries" : {}}
+
+        self._entries, self._mtime_ns = data["entries"], mtime_ns
+
+        return self._entries
+
+    def lookup(self, dir: Path) -> OptimizationLog|None:
+        """
+        Resumo guardado do output de uma otimização, se o output ainda
+        tiver o mesmo tamanho e data de modificação.
+
+        Parameters
+        ----------
+
+        dir : Path
+            Diretório da otimização.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo reconstruído (ver "OptimizationLog.from_summary").
+
+        None
+            Se não houver entrada válida, ou o output não existir.
+        """
+
+        try:
+            stat = os.stat(Path(dir) / main_config["output_name"])
+        except FileNotFoundError:
+            return None
+
+        entry = self._load().get(self._key(dir))
+
+        if (entry is None or entry["size"] != stat.st_size
+            or entry["mtime_ns"] != stat.st_mtime_ns):
+            return None
+
+        return OptimizationLog.from_summary(entry["log"])
+
+    def record(self, dir: Path, log: OptimizationLog) -> None:
+        """
+        Guarda o resumo do output de uma otimização, junto do tamanho e
+        data de modificação atuais do output. Se o manifesto não puder
+        ser escrito, não faz nada.
+
+        Parameters
+        ----------
+
+        dir : Path
+            Diretório da otimização.
+
+        log : OptimizationLog
+            Resumo do output atual da otimização.
+        """
+
+        try:
+            stat = os.stat(Path(dir) / main_config["output_name"])
+        except FileNotFoundError:
+            return
+
+        entry = {"size"     : stat.st_size,
+                 "mtime_ns" : stat.st_mtime_ns,
+                 "log"      : log.summary()}
+
+        try:
+            Path.mkdir(self.root, parents=True, exist_ok=True)
+
+            # Trava exclusiva, para que atualizações de outros processos
+            # não se percam
+            with open(self.path.with_name(MANIFEST_NAME + ".lock"), "a") as lock:
+
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+                # Relendo, já com a trava, e acrescentando a entrada
+                entries = dict(self._load())
+                entries[self._key(dir)] = entry
+
+                tmp_path = self.path.with_name(MANIFEST_NAME + ".tmp")
+
+                with open(tmp_path, "w") as file:
+                    json.dump({"version" : MANIFEST_FORMAT_VERSION,
+                               "entries" : entries}, file)
+
+                os.replace(tmp_path, self.path)
+
+                self._entries = entries
+                self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+        except OSError:
+            return
+
+    def read_log(self, dir: Path) -> OptimizationLog|None:
+        """
+        Resumo do output de uma otimização. Usa o manifesto se a entrada
+        for válida; se não, lê o output e, se a otimização tiver
+        terminado, guarda o resumo no manifesto.
+
+        Parameters
+        ----------
+
+        dir : Path
+            Diretório da otimização.
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo da otimização.
+
+        None
+            Se o output não existir.
+        """
+
+        log = self.lookup(dir)
+
+        if log is not None:
+            return log
+
+        output = Path(dir) / main_config["output_name"]
+
+        if not output.is_file():
+            return None
+
+        log = OptimizationLog.from_file(output)
+
+        # Só guardar otimizações terminadas
+        if log.converged is not None:
+            self.record(dir, log)
+
+        return log
+
+    def summaries(self) -> dict[str, dict]:
+        """
+        Resumos guardados de todas as otimizações da árvore (ver
+        "OptimizationLog.summary"), por diretório relativo à raiz, sem
+        verificar se os outputs mudaram.
+
+        Returns
+        -------
+
+        dict[str, dict]
+            Resumo de cada otimização.
+        """
+
+        return { key : entry["log"] for key, entry in self._load().items() }
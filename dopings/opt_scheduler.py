@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dopings.cpu_alloc import CoreAllocator, available_cpus
+from dopings.config import main_config
+
+"Este módulo contém a classe OptScheduler"
+
+class OptScheduler:
+
+    """
+    Executa otimizações de várias estruturas ao mesmo tempo, mantendo
+    até "n_jobs" processos do DFTB+ rodando, cada um com
+    "threads_per_job" threads (OMP_NUM_THREADS). Por padrão, cada
+    otimização fica restrita a um conjunto próprio de processadores
+    (ver CoreAllocator).
+
+    Cada otimização é acompanhada por uma thread, que executa
+    "Structure.opt" (com as mesmas regras de SCC difícil e de
+    recomeço). Assim que uma otimização termina, a próxima da fila é
+    iniciada. Ao fim de cada otimização, é impresso o progresso do
+    conjunto. Se a execução for interrompida (Ctrl-C), as otimizações
+    da fila não são iniciadas e as que estão rodando são encerradas.
+
+    Attributes
+    ----------
+
+    n_jobs : int
+        Número máximo de otimizações simultâneas.
+
+    threads_per_job : int
+        Número de threads de cada otimização.
+
+    bin_dir : str|Path|None
+        Executável usado nas otimizações. Se None, usa o padrão de
+        "Structure.opt".
+
+    allocator : CoreAllocator|None
+        Divisão dos processadores entre as otimizações, ou None se as
+        otimizações não forem restritas.
+
+    Methods
+    -------
+
+    __init__(self, n_jobs: int=None, threads_per_job: int=None, bin_dir: str|Path=None, pin_cores: bool=None) -> None
+
+        Inicializa o escalonador.
+
+    run(self, structs: list[Structure], **opt_kwargs) -> list[tuple[Structure, Exception]]
+
+        Otimiza as estruturas, e retorna as que falharam.
+    """
+
+    def __init__(self, n_jobs: int=None, threads_per_job: int=None,
+                 bin_dir: str|Path=None, pin_cores: bool=None) -> None:
+        """
+        Inicializa o escalonador.
+
+        Parameters
+        ----------
+
+        n_jobs : int, default = None
+            Número máximo de otimizações simultâneas. Se None, usa
+            "opt_jobs" de main_config.json (padrão 1).
+
+        threads_per_job : int, default = None
+            Número de threads de cada otimização. Se None, usa
+            "opt_threads_per_job" de main_config.json; se também não
+            estiver definido, divide os processadores disponíveis 
+            entre as otimizações.
+
+        bin_dir : str|Path, default = None
+            Executável usado nas otimizações (permite usar um substituto
+            do DFTB+). Se None, usa o padrão de "Structure.opt".
+
+        pin_cores : bool, default = None
+            Se cada otimização deve ficar restrita a um conjunto 
+            disjunto de processadores. Se None, usa "opt_pin_cores" de
+            main_config.json (padrão True).
+
+        Raises
+        ------
+
+        ValueError
+            "n_jobs and threads_per_job must be positive."
+        """
+
+        if n_jobs is None:
+            n_jobs = main_config.get("opt_jobs", 1)
+
+        if threads_per_job is None:
+            threads_per_job = main_config.get("opt_threads_per_job")
+
+        if threads_per_job is None:
+            threads_per_job = max(1, len(available_cpus()) // max(n_jobs, 1))
+
+        if n_jobs < 1 or threads_per_job < 1:
+            raise ValueError("n_jobs and threads_per_job must be positive.")
+
+        self.n_jobs = n_jobs
+        self.threads_per_job = threads_per_job
+        self.bin_dir = bin_dir
+
+        if pin_cores is None:
+            pin_cores = main_config.get("opt_pin_cores", True)
+
+        self.allocator = (CoreAllocator(n_jobs, threads_per_job) 
+                          if pin_cores else None)
+
+        # Trava das impressões de progresso
+        self._lock = threading.Lock()
+
+        # Processos do DFTB+ rodando (ver "Structure.opt")
+        self._processes = set()
+
+    def run(self, structs: list["Structure"],
+            **opt_kwargs) -> list[tuple["Structure", Exception]]:
+        """
+        Otimiza as estruturas, mantendo até "n_jobs" otimizações
+        simultâneas. Erros em uma otimização não interrompem as demais.
+
+        Parameters
+        ----------
+
+        structs : list[Structure]
+            Estruturas a serem otimizadas, na ordem da fila.
+
+        **opt_kwargs
+            Argumentos de "Structure.opt" (overwrite, verbose,
+            skip_hard_to_conv_SCC, resume_unfineshed).
+
+        Returns
+        -------
+
+        list[tuple[Structure, Exception]]
+            Estruturas cuja otimização falhou, e o erro de cada uma.
+        """
+
+        total = len(structs)
+        finished = 0
+        failed = []
+
+        def job(struct):
+
+            if self.allocator is None:
+                struct.opt(threads=self.threads_per_job, bin_dir=self.bin_dir,
+                           processes=self._processes, **opt_kwargs)
+                return
+
+            # Conjunto de processadores livre durante a otimização
+            with self.allocator.slot() as cores:
+                struct.opt(threads=self.threads_per_job, cores=cores, 
+                           bin_dir=self.bin_dir, processes=self._processes, 
+                           **opt_kwargs)
+
+        print(f"Running {total} optimizations: {self.n_jobs} at a time, "
+              f"{self.threads_per_job} threads each")
+
+        executor = ThreadPoolExecutor(max_workers=self.n_jobs)
+
+        try:
+            futures = { executor.submit(job, struct) : struct for struct in structs }
+
+            # Conforme as otimizações terminam
+            for future in as_completed(futures):
+
+                struct = futures[future]
+                id = struct.name() if struct.name() is not None else struct.dir
+
+                finished += 1
+
+                error = future.exception()
+                if error is not None:
+                    failed.append((struct, error))
+
+                running = min(self.n_jobs, total - finished)
+
+                with self._lock:
+
+                    if error is not None:
+                        print(f"ERROR: {id} - {error!r}")
+
+                    print(f"[{finished}/{total}] {id} finished | "
+                          f"running: {running} | failed: {len(failed)}")
+
+        except KeyboardInterrupt:
+
+            # Não iniciar as otimizações da fila
+            executor.shutdown(wait=False, cancel_futures=True)
+
+            # Encerrar as que estão rodando
+            with self._lock:
+                print(f"Interrupted: terminating {len(self._processes)} running optimizations")
+                for process in list(self._processes):
+                    process.terminate()
+
+            raise
+
+        finally:
+            executor.shutdown()
+
+        return failed
@@ -239,7 +239,8 @@ class SetViz:
             """
 
             import statistics as stats
-            delta_charges = [atom.charge - atoms_data["valency"][atom.elem] for atom in struct.atoms]
+            valency = [atoms_data["valency"][elem] for elem in struct.elems]
+            delta_charges = (struct.charges - np.array(valency)).tolist()
             return stats.stdev(delta_charges, xbar=0)
 
         # Validando opção de second_var
@@ -276,6 +277,9 @@ class SetViz:
             # Elemento
             dop_elem = set.dop_elem
 
+            # Energias de formação por átomo, de todo o conjunto de uma vez
+            per_atom = set.formation_energies()["per_atom"].tolist()
+
             # Para cada base das dopagens
             for i, base in enumerate(set.dops_info["bases"]):
 
@@ -285,14 +289,14 @@ class SetViz:
                 charges_balance = []
 
                 # Para cada estrutura
-                for struct in set.structs:
+                for struct, energy in zip(set.structs, per_atom):
 
                     # Se for da base atual
                     if struct.base == base:
 
                         # Separar em diferentes listas
                         sites.append(struct.site)
-                        energies.append(struct.formation_energy()[1])
+                        energies.append(energy)
 
                         if second_var == "dipole":
                             charges_balance.append(np.linalg.norm(struct.dipole))
@@ -389,6 +393,7 @@ class SetViz:
         import seaborn as sns
         import matplotlib.pyplot as plt
         from pathlib import Path
+        from dopings.doping_set import DopingSet
 
         # Tamanho da figura
         plt.rcParams["figure.figsize"] = (8,4)
@@ -396,20 +401,18 @@ class SetViz:
 
         material = sets_list[0].dops_info["material"]
 
+        # Energias de formação de todos os conjuntos, calculadas uma vez
+        table = DopingSet.formation_energy_table(sets_list)
+        table["size"] = [ struct.size for set in sets_list for struct in set.structs ]
+
         for base in sets_list[0].dops_info["bases"]:
 
             for site in sets_list[0].dops_info["sites"][base]:
 
-                elems = []
-                energies = []
-
-                for set in sets_list:
-                    for struct in set.structs:
-
-                        if struct.base == base and struct.site == site:
+                rows = table[(table["base"] == base) & (table["site"] == site)]
 
-                            elems.append(struct.dop_elem)
-                            energies.append(struct.formation_energy()[1] / struct.size)
+                elems = rows["dop_elem"].tolist()
+                energies = (rows["per_atom"] / rows["size"]).tolist()
 
                 # Criando array
                 arr = list(zip(elems, energies))
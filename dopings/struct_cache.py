@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import os
+import copy
+import json
+import hashlib
+import zipfile
+import numpy as np
+from pathlib import Path
+
+from dopings.config import dirs_data, main_config
+
+"Este módulo contém a classe StructCache"
+
+# Versão do formato do cache. Se mudar, as entradas antigas são ignoradas
+CACHE_FORMAT_VERSION = 2
+
+# Propriedades de texto guardadas junto dos arrays
+TEXT_PROPERTIES = ("material", "base", "dop_elem", "site", "param")
+
+# Propriedades eletrônicas, que podem ainda não ter sido lidas (ver 
+# "Structure.data_from_file"). O dipolo é guardado como array
+LAZY_PROPERTIES = ("total_energy", "homo", "lumo", "dipole")
+
+def source_files() -> tuple[str]:
+    """
+    Nomes dos arquivos de dados de uma estrutura, dos quais o cache
+    depende.
+    """
+
+    return ("geo_end.xyz", main_config["output_name"], "band.out",
+            "detailed.out")
+
+def file_hash(path: str|Path) -> str:
+    """
+    Calcula o hash (blake2b) do conteúdo de um arquivo, lendo-o em
+    blocos.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+class StructCache:
+
+    """
+    Cache em disco dos dados lidos dos arquivos de uma Structure.
+
+    Cada estrutura é guardada em um arquivo .npz (sem pickle) com os
+    arrays das colunas dos átomos (códigos de elementos, coordenadas e
+    cargas), o vetor dipolo, e um cabeçalho JSON com a versão do
+    formato, as propriedades escalares e a assinatura dos arquivos de
+    origem.
+
+    Estruturas parcialmente lidas também são guardadas: propriedades
+    eletrônicas ainda não lidas ficam fora da entrada, e voltam a ser
+    lidas dos arquivos no primeiro acesso. Depois de lidas, são 
+    acrescentadas à entrada de uma só vez (ver "update" e 
+    "Structure.flush_cache").
+
+    A assinatura de cada arquivo de origem é o seu tamanho, data de
+    modificação e hash do conteúdo. Uma entrada é válida se todos os
+    arquivos têm o mesmo tamanho e data de modificação; se apenas a data
+    mudou, o hash é recalculado e comparado e, se for o mesmo, a nova 
+    data é guardada na entrada, para que o hash não seja recalculado a 
+    cada leitura. Entradas inválidas, de outra versão ou corrompidas são
+    tratadas como ausentes.
+
+    Attributes
+    ----------
+
+    root : Path
+        Diretório do cache.
+
+    Methods
+    -------
+
+    __init__(self, root: str|Path=None) -> None
+
+        Inicializa o cache no diretório informado.
+
+    path(self, name: str) -> Path
+
+        Endereço da entrada de uma estrutura.
+
+    load(self, struct: Structure) -> bool
+
+        Carrega na estrutura os dados guardados, se a entrada existir e
+        for válida.
+
+    store(self, struct: Structure) -> None
+
+        Guarda os dados da estrutura no cache.
+
+    update(self, struct: Structure, props: list[str]) -> bool
+
+        Acrescenta à entrada existente propriedades eletrônicas lidas 
+        depois.
+    """
+
+    def __init__(self, root: str|Path=None) -> None:
+        """
+        Inicializa o cache no diretório informado.
+
+        Parameters
+        ----------
+
+        root : str|Path, default = None
+            Diretório do cache. Se None, usa "stored_structs" de
+            dirs_data.json.
+        """
+
+        self.root = Path(root if root is not None
+                         else dirs_data["stored_structs"]).expanduser()
+
+    def path(self, name: str) -> Path:
+        """
+        Endereço da entrada de uma estrutura, a partir do seu nome.
+        """
+
+        return self.root / f"{name}.npz"
+
+    @staticmethod
+    def signature(dir: Path) -> dict:
+        """
+        Gera a assinatura dos arquivos de origem de uma estrutura: para
+        cada arquivo, [tamanho, data de modificação (ns), hash], ou None
+        se o arquivo não existir.
+        """
+
+        signature = {}
+
+        for name in source_files():
+
+            try:
+                stat = os.stat(dir / name)
+            except FileNotFoundError:
+                signature[name] = None
+                continue
+
+            signature[name] = [stat.st_size, stat.st_mtime_ns, 
+                               file_hash(dir / name)]
+
+        return signature
+
+    @staticmethod
+    def _is_fresh(dir: Path, stored: dict) -> bool:
+        """
+        Verifica se os arquivos de origem ainda correspondem à
+        assinatura guardada. O hash só é calculado para arquivos de
+        mesmo tamanho, mas com data de modificação diferente; se for o
+        mesmo, a data de modificação é atualizada na assinatura.
+        """
+
+        for name in source_files():
+
+            old = stored.get(name)
+
+            try:
+                stat = os.stat(dir / name)
+            except FileNotFoundError:
+                if old is not None:
+                    return False
+                continue
+
+            if old is None or old[0] != stat.st_size:
+                return False
+
+            if old[1] != stat.st_mtime_ns:
+
+                if old[2] != file_hash(dir / name):
+                    return False
+
+                # Mesmo conteúdo: guardar a nova data
+                old[1] = stat.st_mtime_ns
+
+        return True
+
+    def _read_entry(self, struct: "Structure") -> dict|None:
+        """
+        Lê a entrada da estrutura, se existir, for da versão atual, do 
+        mesmo diretório, e os arquivos de origem não tiverem mudado. 
+        Retorna o cabeçalho e os arrays, ou None. Se só as datas de 
+        modificação mudaram, a entrada é reescrita com a assinatura 
+        atualizada.
+        """
+
+        path = self.path(struct.name())
+
+        if not path.is_file():
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+
+                header = json.loads(str(data["header"]))
+                signature = copy.deepcopy(header["signature"])
+
+                # Outra versão do formato, outro diretório, ou arquivos
+                # de origem modificados
+                if (header["version"] != CACHE_FORMAT_VERSION
+                    or header["dir"] != str(struct.dir)
+                    or not StructCache._is_fresh(struct.dir, header["signature"])):
+                    return None
+
+                entry = { key : data[key] for key in ("codes", "coords", 
+                                                      "charges", "dipole") }
+
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+        # Assinatura atualizada (arquivos tocados, mas iguais)
+        if header["signature"] != signature:
+            try:
+                self._write_entry(struct, header, entry)
+            except OSError:
+                pass
+
+        entry["header"] = header
+
+        return entry
+
+    def _write_entry(self, struct: "Structure", header: dict, 
+                     arrays: dict) -> None:
+        """
+        Escreve uma entrada de forma atômica.
+        """
+
+        path = self.path(struct.name())
+        Path.mkdir(path.parent, parents=True, exist_ok=True)
+
+        tmp_path = path.with_name(path.name + ".tmp")
+
+        with open(tmp_path, "wb") as file:
+            np.savez(file, header=np.array(json.dumps(header)), **arrays)
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _dipole_array(struct: "Structure") -> np.ndarray:
+        """
+        Dipolo da estrutura como array (vazio se None).
+        """
+
+        return (np.zeros(0) if struct.dipole is None
+                else np.asarray(struct.dipole, dtype=np.float64))
+
+    def load(self, struct: "Structure") -> bool:
+        """
+        Carrega na estrutura os dados guardados, se a entrada existir e
+        for válida. A estrutura deve ter nome (ver "Structure.name") e
+        diretório definidos.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura a ser preenchida.
+
+        Returns
+        -------
+
+        bool
+            True se os dados foram carregados, False se a entrada não
+            existe, está desatualizada ou não pôde ser lida.
+        """
+
+        entry = self._read_entry(struct)
+
+        if entry is None:
+            return False
+
+        header = entry["header"]
+
+        # Preenchendo a estrutura
+        struct.size = 0
+        struct.append_arrays(elems=entry["codes"], coords=entry["coords"], 
+                             charges=entry["charges"])
+
+        for prop in TEXT_PROPERTIES:
+            setattr(struct, prop, header["properties"][prop])
+
+        # Propriedades eletrônicas: as ausentes serão lidas dos arquivos
+        # no primeiro acesso
+        lazy = set()
+
+        for prop in LAZY_PROPERTIES:
+
+            if prop not in header["properties"]:
+                lazy.add(prop)
+
+            elif prop == "dipole":
+                dipole = entry["dipole"]
+                struct.dipole = dipole if dipole.size > 0 else None
+
+            else:
+                setattr(struct, prop, header["properties"][prop])
+
+        struct._lazy = lazy
+
+        return True
+
+    def store(self, struct: "Structure") -> None:
+        """
+        Guarda os dados da estrutura no cache, junto da assinatura dos
+        seus arquivos de origem. A escrita é atômica, e inclui as 
+        propriedades eletrônicas pendentes (ver "update").
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura com nome e diretório definidos.
+        """
+
+        lazy = struct.lazy_properties()
+
+        properties = { prop : getattr(struct, prop) for prop in TEXT_PROPERTIES }
+
+        # Apenas propriedades eletrônicas já lidas
+        for prop in LAZY_PROPERTIES:
+            if prop not in lazy:
+                properties[prop] = True if prop == "dipole" else getattr(struct, prop)
+
+        header = {"version"    : CACHE_FORMAT_VERSION,
+                  "dir"        : str(struct.dir),
+                  "signature"  : StructCache.signature(struct.dir),
+                  "properties" : properties}
+
+        dipole = (np.zeros(0) if "dipole" in lazy 
+                  else StructCache._dipole_array(struct))
+
+        self._write_entry(struct, header, 
+                          {"codes"   : struct.elem_codes, 
+                           "coords"  : struct.coords,
+                           "charges" : struct.charges, 
+                           "dipole"  : dipole})
+
+        struct._cache_pending = set()
+
+    def update(self, struct: "Structure", props: list[str]) -> bool:
+        """
+        Acrescenta à entrada existente da estrutura propriedades 
+        eletrônicas que foram lidas dos arquivos depois do 
+        carregamento. Os arrays dos átomos e a assinatura da entrada são
+        mantidos, de forma que a atualização não relê os arquivos de 
+        origem. Chamado uma vez por estrutura, com todas as propriedades
+        lidas (ver "Structure.flush_cache").
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura com nome e diretório definidos.
+
+        props : list[str]
+            Propriedades a serem acrescentadas (ver LAZY_PROPERTIES).
+
+        Returns
+        -------
+
+        bool
+            True se a entrada foi atualizada, False se ela não existe, 
+            está desatualizada ou não pôde ser escrita.
+        """
+
+        entry = self._read_entry(struct)
+
+        if entry is None:
+            return False
+
+        header = entry.pop("header")
+
+        for prop in props:
+
+            if prop == "dipole":
+                header["properties"]["dipole"] = True
+                entry["dipole"] = StructCache._dipole_array(struct)
+
+            else:
+                header["properties"][prop] = getattr(struct, prop)
+
+        try:
+            self._write_entry(struct, header, entry)
+        except OSError:
+            return False
+
+        return True
@@ -1,7 +1,12 @@
 import numpy as np
+from pathlib import Path
+from typing import Iterator
 
-from dopings.atom import Atom
-from dopings.config import atoms_data, main_config
+from dopings.atom import elems_to_codes, codes_to_elems
+from dopings.opt_log import OptimizationLog
+from dopings.opt_manifest import OptManifest
+from dopings.trajectory import Trajectory
+from dopings.config import atoms_data, dirs_data, main_config
 
 
 class StructRead:
@@ -16,6 +21,21 @@ class StructRead:
         Lê o último frame de um arquivo geo_end e o retorna como uma 
         lista 2D.
 
+    reverse_lines(path: str|Path, block_size: int=65536) -> Iterator[str]
+
+        Itera sobre as linhas de um arquivo de trás pra frente, lendo 
+        blocos de tamanho fixo a partir do final do arquivo.
+
+    read_frame_arrays(struct: "Structure") -> tuple[np.ndarray, np.ndarray, np.ndarray|None]
+
+        Lê o último frame de um arquivo geo_end e o retorna como colunas
+        de códigos de elementos, coordenadas e cargas.
+
+    parse_frame(lines: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray|None]
+
+        Converte as linhas de dados de um frame xyz em colunas, de uma 
+        vez só.
+
     read_energy(struct: "Structure", extrapolated_0K=True) -> float
 
         Lê a energia total da estrutura em eV no último passo de 
@@ -29,6 +49,21 @@ class StructRead:
     read_dipole(struct: "Structure") -> np.ndarray[float]:
 
         Lê o vetor dipolo da estrutura, retornando-o como um array.
+
+    read_opt_log(struct: "Structure", restart: bool=False) -> OptimizationLog
+
+        Lê o arquivo de output de otimização em uma única passagem, e
+        retorna o seu resumo.
+
+    resume_segments(struct: "Structure", name: str) -> list[Path]
+
+        Partes de um arquivo guardadas na pasta de restart, na ordem em
+        que foram escritas.
+
+    read_trajectory(struct: "Structure") -> Trajectory
+
+        Abre a trajetória de otimização da estrutura, com acesso 
+        aleatório a qualquer frame.
     """
 
     @staticmethod
@@ -82,6 +117,181 @@ class StructRead:
 
             return None
 
+        # Lendo colunas do último frame
+        codes, coords, charges = StructRead.read_frame_arrays(struct)
+
+        elems = codes_to_elems(codes).tolist()
+        coords = coords.tolist()
+
+        # Montando as linhas: elemento, X, Y, Z e, se houver, carga
+        if charges is None:
+            return [ [elem] + coord for elem, coord in zip(elems, coords) ]
+
+        return [ [elem] + coord + [charge] 
+                 for elem, coord, charge in zip(elems, coords, charges.tolist()) ]
+
+    @staticmethod
+    def read_frame_arrays(struct: "Structure"
+                          ) -> tuple[np.ndarray, np.ndarray, np.ndarray|None]:
+        """
+        Lê o último frame de um arquivo geo_end e o retorna como colunas:
+        códigos dos elementos, bloco Nx3 de coordenadas e cargas.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura para a qual se deseja ler os dados.
+
+        Returns
+        -------
+
+        tuple[np.ndarray, np.ndarray, np.ndarray|None]
+            Códigos dos elementos (N), coordenadas (N, 3) e cargas (N). 
+            As cargas são None se o arquivo tiver apenas 4 colunas.
+
+        None
+            Se o arquivo não existir.
+
+        Raises
+        ------
+
+        AssertionError
+            The file has no data lines.
+
+        AssertionError
+            Unexpected number of data in geometry file.
+        """
+
+        # Usar caminho do geo_end
+        coord_dir = struct.dir / "geo_end.xyz"
+
+        # Se o arquivo não existir, retornar None
+        if not coord_dir.is_file():
+
+            return None
+
+        # Tentando ler apenas o último frame, a partir do fim do arquivo
+        frame = StructRead._tail_frame(coord_dir)
+
+        # Se o arquivo estiver malformado, ler o arquivo inteiro
+        if frame is None:
+            frame = StructRead._scan_last_frame(coord_dir)
+
+        return StructRead.parse_frame(frame)
+
+    @staticmethod
+    def parse_frame(lines: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray|None]:
+        """
+        Converte as linhas de dados de um frame xyz (sem cabeçalho) em 
+        colunas, de uma vez só, sem converter cada campo 
+        individualmente. Aceita linhas com 4 (elemento, X, Y, Z) ou 5 
+        (elemento, X, Y, Z, carga) colunas.
+
+        Parameters
+        ----------
+
+        lines : list[str]
+            Linhas de dados do frame.
+
+        Returns
+        -------
+
+        tuple[np.ndarray, np.ndarray, np.ndarray|None]
+            Códigos dos elementos (N), coordenadas (N, 3) e cargas (N), 
+            ou None no lugar das cargas se houver 4 colunas.
+
+        Raises
+        ------
+
+        AssertionError
+            The file has no data lines.
+
+        AssertionError
+            Unexpected number of data in geometry file.
+        """
+
+        if len(lines) == 0:
+            raise AssertionError("The file has no data lines.")
+
+        # Quantidade de dados
+        number_of_data = len(lines[0].split())
+
+        # Separando todos os campos do bloco de uma vez
+        fields = " ".join(lines).split()
+
+        if number_of_data not in (4, 5) or len(fields) != number_of_data * len(lines):
+            raise AssertionError("Unexpected number of data in geometry file.")
+
+        table = np.array(fields).reshape(len(lines), number_of_data)
+
+        # Elementos, e colunas numéricas convertidas em bloco
+        codes = elems_to_codes(table[:, 0])
+        values = table[:, 1:].astype(np.float64)
+
+        # Se tiver 5 valores, tem carga
+        charges = values[:, 3].copy() if number_of_data == 5 else None
+
+        return codes, np.ascontiguousarray(values[:, :3]), charges
+
+    @staticmethod
+    def _tail_frame(coord_dir: "Path", block_size: int=65536) -> list[str]|None:
+        """
+        Lê apenas as linhas do último frame de um arquivo xyz, 
+        percorrendo o arquivo de trás pra frente (ver "reverse_lines"), 
+        a partir do número de átomos lido no cabeçalho do primeiro 
+        frame.
+
+        Retorna None se o arquivo não tiver o formato esperado (por 
+        exemplo, se o último frame estiver incompleto).
+        """
+
+        # Lendo da primeira linha o tamanho da estrutura
+        with open(coord_dir, "rb") as file:
+            try:
+                struct_size = int(file.readline().strip())
+            except ValueError:
+                return None
+
+        if struct_size <= 0:
+            return None
+
+        # Linhas por frame (contando o cabeçalho)
+        page_size = struct_size + 2
+
+        # Lendo as últimas linhas do arquivo, ignorando linhas em branco 
+        # no final
+        lines = []
+
+        for linha in StructRead.reverse_lines(coord_dir, block_size):
+
+            if lines or linha.strip():
+                lines.append(linha)
+
+            if len(lines) == page_size:
+                break
+
+        lines.reverse()
+
+        # Checando o cabeçalho e o número de colunas do frame
+        if len(lines) != page_size or lines[0].strip() != str(struct_size):
+            return None
+
+        number_of_data = len(lines[2].split())
+
+        if any(len(line.split()) != number_of_data for line in lines[2:]):
+            return None
+
+        # Removendo cabeçalho
+        return lines[2:]
+
+    @staticmethod
+    def _scan_last_frame(coord_dir: "Path") -> list[str]:
+        """
+        Lê o arquivo xyz inteiro e retorna as linhas do último frame, 
+        sem o cabeçalho.
+        """
+
         # Lendo arquivo
         with open(coord_dir) as file:
 
@@ -116,31 +326,71 @@ class StructRead:
         frame = lines[frames_starting_lines[-2] : frames_starting_lines[-1]]
 
         # Removendo cabeçalho
-        frame = frame[2:]
+        return frame[2:]
+    
+    @staticmethod
+    def reverse_lines(path: str|Path, block_size: int=65536) -> Iterator[str]:
+        """
+        Itera sobre as linhas de um arquivo de trás pra frente, lendo 
+        blocos de "block_size" bytes a partir do final do arquivo. 
 
-        # Quantidade de dados
-        number_of_data = len(frame[0].split())
+        A memória usada não depende do tamanho do arquivo, e o tempo 
+        depende apenas da distância, até o final do arquivo, da última 
+        linha lida.
 
-        # Transformando cada linha em uma lista de colunas
-        for i in range(len(frame)):
-            # Separando colunas
-            frame[i] = frame[i].split()      
+        Parameters
+        ----------
 
-            # Convertendo strings numéricas para floats   
-            # Se tiver 4 valores, não tem carga    
-            if number_of_data == 4:
-                frame[i] = [ frame[i][0], float(frame[i][1]), float(frame[i][2]), float(frame[i][3]) ]
+        path : str|Path
+            Endereço do arquivo.
 
-            # Se tiver 5 valores, tem carga
-            elif number_of_data == 5:
-                frame[i] = [ frame[i][0], float(frame[i][1]), float(frame[i][2]), float(frame[i][3]), float(frame[i][4]) ]
+        block_size : int, default = 65536
+            Tamanho, em bytes, de cada bloco lido.
 
-            else:
-                raise AssertionError("Unexpected number of data in geometry file.")
+        Yields
+        ------
+
+        str
+            Linhas do arquivo, da última para a primeira, sem a quebra 
+            de linha.
+        """
+
+        with open(path, "rb") as file:
+
+            # Começando do final do arquivo
+            position = file.seek(0, 2)
+
+            # Trecho inicial (possivelmente incompleto) do último bloco 
+            # lido, que pertence a uma linha ainda não terminada
+            rest = b""
+
+            # Se o arquivo termina com quebra de linha, não há uma linha 
+            # vazia depois dela
+            last = True
+
+            while position > 0:
+
+                # Lendo o bloco anterior
+                step = min(block_size, position)
+                position -= step
+
+                file.seek(position)
+                lines = (file.read(step) + rest).split(b"\n")
+
+                # A primeira linha do bloco pode continuar no anterior
+                rest = lines[0]
+
+                for linha in reversed(lines[1:]):
+
+                    if not (last and linha == b""):
+                        yield linha.decode()
+
+                    last = False
+
+            # Primeira linha do arquivo
+            if not (last and rest == b""):
+                yield rest.decode()
 
-        # Retornar
-        return frame
-    
     @staticmethod
     def read_energy(struct: "Structure", extrapolated_0K=True) -> float:
         """
@@ -180,40 +430,45 @@ class StructRead:
         if not dir.is_file():
             return None
 
-        # No arquivo, varrer de trás pra frente em busca de ocorrência do termo.
-        # Retornar o primeiro que encontrar
-        with open(dir) as file:
+        # Se a otimização estiver no manifesto da sua árvore, usar a 
+        # energia guardada
+        manifest = OptManifest.for_struct(struct)
+        log = manifest.lookup(struct.dir) if manifest is not None else None
+
+        if log is not None:
 
-            # Se for pedido para calcular energia extrapolada pro 0K
             if extrapolated_0K:
-                    
-                # Pra cada linha do arquivo, na ordem inversa
-                for linha in list(file)[::-1]:
+                energy = log.extrapolated_energy
+            else:
+                energy = log.energies[-1] if log.energies else None
 
-                    # Se for encontrado tal trecho
-                    if linha.find("Extrapolated to 0K") != -1:
+            if energy is not None:
+                return energy
 
-                        # Da linha, retornar apenas o valor relevante, em float
-                        return float(linha.split()[5])
-                    
-            else:
+        # Termo buscado, e posição do valor na linha
+        if extrapolated_0K:
+            term, column = "Extrapolated to 0K", 5
+        else:
+            term, column = "Total Energy", 4
 
-                # Se for encontrado tal trecho
-                if linha.find("Total Energy") != -1:
-                        
-                    # Pra cada linha do arquivo, na ordem inversa
-                    for linha in list(file)[::-1]:
+        # No arquivo, varrer de trás pra frente em busca de ocorrência do termo.
+        # Retornar o primeiro que encontrar
+        for linha in StructRead.reverse_lines(dir):
+
+            # Se for encontrado tal trecho
+            if linha.find(term) != -1:
 
-                        # Da linha, retornar apenas o valor relevante, em float
-                        return float(linha.split()[4])
+                # Da linha, retornar apenas o valor relevante, em float
+                return float(linha.split()[column])
 
-            # Se correr todo o arquivo sem encontrar o termo, declarar erro
-            raise AssertionError("Energies not found in file.")
+        # Se correr todo o arquivo sem encontrar o termo, declarar erro
+        raise AssertionError("Energies not found in file.")
     
     @staticmethod
     def read_time(struct: "Structure", cpu=False, restart=False) -> float:
         """
-        Retorna os tempos de otimização.
+        Retorna os tempos de otimização, somando os das partes 
+        guardadas na pasta de restart (ver "resume_segments").
 
         Parameters
         ----------
@@ -224,6 +479,9 @@ class StructRead:
         cpu : bool, default = False
             Se invés do tempo de wall, deve ser exibido o tempo de cpu.
 
+        restart : bool, default = False
+            Se devem ser lidas apenas as partes da pasta de restart.
+
         Returns
         -------
 
@@ -237,29 +495,37 @@ class StructRead:
             Time not found in file.
         """
 
+        import gzip
+
         times = []
 
-        # Diretório
+        # Arquivos
         if restart:
-            dir = struct.dir / "before_restart" / main_config["output_name"]
+            paths = StructRead.resume_segments(struct, main_config["output_name"])
         else:   
-            dir = struct.dir / main_config["output_name"] 
+            paths = [struct.dir / main_config["output_name"]]
 
         # Se não encontrar arquivo, retornar None
-        if not dir.is_file():
+        if not paths or not paths[0].is_file():
             return None
 
-        # No arquivo, varrer de trás pra frente em busca de ocorrência do termo.
-        # Retornar o primeiro que encontrar
-        with open(dir) as file:
-                    
-            # Pra cada linha do arquivo, na ordem inversa
-            for linha in list(file)[::-1]:
+        for path in paths:
+
+            # No arquivo, varrer de trás pra frente em busca de ocorrência 
+            # do termo (partes comprimidas são lidas do início). Guardar a
+            # última que encontrar
+            if path.name.endswith(".gz"):
+                with gzip.open(path, "rt") as file:
+                    linhas = reversed(file.read().splitlines())
+            else:
+                linhas = StructRead.reverse_lines(path)
+
+            for linha in linhas:
 
                 terms = linha.split()
 
                 # Se for encontrado tal trecho
-                if "Total" in terms  and "=" in terms != -1:
+                if "Total" in terms and "=" in terms:
 
                     if cpu:
                         times.append(terms[2])                
@@ -267,20 +533,19 @@ class StructRead:
                     else:
                         times.append(terms[4])
                         break
-            
-            # Se n tiver no restart e for tiver pasta de restart
-            # Observação: Apenas captura o último restart
-            if not restart and (struct.dir/"before_restart").is_dir():
-                times.append(StructRead.read_time(struct, restart=True))
-
-            # Tentar converter pra float e juntar tudo
-            try:
-                total = 0
-                for time in times:
-                    total += float(time)
-                return total
-            except:
-                return None
+        
+        # Se n tiver no restart e for tiver pasta de restart
+        if not restart and (struct.dir / main_config["resume_dir_name"]).is_dir():
+            times.append(StructRead.read_time(struct, cpu=cpu, restart=True))
+
+        # Tentar converter pra float e juntar tudo
+        try:
+            total = 0
+            for time in times:
+                total += float(time)
+            return total
+        except:
+            return None
 
     @staticmethod
     def read_bands(struct: "Structure") -> tuple[float, float]:
@@ -344,12 +609,15 @@ class StructRead:
         # Calculando quantidade de elétrons de valência
         val_elect = 0
 
+        # Contando átomos de cada elemento
+        elems, counts = np.unique(struct.elems, return_counts=True)
+
         # Somando os elétrons de valência de cada átomo
-        for atom in struct.atoms:
+        for elem, count in zip(elems, counts):
             try:
-                val_elect += atoms_data["valency"][atom.elem]
+                val_elect += atoms_data["valency"][elem] * int(count)
             except:
-                raise KeyError(f"valency of element {atom.elem} not found.")
+                raise KeyError(f"valency of element {elem} not found.")
 
         def ceil_to_pair(n: int) -> int:
 
@@ -427,8 +695,145 @@ class StructRead:
                     
                     words = linha.split()
 
-                    return np.array([words[2], words[3], words[4]])
+                    return np.array([words[2], words[3], words[4]], dtype=float)
                 
             # Se não foi encontrado, retornar None
             return None
-    
\ No newline at end of file
+    
+    @staticmethod
+    def read_opt_log(struct: "Structure", restart: bool=False) -> OptimizationLog:
+        """
+        Lê o arquivo de output de otimização da estrutura em uma única
+        passagem, e retorna o seu resumo (passos, convergência do SCC em
+        cada passo, energias, convergência da geometria e tempos).
+
+        Se a estrutura pertencer a uma árvore de otimizações com 
+        manifesto (ver OptManifest), e o output não tiver mudado, o 
+        resumo vem do manifesto, sem ler o output.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura para a qual se deseja ler os dados.
+
+        restart : bool, default = False
+            Se deve ser lido o output guardado na pasta de restart (as 
+            partes, ver "resume_segments", são lidas como um único 
+            output).
+
+        Returns
+        -------
+
+        OptimizationLog
+            Resumo da otimização.
+
+        None
+            Se o arquivo não existir.
+        """
+
+        # Partes guardadas na pasta de restart, lidas como um único 
+        # output
+        if restart:
+            paths = StructRead.resume_segments(struct, main_config["output_name"])
+            return OptimizationLog.from_files(paths) if paths else None
+
+        # Diretório
+        dir = struct.dir / main_config["output_name"] 
+
+        # Se não encontrar arquivo, retornar None
+        if not dir.is_file():
+            return None
+
+        # Consultando o manifesto da árvore de otimizações
+        manifest = OptManifest.for_struct(struct)
+
+        if manifest is not None:
+            return manifest.read_log(struct.dir)
+
+        return OptimizationLog.from_file(dir)
+
+    @staticmethod
+    def resume_segments(struct: "Structure", name: str) -> list[Path]:
+        """
+        Partes de um arquivo dinâmico (output ou geo_end.xyz) guardadas
+        na pasta de restart (ver "Structure.redo_files_for_resume"), na
+        ordem em que foram escritas: primeiro o arquivo acumulado do 
+        modo "append", se existir, e depois os segmentos numerados do 
+        modo "rotate" ("<name>.001", "<name>.002.gz", ...).
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura para a qual se deseja ler os dados.
+
+        name : str
+            Nome do arquivo no diretório de otimização.
+
+        Returns
+        -------
+
+        list[Path]
+            Endereços das partes. Vazia se não houver pasta de restart.
+        """
+
+        backup_dir = struct.dir / main_config["resume_dir_name"]
+
+        if not backup_dir.is_dir():
+            return []
+
+        # Arquivo acumulado (modo append)
+        segments = [backup_dir / name] if (backup_dir / name).is_file() else []
+
+        # Segmentos numerados (modo rotate), possivelmente comprimidos
+        numbered = []
+
+        for path in backup_dir.glob(f"{name}.*"):
+
+            number = path.name[len(name) + 1:].removesuffix(".gz")
+
+            if number.isdigit():
+                numbered.append((int(number), path))
+
+        return segments + [ path for _, path in sorted(numbered) ]
+
+    @staticmethod
+    def read_trajectory(struct: "Structure") -> Trajectory:
+        """
+        Abre a trajetória de otimização (geo_end.xyz) da estrutura, com
+        acesso aleatório a qualquer frame (ver Trajectory). Os arquivos
+        auxiliares ficam no diretório do cache ("stored_structs" de 
+        dirs_data.json), pelo nome da estrutura, e não no diretório de
+        otimização (que é copiado a cada reinício). Estruturas sem nome
+        os têm ao lado do xyz.
+
+        Parameters
+        ----------
+
+        struct : Structure
+            Estrutura para a qual se deseja ler os dados.
+
+        Returns
+        -------
+
+        Trajectory
+            Trajetória da otimização.
+
+        None
+            Se o arquivo não existir.
+        """
+
+        # Usar caminho do geo_end
+        coord_dir = struct.dir / "geo_end.xyz"
+
+        # Se o arquivo não existir, retornar None
+        if not coord_dir.is_file():
+            return None
+
+        # Arquivos auxiliares no diretório do cache
+        sidecar = None
+        if struct.name() is not None:
+            sidecar = Path(dirs_data["stored_structs"]).expanduser() / "trajectories" / struct.name()
+
+        return Trajectory(coord_dir, sidecar=sidecar)
@@ -63,34 +63,12 @@ class StructViz:
                 Lista dos comprimentos de cada ligação da estrutura.
             """
 
-            # TRANSFORMAR EM DICIONÁRIO DE LABELS
-            bond_crit = viz_config['histogram']['bond_crit']
-            
-            # Lista para receber comprimentos de ligação
-            data = []
-
-            # Salvando quantidade de átomos na estrutura
-            tam = struct.atoms.shape[0]
-
-            # Para o índice de cada átomo na estrutura
-            for i in range(tam):
-                # Para o índice de cada átomo seguinte na estrutura
-                for j in range(i+1,tam):
-
-                    # Calcular e salvar comprimento da ligação
-                    bond_length = struct.atoms[i].dist_to(struct.atoms[j])
-
-                    # Label do par
-                    label = "-".join(sorted([struct.atoms[i].elem, struct.atoms[j].elem]))
-
-                    # Se o comprimento calculado for menor que o critério utilizado
-                    if bond_length < bond_crit[struct.material][label]:
-
-                        # Listar valor do comprimento como sendo de uma ligação válida 
-                        data.append(bond_length)
+            # Ligações a partir do índice de vizinhos da estrutura, com os
+            # critérios de viz_config.json
+            _, _, lengths = struct.bonds(viz_config['histogram']['bond_crit'][struct.material])
 
             # Retornar dados
-            return data
+            return lengths.tolist()
 
         def hist_dat(lengths, dat_out) -> None:
             """
@@ -448,31 +426,22 @@ class StructViz:
                 Dados da estrutura em formato DataFrame.
             """
 
-            # Lista para acumular dados de cada átomo
-            data = []
-
-            # Para cada átomo na estrutura...
-            for atom in struct.atoms:
-
-                # Ordenar dados em uma lista, e anexá-la na lista 2D "data", 
-                # onde cada linha é um átomo e cada coluna um dado desse átomo
-                try:
-                    data.append([atom.elem, atom.coord[0], atom.coord[1], 
-                                 atom.charge, 
-                                 atoms_data["valency"][atom.elem]])
-                except:
-                    raise KeyError(f"valency not found for element {atom.elem}")
-
-            # Transformar lista "data" em um DataFrame com as colunas 
-            # devidamente nomeadas
-            data = pd.DataFrame(data)
-
-            # Mudando colunas para números de 0 a 4
-            data.columns = range(data.columns.size)
-
-            # Renomeando colunas adicionadas, e armazenando em "df"
-            return data.rename(columns={0:"Elem", 1:"X", 2:"Y", 3:"Charge", 
-                                        4:"Valency"})
+            # Símbolos dos elementos
+            elems = struct.elems
+
+            # Valência de cada átomo
+            try:
+                valency = [atoms_data["valency"][elem] for elem in elems]
+            except KeyError as error:
+                raise KeyError(f"valency not found for element {error.args[0]}")
+
+            # Montando o DataFrame diretamente das colunas da estrutura, 
+            # onde cada linha é um átomo e cada coluna um dado desse átomo
+            return pd.DataFrame({"Elem"     : elems, 
+                                 "X"        : struct.coords[:, 0], 
+                                 "Y"        : struct.coords[:, 1], 
+                                 "Charge"   : struct.charges, 
+                                 "Valency"  : valency})
         
         # Dados
         import pandas as pd
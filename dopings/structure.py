@@ -3,9 +3,62 @@ from __future__ import annotations
 import numpy as np
 from pathlib import Path
 
-from dopings.atom import Atom
+from dopings.atom import Atom, ELEMENTS, elem_to_code, elems_to_codes, codes_to_elems, count_elements, atoms_energy
 from dopings.struct_read import StructRead
-from dopings.config import atoms_data, dirs_data, main_config
+from dopings.neighbors import NeighborIndex
+from dopings.opt_log import OptimizationLog, OutputFollower
+from dopings.opt_manifest import OptManifest
+from dopings.early_stop import EarlyStop
+from dopings.struct_cache import StructCache
+from dopings.config import dirs_data, main_config, viz_config
+
+###############################################################################
+
+class AtomsView:
+
+    """
+    Sequência leve de átomos de uma Structure. Cada item é um Atom que é
+    vista de uma linha dos arrays da estrutura, criado apenas quando é
+    acessado.
+
+    Suporta len(), indexação (inclusive negativa), fatiamento e 
+    iteração.
+    """
+
+    def __init__(self, struct: "Structure") -> None:
+
+        self._struct = struct
+
+    def __len__(self) -> int:
+
+        return self._struct.size
+
+    @property
+    def shape(self) -> tuple[int]:
+
+        return (self._struct.size,)
+
+    def __getitem__(self, index: int|slice) -> Atom|list[Atom]:
+
+        # Fatia: retornar lista de vistas
+        if isinstance(index, slice):
+            return [Atom.view(self._struct, i) 
+                    for i in range(*index.indices(self._struct.size))]
+
+        # Índice inteiro, aceitando índices negativos
+        index = int(index)
+        if index < 0:
+            index += self._struct.size
+
+        if not 0 <= index < self._struct.size:
+            raise IndexError("atom index out of range.")
+
+        return Atom.view(self._struct, index)
+
+    def __iter__(self):
+
+        for i in range(self._struct.size):
+            yield Atom.view(self._struct, i)
 
 ###############################################################################
 
@@ -14,10 +67,30 @@ class Structure:
     """
     Representa uma estrutura formada por um conjunto de átomos.
 
+    Os dados dos átomos são guardados em colunas: um array de códigos de
+    elementos, um bloco Nx3 de coordenadas e um vetor de cargas (NaN 
+    onde a carga não está definida). Os arrays têm capacidade maior que
+    o número de átomos, e crescem de forma amortizada.
+
     Attributes
     ----------
-    atoms : np.ndarray[Atom]
-        Array de atom objects na estrutura.
+    atoms : AtomsView
+        Sequência de átomos da estrutura, gerados sob demanda como 
+        vistas dos arrays da estrutura.
+
+    elem_codes : np.ndarray[int]
+        Códigos (números atômicos) dos elementos de cada átomo.
+
+    elems : np.ndarray[str]
+        Símbolos dos elementos de cada átomo.
+
+    coords : np.ndarray[float]
+        Array Nx3 das coordenadas dos átomos. É uma vista, portanto 
+        alterações nele alteram a estrutura.
+
+    charges : np.ndarray[float]
+        Cargas dos átomos, em população de elétrons. NaN onde a carga
+        não está definida.
     
     size : int
         Número de átomos na estrutura.
@@ -47,16 +120,20 @@ class Structure:
         cálculo da energia de formação.
     
     total_energy : float
-        Energia total da estrutura, lida a partir do arquivo
+        Energia total da estrutura, lida a partir do arquivo de output
+        no primeiro acesso.
 
     homo : float
-        Energia do homo da estrutura, lida a partir do arquivo
+        Energia do homo da estrutura, lida a partir do arquivo band.out
+        no primeiro acesso.
 
     lumo : float
-        Energia do lumo da estrutura, lida a partir do arquivo
+        Energia do lumo da estrutura, lida a partir do arquivo band.out
+        no primeiro acesso.
 
     dipole : numpy.ndarray[float]
-        Vetor momento dipolo da estrutura.
+        Vetor momento dipolo da estrutura, lido a partir do arquivo
+        detailed.out no primeiro acesso.
 
     Methods
     -------
@@ -69,6 +146,11 @@ class Structure:
 
         Anexa um Atom object, ou uma lista de Atom objects 
         à lista de átomos da estrutura.
+
+    append_arrays(self, elems, coords, charges=None) -> None
+
+        Anexa átomos à estrutura a partir de arrays de elementos, 
+        coordenadas e cargas, sem criar objetos Atom.
     
     redo_files_for_resume(self) -> None
 
@@ -78,17 +160,26 @@ class Structure:
         pasta no diretório, que recebe o nome definido em "main_config" 
         (resume_dir_name), que por padrão é "before_restart".
 
-    data_from_file(self) -> None
+    data_from_file(self, lazy: bool=True) -> None
 
-        A partir do diretório da estrutura, lê os arquivos de dados e os 
-        carrega como propriedades do objeto Structure.
+        A partir do diretório da estrutura, lê a geometria e marca as 
+        propriedades eletrônicas para serem lidas no primeiro acesso.
+
+    lazy_properties(self) -> set[str]
+
+        Propriedades eletrônicas que ainda não foram lidas dos arquivos.
+
+    flush_cache(self) -> bool
+
+        Grava no cache as propriedades eletrônicas lidas desde o 
+        carregamento.
     
-    opt(self, overwrite: bool=False, verbose: bool=True, skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=True) -> None
+    opt(self, overwrite: bool=False, verbose: bool=True, skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=True, threads: int=None, cores: list[int]=None, bin_dir: str|Path=None, processes: set=None) -> OptimizationLog|None
 
         Executa uma otimização no diretório da estrutura, espera 
         a otimização terminar e relata o status ao final.
     
-    report(self, return_SCC: bool=False, return_conv: bool=False, verbose: bool=True, return_written: bool=False) -> None|bool|list[int]
+    report(self, return_SCC: bool=False, return_conv: bool=False, verbose: bool=True, return_written: bool=False, log: OptimizationLog=None) -> None|bool|list[int]
 
         Reporta o estado da otimização da estrutura a partir do
         arquivo de no seu diretório, 
@@ -98,6 +189,11 @@ class Structure:
         Gera uma versão (dopada) de uma estrutura, onde o átomo 
         especificado é substituído por um de outro elemento.
     
+    element_counts(self) -> np.ndarray
+
+        Retorna o número de átomos de cada elemento, indexado pelo 
+        código do elemento.
+
     formation_energy(self) -> tuple[float, float]
 
         Retorna a energia de formação da estrutura, além de sua média 
@@ -108,6 +204,16 @@ class Structure:
         Retorna as energias de HOMO, LUMO, e o módulo da diferença 
         HOMO-LUMO de uma estrutura a partir de seu arquivo band.out.
     
+    neighbor_index(self) -> NeighborIndex
+
+        Retorna o índice espacial de vizinhos da geometria atual da 
+        estrutura, construído uma única vez por geometria.
+
+    bonds(self, bond_crit: dict[str, float]=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]
+
+        Retorna os pares de átomos ligados, segundo critérios de 
+        comprimento máximo por par de elementos, e seus comprimentos.
+    
     shortest_distances(self, elem1: str, elem2: str, n: int) -> list[float]
 
         Retorna as "n" menores distâncias entre átomos de dados 
@@ -117,6 +223,11 @@ class Structure:
 
         Gera e escreve o arquivo xyz do último frame da estrutura.
         Cria diretórios necessários caso não existam.
+
+    frame_text(self, ignore_charges: bool=False) -> str
+
+        Gera o texto do arquivo xyz do último frame da estrutura, sem 
+        escrevê-lo.
     
     output(self, output_dest: str|Path) -> None
 
@@ -187,8 +298,15 @@ class Structure:
 
         # Diretório de otimização da molécula
         self.dir = None
+
+        # Colunas dos átomos (com capacidade extra para crescimento)
         self.size = 0
-        self.atoms = np.array([], dtype = Atom)
+        self._codes = np.zeros(0, dtype=np.uint8)
+        self._coords = np.zeros((0, 3), dtype=np.float64)
+        self._charges = np.zeros(0, dtype=np.float64)
+
+        # Índice de vizinhos da geometria atual (ver "neighbor_index")
+        self._neighbors = None
         
         # -- Dop info --
         self.param = None
@@ -198,6 +316,12 @@ class Structure:
         self.site = None
         
         # -- Proc data --
+        # Propriedades eletrônicas ainda não lidas dos arquivos (ver 
+        # "data_from_file"), e as já lidas que ainda não foram gravadas
+        # no cache (ver "flush_cache")
+        self._lazy = set()
+        self._cache_pending = set()
+
         self.homo = None
         self.lumo = None
         self.dipole = None
@@ -234,41 +358,240 @@ class Structure:
         if site is not None and isinstance(site, str):
             self.site = site
         
-        name = self.name()
-        stored_path = dirs_data["stored_structs"] / f"{name}.pkl"
-        
-        #print(stored_path, stored_path.is_file())
-        #input("")
-
         # Se pediu pra ler dos arquivos
         if read_from_dir:
+
+            if self.dir is None:
+                raise ValueError("If read_from_dir True, dir must be given.")
+
+            cache = StructCache()
             
-            # Se é possível gerar nome, não está forçado a ler dos arquivos
-            # originais, e o arquivo pickle já existe, carregá-lo
-            if ((name is not None) and (not force_read_source) 
-                and stored_path.is_file()):
-                    
-                    try:
-                        self.__dict__ = Structure.read_struct_pickle(stored_path).__dict__
-                    
-                    # Se não conseguir ler, assumir que está corrompido,
-                    # ler dos arquivos originais, e escrever outro pkl
-                    except:
-                        if self.dir is not None:
-                            self.data_from_file()
-                            self.write_struct_pickle(stored_path)    
-                        else:
-                            raise ValueError("If read_from_dir True, dir must be given.")
-
-            elif self.dir is not None:
+            # Se é possível gerar nome, e não está forçado a ler dos 
+            # arquivos originais, tentar carregar do cache. Entradas 
+            # desatualizadas ou corrompidas são ignoradas
+            if ((self.name() is None) or force_read_source 
+                or not cache.load(self)):
+
                 self.data_from_file()
-            else:
-                raise ValueError("If read_from_dir True, dir must be given.")
 
-            # Se o structure não está salvo, salvar
-            if (self.name() is not None) and (not stored_path.is_file() or force_read_source):
-                self.write_struct_pickle(stored_path)            
+                # Salvar no cache
+                if self.name() is not None:
+                    cache.store(self)
                 
+    ############# Colunas dos átomos
+
+    @property
+    def atoms(self) -> AtomsView:
+        """
+        Sequência de átomos da estrutura, como vistas dos seus arrays.
+        """
+
+        return AtomsView(self)
+
+    @property
+    def elem_codes(self) -> np.ndarray:
+        """
+        Códigos (números atômicos) dos elementos de cada átomo.
+        """
+
+        return self._codes[:self.size]
+
+    @property
+    def elems(self) -> np.ndarray:
+        """
+        Símbolos dos elementos de cada átomo.
+        """
+
+        return codes_to_elems(self.elem_codes)
+
+    @property
+    def coords(self) -> np.ndarray:
+        """
+        Vista Nx3 das coordenadas dos átomos.
+        """
+
+        return self._coords[:self.size]
+
+    @coords.setter
+    def coords(self, value) -> None:
+
+        self._coords[:self.size] = value
+
+    @property
+    def charges(self) -> np.ndarray:
+        """
+        Vista das cargas dos átomos (NaN onde não definidas).
+        """
+
+        return self._charges[:self.size]
+
+    @charges.setter
+    def charges(self, value) -> None:
+
+        self._charges[:self.size] = value
+
+    ############# Propriedades eletrônicas
+
+    @property
+    def total_energy(self) -> float|None:
+        """
+        Energia total da estrutura, lida do arquivo de output no 
+        primeiro acesso.
+        """
+
+        if "total_energy" in self._lazy:
+            self._load_lazy(total_energy=StructRead.read_energy(self))
+
+        return self._total_energy
+
+    @total_energy.setter
+    def total_energy(self, value) -> None:
+
+        self._lazy.discard("total_energy")
+        self._total_energy = value
+
+    @property
+    def homo(self) -> float|None:
+        """
+        Energia do homo da estrutura, lida do band.out no primeiro 
+        acesso (junto do lumo).
+        """
+
+        if "homo" in self._lazy:
+            self._load_bands()
+
+        return self._homo
+
+    @homo.setter
+    def homo(self, value) -> None:
+
+        self._lazy.discard("homo")
+        self._homo = value
+
+    @property
+    def lumo(self) -> float|None:
+        """
+        Energia do lumo da estrutura, lida do band.out no primeiro 
+        acesso (junto do homo).
+        """
+
+        if "lumo" in self._lazy:
+            self._load_bands()
+
+        return self._lumo
+
+    @lumo.setter
+    def lumo(self, value) -> None:
+
+        self._lazy.discard("lumo")
+        self._lumo = value
+
+    @property
+    def dipole(self) -> np.ndarray|None:
+        """
+        Vetor momento dipolo da estrutura, lido do detailed.out no 
+        primeiro acesso.
+        """
+
+        if "dipole" in self._lazy:
+            self._load_lazy(dipole=StructRead.read_dipole(self))
+
+        return self._dipole
+
+    @dipole.setter
+    def dipole(self, value) -> None:
+
+        self._lazy.discard("dipole")
+        self._dipole = value
+
+    def _load_bands(self) -> None:
+        """
+        Lê homo e lumo do band.out, que são lidos sempre juntos.
+        """
+
+        homo, lumo = StructRead.read_bands(self)
+
+        values = {"homo" : homo, "lumo" : lumo}
+
+        self._load_lazy(**{ prop : value for prop, value in values.items()
+                            if prop in self._lazy })
+
+    def _load_lazy(self, **values) -> None:
+        """
+        Guarda propriedades eletrônicas recém lidas dos arquivos, que 
+        ficam pendentes de gravação no cache (ver "flush_cache").
+        """
+
+        for prop, value in values.items():
+            setattr(self, prop, value)
+
+        self._cache_pending.update(values)
+
+    def flush_cache(self) -> bool:
+        """
+        Acrescenta à entrada da estrutura no cache, em uma única 
+        escrita, as propriedades eletrônicas lidas dos arquivos desde o
+        carregamento (ver "StructCache.update").
+
+        Returns
+        -------
+
+        bool
+            True se a entrada foi atualizada, False se não havia nada 
+            pendente ou a entrada não pôde ser atualizada.
+        """
+
+        if not self._cache_pending or self.name() is None or self.dir is None:
+            return False
+
+        updated = StructCache().update(self, sorted(self._cache_pending))
+
+        self._cache_pending = set()
+
+        return updated
+
+    def lazy_properties(self) -> set[str]:
+        """
+        Propriedades eletrônicas que ainda não foram lidas dos arquivos.
+        """
+
+        return set(self._lazy)
+
+    def has_charges(self) -> bool:
+        """
+        Retorna se todos os átomos da estrutura têm carga definida.
+        """
+
+        return self.size > 0 and not np.isnan(self.charges).any()
+
+    def _reserve(self, n: int) -> None:
+        """
+        Garante capacidade para mais "n" átomos nos arrays, dobrando a 
+        capacidade quando necessário, de forma que anexar átomos um a um
+        tenha custo amortizado constante.
+        """
+
+        needed = self.size + n
+        capacity = self._coords.shape[0]
+
+        # Se já houver espaço, não fazer nada
+        if needed <= capacity:
+            return
+
+        # Nova capacidade: o dobro da atual, ou o necessário
+        capacity = max(needed, 2*capacity, 16)
+
+        codes = np.zeros(capacity, dtype=self._codes.dtype)
+        coords = np.zeros((capacity, 3), dtype=np.float64)
+        charges = np.full(capacity, np.nan, dtype=np.float64)
+
+        # Copiando dados atuais
+        codes[:self.size] = self.elem_codes
+        coords[:self.size] = self.coords
+        charges[:self.size] = self.charges
+
+        self._codes, self._coords, self._charges = codes, coords, charges
+
     ############# Adicionar novos átomos à estrutura - Sem dados obrigatórios
              
     def append(self, atoms: Atom|list[Atom]) -> None:
@@ -294,23 +617,80 @@ class Structure:
         if isinstance(atoms, Atom):
             atoms = [atoms]
         
-        # Transformando em array
-        if isinstance(atoms, list):
-            atoms = np.array(atoms)
+        # Transformando array ou vista em lista
+        if isinstance(atoms, np.ndarray|AtomsView):
+            atoms = list(atoms)
 
-        # Se for array, composto por atoms objects
-        if (isinstance(atoms, np.ndarray) and atoms.size > 0 
+        # Se for lista, composta por atoms objects
+        if (isinstance(atoms, list) and len(atoms) > 0 
             and all(isinstance(atom, Atom) for atom in atoms)):
-            
-            # Anexar a lista passada ao array de atoms.
-            self.atoms = np.append(self.atoms, atoms)
-            # Acrescentar ao tamanho, a quantidade adicionada
-            self.size = self.size + len(atoms)
+
+            # Cargas não definidas viram NaN
+            charges = [np.nan if atom.charge is None else atom.charge 
+                       for atom in atoms]
+
+            # Anexar como colunas
+            self.append_arrays(elems=[atom.elem for atom in atoms], 
+                               coords=[atom.coord for atom in atoms],
+                               charges=charges)
         
         else:
             raise TypeError(("atoms must be a non-empty list of Atom"
             + "objects, or Atom."))
 
+    def append_arrays(self, elems: list[str]|np.ndarray, 
+                      coords: list|np.ndarray, 
+                      charges: list[float]|np.ndarray=None) -> None:
+        """
+        Anexa átomos à estrutura a partir de arrays de elementos, 
+        coordenadas e cargas, sem criar objetos Atom.
+
+        Parameters
+        ----------
+
+        elems : list[str] | np.ndarray
+            Símbolos dos elementos, ou array de inteiros com seus 
+            códigos.
+
+        coords : list | np.ndarray
+            Coordenadas dos átomos, em formato Nx3.
+
+        charges : list[float] | np.ndarray, default = None
+            Cargas dos átomos. Se None, as cargas ficam indefinidas.
+
+        Raises
+        ------
+
+        ValueError
+            elems, coords and charges must have the same length.
+        """
+
+        # Convertendo elementos em códigos
+        elems = np.asarray(elems)
+        if elems.dtype.kind in "iu":
+            codes = elems
+        else:
+            codes = elems_to_codes(elems)
+
+        # Convertendo coordenadas em bloco Nx3
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+
+        # Número de átomos anexados
+        n = coords.shape[0]
+
+        if codes.shape[0] != n or (charges is not None and len(charges) != n):
+            raise ValueError("elems, coords and charges must have the same length.")
+
+        # Garantindo capacidade e escrevendo nas próximas linhas
+        self._reserve(n)
+
+        self._codes[self.size:self.size+n] = codes
+        self._coords[self.size:self.size+n] = coords
+        self._charges[self.size:self.size+n] = np.nan if charges is None else charges
+
+        # Acrescentar ao tamanho, a quantidade adicionada
+        self.size = self.size + n
+
     ############# Otimização e relatório
 
     def redo_files_for_resume(self) -> None:
@@ -321,8 +701,22 @@ class Structure:
         último frame escrito, guardando o progresso até então em uma 
         pasta no diretório, que recebe o nome definido em "main_config" 
         (resume_dir_name), que por padrão é "before_restart".
+
+        O modo de backup é definido por "resume_backup" em main_config:
+
+        - "append": os arquivos dinâmicos (output e geo_end.xyz) são 
+          acrescentados ao final das suas versões na pasta de backup, e
+          os demais arquivos são copiados.
+
+        - "rotate": os arquivos são apenas movidos (renomeados) para a
+          pasta de backup, sem cópia dos dados. Os dinâmicos viram 
+          segmentos numerados ("output.001", "output.002", ...), 
+          comprimidos com gzip se "resume_compress" for true. Os 
+          leitores juntam os segmentos (ver "StructRead.resume_segments").
         """
 
+        import os
+        import gzip
         import shutil
 
         # Diretório de backup
@@ -331,47 +725,97 @@ class Structure:
         # Criando diretório
         Path.mkdir(backup_file, exist_ok=True)
 
-        # Para cada arquivo do diretório
-        for file in Path(self.dir).glob("*"):
-            # Se for um arquivo
-            if file.is_file():
-                # Se for um arquivo dinâmico
-                if file.name == "geo_end.xyz" or file.name == "output":
-                    
-                    # Abrir sua versão no diretório "before_restart"
-                    with (backup_file / file.name).open('a') as copy_file:
-                        # Abrir arquivo a ser copiado
-                        with file.open() as src_file:
+        # Lendo dados da Structure (lê os dados mesmo que esteja em look 
+        # mode), antes que o geo_end.xyz seja movido
+        struct = Structure(dir=self.dir, read_from_dir=True)
+        struct.param, struct.dop_elem = self.param, self.dop_elem
+
+        # Arquivos dinâmicos, e arquivos usados no reinício
+        dynamic = ["geo_end.xyz", main_config["output_name"]]
+        keep = ["inp.xyz", "charges.dat", "dftb_in.hsd"]
+
+        rotate = main_config.get("resume_backup", "append") == "rotate"
+
+        # Número do próximo segmento, e arquivos movidos (para restaurar 
+        # em caso de erro)
+        segment = 1
+        while any( (backup_file / f"{name}.{segment:03d}{ext}").exists()
+                   for name in dynamic for ext in ["", ".gz"] ):
+            segment += 1
 
-                            # Adicionar arquivo a ser copiado no final 
-                            # do arquivo backup
-                            copy_file.write(src_file.read())
+        moved = []
 
-                # Se for qualquer outro arquivo, apenas copiar
+        # Para cada arquivo do diretório (listado antes de mover)
+        for file in list(Path(self.dir).glob("*")):
+            # Se for um arquivo. Os auxiliares da trajetória (ver 
+            # Trajectory) são reconstruídos, e não vão para o backup
+            if not file.is_file() or file.name.endswith((".traj.npy", ".traj.json")):
+                continue
+
+            # Mover, sem copiar os dados. Os arquivos usados no reinício
+            # são pequenos, e apenas copiados
+            if rotate and file.name not in keep:
+
+                if file.name in dynamic:
+                    target = backup_file / f"{file.name}.{segment:03d}"
                 else:
-                    # Copiar pra pasta backup
-                    shutil.copy(file, backup_file / file.name)
+                    target = backup_file / file.name
 
-        # Lendo dados da Structure (lê os dados mesmo que esteja em look mode)
-        struct = Structure(dir=self.dir, read_from_dir=True)
+                os.replace(file, target)
+                moved.append((target, file))
+
+            # Se for um arquivo dinâmico
+            elif file.name in dynamic:
+                
+                # Abrir sua versão no diretório "before_restart"
+                with (backup_file / file.name).open('a') as copy_file:
+                    # Abrir arquivo a ser copiado
+                    with file.open() as src_file:
+
+                        # Adicionar arquivo a ser copiado no final 
+                        # do arquivo backup
+                        copy_file.write(src_file.read())
+
+            # Se for qualquer outro arquivo, apenas copiar
+            else:
+                # Copiar pra pasta backup
+                shutil.copy(file, backup_file / file.name)
 
         # Gerando novos arquivos de otimização, e sobrescrevendo antigos         
         # Tentar gerar arquivos, com ReadInitialCharges
         try:
-            from doping_set import DopingSet
-            DopingSet.gen_files(self, read_initial_charges=True, redo=True)
+            from dopings.doping_set import DopingSet
+            DopingSet.gen_files(struct, read_initial_charges=True, redo=True)
         
         # Se não for possível, restaurar estado anterior
         except:
 
-            # Para cada arquivo do diretório
-            for file in Path(backup_file).glob("*"):
+            # Desfazendo o backup do modo rotate
+            if rotate:
+
+                # Movendo de volta os arquivos movidos
+                for target, file in moved:
+                    os.replace(target, file)
+
+                # Copiando de volta os arquivos usados no reinício
+                for name in keep:
+                    if (backup_file / name).is_file():
+                        shutil.copy(backup_file / name, self.dir / name)
+
+                # Remover pasta de backup, se não havia reinícios anteriores
+                if segment == 1:
+                    shutil.rmtree(backup_file)
+
+            else:
 
-                # Copiar de volta os arquivos guardados em backup (sobrescreve)
-                shutil.copy(file, backup_file.parent)
+                # Para cada arquivo do diretório
+                for file in Path(backup_file).glob("*"):
 
-            # Remover pasta de backup
-            shutil.rmtree(backup_file)
+                    # Copiar de volta os arquivos guardados em backup (sobrescreve)
+                    shutil.copy(file, backup_file.parent)
+
+                # Remover pasta de backup
+                shutil.rmtree(backup_file)
 
             # Anunciando que dados não foram alterados
             print("OPT FILES RESTORED BECAUSE REDO COULD NOT BE DONE")
@@ -383,50 +827,62 @@ class Structure:
         # (sobrescreve o inp.xyz gerado)
         struct.frame(struct.dir / "inp.xyz")
 
+        # Comprimindo os segmentos
+        if rotate and main_config.get("resume_compress", False):
+
+            for target, file in moved:
+
+                if file.name not in dynamic:
+                    continue
+
+                with open(target, "rb") as src_file:
+                    with gzip.open(f"{target}.gz", "wb") as gz_file:
+                        shutil.copyfileobj(src_file, gz_file)
+
+                Path.unlink(target)
+
         # Removendo todos os arquivos, exceto os que serão usados
         for file in Path(self.dir).glob("*"):
             # Se for um aquivo
             if file.is_file():
                 # Se não for charges.dat
-                if file.name not in ["inp.xyz", "charges.dat", "dftb_in.hsd"]:
+                if file.name not in keep:
 
                     # Remover
                     Path.unlink(file)
 
-    def data_from_file(self) -> None:
+    def data_from_file(self, lazy: bool=True) -> None:
 
         """
         A partir do diretório da estrutura, lê os arquivos de dados e os 
         carrega como propriedades do objeto Structure.
-        """
 
-        # Lendo coordenadas
-        frame_data = StructRead.read_frame(self)
+        A geometria é lida imediatamente. Já energia total, homo, lumo e
+        dipolo são, por padrão, apenas marcados para serem lidos no 
+        primeiro acesso, de forma que quem só usa a geometria não lê
+        output, band.out e detailed.out.
 
-        # Quantidade de dados
-        if frame_data is not None:
-            
-            number_of_data = len(frame_data[0])
+        Parameters
+        ----------
 
-            # Para cada átomo da estrutura
-            for i in range(len(frame_data)):
-                
-                # Juntando argumentos em um dict
-                temp_dict = {
+        lazy : bool, default = True
+            Se False, lê também as propriedades eletrônicas 
+            imediatamente.
+        """
 
-                    "elem"      :   frame_data[i][0] if frame_data is not None else None,
+        # Lendo coordenadas, já como colunas
+        frame_data = StructRead.read_frame_arrays(self)
 
-                    "coord"     :   [frame_data[i][1], 
-                                    frame_data[i][2], 
-                                    frame_data[i][3]] if frame_data is not None else None,
+        if frame_data is not None:
 
-                                                                                # e se houverem 5 dados por átomo
-                    "charge"    :   frame_data[i][4] if ((frame_data is not None and number_of_data==5)) else None
-                }
+            # Anexando todos os átomos de uma vez
+            codes, coords, charges = frame_data
+            self.append_arrays(elems=codes, coords=coords, charges=charges)
 
-                # Passando pares de chaves e valores do dicionário como 
-                # argumentos, usando "**"
-                self.append(Atom(**temp_dict))  
+        # Propriedades eletrônicas, lidas no primeiro acesso
+        if lazy:
+            self._lazy = {"total_energy", "homo", "lumo", "dipole"}
+            return
 
         # Lendo energia
         self.total_energy = StructRead.read_energy(self)
@@ -438,12 +894,22 @@ class Structure:
         self.dipole = StructRead.read_dipole(self)
 
     def opt(self, overwrite: bool=False, verbose: bool=True, 
-            skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=True
-            ) -> None:
+            skip_hard_to_conv_SCC: bool=True, resume_unfineshed: bool=True,
+            threads: int=None, cores: list[int]=None, 
+            bin_dir: str|Path=None, processes: set=None) -> OptimizationLog|None:
 
         """
         Executa uma otimização no diretório da estrutura, espera 
         a otimização terminar e relata o status ao final.
+
+        O DFTB+ é iniciado como processo filho, em outra sessão, com a 
+        saída escrita diretamente no arquivo de output. O arquivo não é
+        acompanhado por eventos: ele é relido a intervalos fixos (ver 
+        "OutputFollower" e "opt_poll_interval" em main_config.json), e 
+        as verificações de parada antecipada acontecem até um intervalo
+        depois de o DFTB+ escrever um passo. Só o fim do processo é 
+        percebido imediatamente. Em troca, o DFTB+ continua rodando e 
+        escrevendo o output se o processo Python for encerrado.
         
         Parameters
         ----------
@@ -464,10 +930,12 @@ class Structure:
             convergência do SCC devem ser impressos também.
 
         skip_hard_to_conv_SCC : bool, default=True
-            Se otimizações com demasiados passos SCC não convergidos 
-            devem ser puladas.
+            Se as políticas de parada antecipada (ver EarlyStop e 
+            "early_stop" em main_config.json) devem ser aplicadas, 
+            encerrando otimizações que não devem convergir.
 
-            Regra para determinar uma otimizão com demasiados passos:
+            Regra padrão para determinar uma otimizão com demasiados 
+            passos:
             
             Ter mais de 30 passos não convergidos; ou ter mais de 20
             passos não convergidos, antes de chegar no passo 30 da 
@@ -479,58 +947,83 @@ class Structure:
             último passo escrito e inicia tal otimização.
 
             Se False, recomeça do primeiro frame escrito.
-        """
 
-        import subprocess
-        from time import sleep
+        threads : int, default = None
+            Número de threads do DFTB+ (OMP_NUM_THREADS). Se None, usa o
+            número de processadores em "cores" ou, se também for None, o
+            valor do ambiente.
 
-        def run_opt(opt_dir):
+        cores : list[int], default = None
+            Processadores aos quais o DFTB+ fica restrito (afinidade, 
+            ver CoreAllocator). Se None, não restringe.
 
-            # Rodar otimização no diretório e guardar pid
-            pid = subprocess.run(f"nohup {bin_dir} >& {main_config['output_name']} & echo $!", 
-                                 shell=True, executable='/bin/bash', 
-                                 cwd=opt_dir, capture_output=True
-                                 ).stdout.decode("ascii").strip()
-            
-            return pid
-        
-        def kill_pid(pid):
+        bin_dir : str|Path, default = None
+            Executável usado na otimização. Se None, usa o "bin_dir" da
+            máquina de main_config.json.
 
-            print(f"try to kill {pid}")
+        processes : set, default = None
+            Conjunto onde o processo do DFTB+ fica registrado enquanto 
+            roda, para que possa ser encerrado de fora (ver 
+            OptScheduler). Se None, não é registrado.
 
-            subprocess.run(f"kill {pid}", shell=True, 
-                                    executable='/bin/bash', capture_output=True)
-            
-        def pid_running(pid):
+        Returns
+        -------
 
-            running = subprocess.run(f"if $(ps -p {pid} > /dev/null); then echo True; else echo False; fi", shell=True, 
-                                     executable='/bin/bash', capture_output=True
-                                     ).stdout.decode("ascii").strip() 
-            
-            return running == "True"
+        OptimizationLog
+            Resumo do output ao final.
+
+        None
+            Se o output não existir.
+        """
+
+        import os
+        import subprocess
+
+        def run_opt(opt_dir, output):
+
+            # Ambiente do processo, com o número de threads
+            n_threads = threads if threads is not None else (
+                        len(cores) if cores is not None else None)
+
+            env = None
+            if n_threads is not None:
+                env = dict(os.environ, OMP_NUM_THREADS=str(n_threads))
+
+            # A afinidade é herdada da thread que cria o processo: 
+            # restringir esta thread durante a criação
+            if cores is not None:
+                previous = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, cores)
+
+            try:
+                # Rodar otimização no diretório, com stdout e stderr no 
+                # arquivo de output. Em outra sessão, para não receber os
+                # sinais do terminal
+                return subprocess.Popen([str(bin_dir)], cwd=opt_dir, env=env,
+                                        stdin=subprocess.DEVNULL,
+                                        stdout=output, 
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+            finally:
+                if cores is not None:
+                    os.sched_setaffinity(0, previous)
 
         # Transformando endereço em Path      
         # Usar diretório da estrutura como o de otimização
         opt_dir = Path(self.dir).expanduser()
 
         # Endereço do binário
-        bin_dir = dirs_data["bin_dir"][main_config["maquina"]]
+        if bin_dir is None:
+            bin_dir = dirs_data["bin_dir"][main_config["maquina"]]
 
-        # Se o arquivo output existir
-        if Path.exists(opt_dir / main_config["output_name"]):
-
-            # Abrir o arquivo e verificar nele o status
-            with open(opt_dir / main_config["output_name"]) as file:
-
-                # Buscar no arquivo se convergiu
-                converged = file.read().find("Geometry converged") != -1
+        # Resumo do output existente (None se o arquivo não existir)
+        log = StructRead.read_opt_log(self)
 
         # Se o arquivo não existir, considerar como "não convergido"
-        else:
-            converged = False
+        converged = log is not None and log.converged is True
 
         # Guardar quantos passos foram escritos
-        written = self.report(return_written=True)
+        written = self.report(return_written=True, log=log)
 
         # A exigência de 1 passo escrito é para evitar que ele refaça os 
         # arquivos em caso de já estarem refeitos
@@ -543,40 +1036,65 @@ class Structure:
 
         # Se ainda não convergiu ou for pedido para sobrescrever
         if (not converged) or (overwrite):
-            pid = run_opt(opt_dir)
-    
-            # Em loop infinito
-            while True:
 
-                # Se estiver configurado para pular estruturas com grande 
-                # dificuldade de convergir o SCC
-                if skip_hard_to_conv_SCC:
+            # Políticas de parada antecipada, avaliadas a cada novo passo
+            # ou nova falha do SCC
+            early_stop = EarlyStop.for_struct(self) if skip_hard_to_conv_SCC else None
+            signals = None
+
+            output_path = opt_dir / main_config["output_name"]
+
+            # O DFTB+ escreve no arquivo, que fica aberto só até o início
+            with open(output_path, "wb") as output:
+                process = run_opt(opt_dir, output)
+
+            # Registrar o processo assim que é iniciado
+            if processes is not None:
+                processes.add(process)
+
+            try:
+                # Resumo do output, atualizado a cada leitura
+                follower = OutputFollower(output_path)
+                log = follower.log
+
+                for log in follower.follow(process, main_config.get("opt_poll_interval", 1.0)):
+
+                    # Se estiver configurado para pular estruturas que 
+                    # não devem convergir, e ainda não foi encerrada
+                    if early_stop is None or log.stop_reason is not None:
+                        continue
 
-                    # Encontrar lista de SCC não convergido
-                    nConv_SCC = self.report(return_SCC=True)
+                    current = (len(log.steps_offsets), len(log.not_conv_SCC_steps))
 
-                    # Se tiver mais que 30 SCC não convergido,
-                    # ou chegar a 20 nconv antes do passo 30
-                    if (len(nConv_SCC) > 30 
-                        or (len(nConv_SCC) > 0 and nConv_SCC[-1] < 30 
-                        and len(nConv_SCC) > 20)):
+                    if current != signals:
+
+                        signals = current
+                        log.stop_reason = early_stop.check(log)
 
                         # Encerrar dftb+
-                        kill_pid(pid)
-                        
-                # Se o dftb+ não estiver rodando mais, sair do loop
-                if not pid_running(pid):
+                        if log.stop_reason is not None:
+                            print(f"try to kill {process.pid}")
+                            process.terminate()
 
-                    break
-                
-                sleep(5)
+                process.wait()
+
+            finally:
+                if processes is not None:
+                    processes.discard(process)
+
+            # Guardando o resumo no manifesto da árvore de otimizações
+            manifest = OptManifest.for_struct(self)
+            if manifest is not None and log is not None:
+                manifest.record(opt_dir, log)
 
         # Reportar status a partir do diretório da estrutura 
-        self.report(verbose=verbose)
+        self.report(verbose=verbose, log=log)
+
+        return log
 
     def report(self, return_SCC: bool=False, return_conv: bool=False, 
-               verbose: bool=True, 
-               return_written: bool=False) -> None|bool|list[int]:
+               verbose: bool=True, return_written: bool=False, 
+               log: OptimizationLog=None) -> None|bool|list[int]:
 
         """
         Reporta o estado da otimização da estrutura a partir do
@@ -618,6 +1136,10 @@ class Structure:
 
         return_written : bool, default=False
             Se True, retorna uma lista dos passos escritos no arquivo.
+
+        log : OptimizationLog, default=None
+            Resumo do arquivo de output já lido. Se None, o arquivo é 
+            lido (ver "StructRead.read_opt_log").
         
         Returns
         -------
@@ -632,109 +1154,6 @@ class Structure:
             No caso de nenhuma opção de retorno ser True.
         """
 
-        import os
-
-        # Diretório de otimização
-        opt_dir = self.dir
-        output_file = opt_dir / main_config["output_name"]
-
-        # Encontra todas as ocorrências de uma substring
-        def find_all(data: str, substring: str) -> list[int]:
-            """
-            Função que encontra a posição de todas as ocorrências de uma 
-            substring em uma string maior (como de um documento).
-
-            Returns
-            -------
-
-            list[int]
-                Lista de posições onde a substring foi encontrada.
-            """
-
-            # Inicializando lista de passos
-            steps = []
-            # Inicializando primeiro passo condiderado como -1
-            step = -1
-
-            while True:
-
-                # Continuar na posição seguinte à última encontrada
-                step = data.find(substring, step+1)
-
-                # Se encontrar próxima ocorrência
-                if step != -1:
-                    steps.append(step)
-
-                # Do contrário, sair do loop
-                else: 
-                    break
-
-            return steps
-
-        # Função para encontrar em que passo se encontra uma posição 
-        # de caracter
-        def indexes_to_steps(steps_indexes: list[int], 
-                             searched_indexes: list[int]) -> list[int]:
-            """
-            Função que identifica em que passo da otimização se encontra
-            um índice qualquer buscado.
-
-            No caso, recebe uma lista de indexes, e devolve uma lista 
-            com os passos onde cada um dos indexes se encontra.
-
-            Parameters
-            ----------
-
-            steps_indexes : list[int]
-                Lista dos índeces de início dos passos.
-
-            searched_indexes : list[int]
-                Lista de indexes procurados dentro dos passos.
-
-            Returns
-            -------
-
-            list[int]
-                Lista de mesmo tamanho que searched_indexes, onde cada 
-                item é o passo onde foi encontrado o index buscado
-                correspondente.
-
-            Raises
-            ------
-            AssertionError
-                index not found in file.
-            """
-
-            # Lista para acumular passos
-            found_steps = []
-
-            # Número de passos da otimização
-            steps_num = len(steps_indexes)
-            # Atribundo a última posição do arquivo como sendo um passo posterior ao último
-            steps_indexes = steps_indexes + [ len(data)-1 ]
-
-            # Para cada index buscado
-            for index in searched_indexes:
-            
-                # Avaliar cada passo:
-                for step in range(0, steps_num):
-
-                    # Se o index buscado for maior que o do passo atual,
-                    # e menor que o do passo seguinte
-                    if (index > steps_indexes[step] 
-                        and index < steps_indexes[step+1]):
-
-                        # Anexar o passo avaliado como sendo o de tal index
-                        found_steps.append(step)
-                        break
-                    
-                    # Se não achou, e já processou o último passo
-                    elif step == steps_num-1:
-                            raise AssertionError("index not found in file.")
-
-            # Retornar dados
-            return found_steps
-
         # Imprime status
         def print_status(exists: bool=None, 
                          converged: bool=None, 
@@ -767,6 +1186,9 @@ class Structure:
 
             id = self.name() if self.name() is not None else self.dir
 
+            # Passos onde o SCC não convergiu
+            not_conv_SCC = not_conv_SCC if not_conv_SCC is not None else []
+
             messages = []
 
             # Se arquivo não existe, imprimir que não existe
@@ -786,7 +1208,7 @@ class Structure:
                 elif not_converged:
 
                     # Reportat a não convergência
-                    messages.append(f"{iid} - {'NOT converged':<14} | Last step: {steps_written[-1]}")
+                    messages.append(f"{id} - {'NOT converged':<14} | Last step: {steps_written[-1]}")
 
                 # Se não convergiu, mas não foi explicitamente encontrado que não convergiu
                 else:
@@ -808,7 +1230,7 @@ class Structure:
 
                     # Calcular porcentagem não convergente, não considerando o 
                     # último passo, que ainda está sendo escrito
-                    percent = round(100*len(not_conv_SCC_steps) / (len(steps_written) - 1), 1)
+                    percent = round(100*len(not_conv_SCC) / max(len(steps_written) - 1, 1), 1)
 
                     # Caso a leitura ocorra no pequeno intervalo que onde o passo acabou se ser escrito
                     # E o pŕoximo não se iniciou, gerando mais que 100%, jogar de volta para 100
@@ -818,14 +1240,14 @@ class Structure:
                     messages.append("")
 
                     # Adicionar à mensagem os não convergentes
-                    messages.append(f"\tNot converged SCC's: {not_conv_SCC_steps} => {percent}% of total")
+                    messages.append(f"\tNot converged SCC's: {not_conv_SCC} => {percent}% of total")
 
                     # Nova linha
                     messages.append("")
 
                     # Se o último passo da otimização teve SCC não convergente
                     # Verificar se o SCC divergiu no último passo
-                    if not_conv_SCC_steps[-1] == steps[-1]:
+                    if not_conv_SCC[-1] == steps_written[-1]:
                         
                         # Adicionar warning às mensagens
                         messages.append("WARNING: SCC was not converged in the final step.")
@@ -835,10 +1257,14 @@ class Structure:
 
                 print(message)
 
+        # Resumo do arquivo de output, lido em uma única passagem
+        if log is None:
+            log = StructRead.read_opt_log(self)
+
         ######################### VERIFICANDO SE ARQUIVO EXISTE ###############
 
         # Se o arquivo não existir
-        if not os.path.exists(output_file):
+        if log is None:
 
             # Se tiver em modo de retorno de passos escritos, retornar None
             if return_written:
@@ -848,87 +1274,37 @@ class Structure:
             # convergiu
             if return_conv:
                 return False
+
+            # Se for modo de retorno dos SCC não convergidos, não há passos
+            if return_SCC:
+                return []
             
             # Imprimir status
             print_status(exists=False)
 
-        #######################################################################
-
-        # Do contrário...
-        else:
-
-            # Ler arquivo output
-            with open(output_file) as file:
-                data = file.read()
-
-            ################### LISTANDO PASSOS DO SCC ########################
-
-            # Listando posição de todos os passos => [12, 157, 368, ...]
-            steps_indexes = find_all(data, "Geometry step:")
-            # Criando lista dos números dos passos => [0, 1, 2, 3, 4, ...]
-            steps = [ i for i in range(len(steps_indexes))]
-
-            # Se estiver no modo de retorno dos passos escritos no arquivo
-            if return_written:
-                # Retornar passos
-                return steps
-
-            # Listando posição de SCC's não convergentes
-            not_conv_SCC_indexes = find_all(data, "SCC is NOT converged")
-
-            # Encontrando passos onde o SCC não convergiu
-            not_conv_SCC_steps = indexes_to_steps(steps_indexes, 
-                                                  not_conv_SCC_indexes)
-
-            # Se for modo de retorno, retornar os SCC não conv
-            if return_SCC:
-
-                return not_conv_SCC_steps
-
-            ############## VERIFICANDO ESTADO DA OTIMIZAÇÃO ###################
+            return None
 
-            # Se achar no arquivo, que a otmização convergiu...
-            if data.find("Geometry converged") != -1:
-                
-                # Se estiver nesse modo de retorno de convergência, retornar 
-                # que convergiu
-                if return_conv:
-                    return True
-
-                # Imprimir status
-                print_status(exists=True, 
-                             converged=True,
-                             not_conv_SCC=not_conv_SCC_indexes, 
-                             steps_written=steps)
-
-            # Se achar no arquivo que a otimização não convergiu, reportar
-            elif (data.find("Geometry NOT converged") != -1 
-                  or data.find("Geometry did NOT converge") != -1):
-                
-                # Se estiver nesse modo, retornar que não convergiu
-                if return_conv:
-                    return False
-                
-                # Imprimir status
-                print_status(exists=True, 
-                             converged=False,
-                             not_converged=True,
-                             not_conv_SCC=not_conv_SCC_indexes, 
-                             steps_written=steps)
-                
-            # Se não foi encontrado que convergiu, mas também não foi 
-            # encontrado que não convergiu
-            else:
+        #######################################################################
 
-                # Se estiver nesse modo, retornar que não convergiu
-                if return_conv:
-                    return False
-                
-                # Imprimir status
-                print_status(exists=True, 
-                            converged=False, 
-                            not_conv_SCC=not_conv_SCC_indexes,
-                            steps_written=steps)
+        # Se estiver no modo de retorno dos passos escritos no arquivo
+        if return_written:
+            return log.steps
+
+        # Se for modo de retorno, retornar os SCC não conv
+        if return_SCC:
+            return log.not_conv_SCC_steps
+
+        # Se estiver nesse modo de retorno de convergência, retornar se 
+        # convergiu
+        if return_conv:
+            return log.converged is True
+
+        # Imprimir status
+        print_status(exists=True, 
+                     converged=log.converged is True,
+                     not_converged=log.converged is False,
+                     not_conv_SCC=log.not_conv_SCC_steps, 
+                     steps_written=log.steps)
                 
     ############# Dopagem
 
@@ -979,26 +1355,35 @@ class Structure:
 
         #######################################################################
         
-        from copy import deepcopy
-        
-        # Criando cópias dos valores invés de copiar o ponteiro
-        atoms = list(deepcopy(self.atoms))
-
-        # Apagando cargas
-        for atom in atoms:
-            atom.charge = None
+        # Criando outro objeto Structure, que será dopado
+        doped_out = Structure(**(kwargs if kwargs is not None else {}))
 
-        # Modificando o símbolo de elemento químico no átomo especificado
-        atoms[id-1].elem = dop_elem
+        # Copiando colunas, sem as cargas originais
+        doped_out.append_arrays(elems=self.elem_codes, coords=self.coords)
 
-        # Criando outro objeto Structure, agora dopado
-        doped_out = Structure(atoms=atoms, **kwargs)
+        # Modificando o código de elemento químico no átomo especificado
+        doped_out._codes[id-1] = elem_to_code(dop_elem)
 
         # Retornando
         return doped_out
 
     ############# 
 
+    def element_counts(self) -> np.ndarray:
+        """
+        Retorna a composição da estrutura: o número de átomos de cada 
+        elemento, indexado pelo código do elemento (ver ELEMENTS e 
+        "count_elements").
+
+        Returns
+        -------
+
+        np.ndarray[np.int64]
+            Vetor de contagens, de tamanho len(ELEMENTS).
+        """
+
+        return count_elements(self.elem_codes)
+
     def formation_energy(self) -> tuple[float, float]:
 
         """
@@ -1016,15 +1401,9 @@ class Structure:
             otimização, energia média de formação por átomo.
         """
 
-        # Lista que receberá os dados
-        data = []
-
-        # Para cada átomo, anexar sua energia à lista "data"
-        for atom in self.atoms:
-            data.append(atoms_data["energ_atom"][self.param][atom.elem])
-
-        # Retornando como array ao final da iteração
-        atoms_energies_sum = np.array(data).sum()
+        # Somando a energia de cada átomo: contagens de cada elemento 
+        # vezes as energias de referência
+        atoms_energies_sum = float(atoms_energy(self.element_counts(), self.param))
 
         ############# Valência e energia dos átomos
 
@@ -1058,12 +1437,101 @@ class Structure:
 
     ##### Análise das ligações
 
+    def neighbor_index(self) -> NeighborIndex:
+        """
+        Retorna o índice espacial de vizinhos (ver NeighborIndex) da 
+        geometria atual da estrutura.
+
+        O índice é guardado junto de uma cópia das coordenadas usadas 
+        para construí-lo, e só é reconstruído quando a geometria muda.
+
+        Returns
+        -------
+
+        NeighborIndex
+            Índice de vizinhos da estrutura.
+        """
+
+        index = getattr(self, "_neighbors", None)
+
+        # Reconstruir se não existir, ou se a geometria mudou
+        if index is None or not np.array_equal(index.coords, self.coords):
+            index = NeighborIndex(self.coords)
+            self._neighbors = index
+
+        return index
+
+    def bonds(self, bond_crit: dict[str, float]=None
+              ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retorna os pares de átomos ligados e seus comprimentos. Um par 
+        é considerado ligado se sua distância é menor que o comprimento
+        máximo definido para o seu par de elementos.
+
+        Parameters
+        ----------
+
+        bond_crit : dict[str, float], default = None
+            Comprimento máximo de ligação por par de elementos, com 
+            chaves no formato "A-B", em ordem alfabética. Se None, usa
+            os critérios do material da estrutura em viz_config.json 
+            (histogram/bond_crit).
+
+        Returns
+        -------
+
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            Índices i, índices j (i < j) e comprimentos de cada ligação.
+
+        Raises
+        ------
+
+        KeyError
+            Se não houver critério para um par de elementos a uma 
+            distância menor que o maior critério.
+        """
+
+        if bond_crit is None:
+            bond_crit = viz_config['histogram']['bond_crit'][self.material]
+
+        # Todos os pares dentro do maior critério
+        i, j, dist = self.neighbor_index().pairs(max(bond_crit.values()))
+
+        # Tabela de critérios por par de códigos de elementos presentes
+        codes = self.elem_codes
+        crit = np.full((len(ELEMENTS), len(ELEMENTS)), np.nan)
+
+        for code1 in np.unique(codes):
+            for code2 in np.unique(codes):
+
+                # Label do par
+                label = "-".join(sorted([ELEMENTS[code1], ELEMENTS[code2]]))
+
+                if label in bond_crit:
+                    crit[code1, code2] = bond_crit[label]
+
+        pair_crit = crit[codes[i], codes[j]]
+
+        # Pares sem critério definido
+        missing = np.isnan(pair_crit)
+
+        if missing.any():
+            first = np.flatnonzero(missing)[0]
+            raise KeyError("-".join(sorted([ELEMENTS[codes[i[first]]], 
+                                            ELEMENTS[codes[j[first]]]])))
+
+        # Se o comprimento for menor que o critério, é uma ligação válida
+        keep = dist < pair_crit
+
+        return i[keep], j[keep], dist[keep]
+
     def shortest_distances(self, elem1: str, elem2: str, 
                            n: int) -> list[float]:
 
         """
         Retorna as "n" menores distâncias entre átomos de dados 
-        elementos, na estrutura.
+        elementos, na estrutura. Cada par de átomos é contado uma única
+        vez, e a distância de um átomo a si mesmo não é considerada.
 
         Parameters
         ----------
@@ -1083,33 +1551,32 @@ class Structure:
         list[float]
             Lista com as "n" menores comprimentos entre átomos da estrutura.
         """
-        
-        # Lista para receber comprimentos de ligação
-        data = []
 
-        # Salvando quantidade de átomos na estrutura
-        tam = self.atoms.shape[0]
+        elems = self.elems
 
-        # Para o índice de cada átomo na estrutura, procuar o átomo buscado
-        for i in range(tam):
+        queries = elems == elem1
+        targets = elems == elem2
 
-            # Se dado átomo é o buscado
-            if self.atoms[i].elem == elem1:
+        if n <= 0 or not queries.any() or not targets.any():
+            return []
 
-                # Para o índice de cada outro átomo na estrutura
-                for j in range(tam):
+        # Os "n" menores pares estão, necessariamente, entre os "n" 
+        # vizinhos mais próximos de cada átomo do elemento 1
+        indices, distances = self.neighbor_index().knn(n, queries, targets)
 
-                    # Se dado átomo é o buscado
-                    if self.atoms[j].elem == elem2:
+        q = np.repeat(np.flatnonzero(queries), n)
+        t = indices.ravel()
+        d = distances.ravel()
 
-                        # Calcular comprimento da ligação
-                        bond_length = self.atoms[i].dist_to(self.atoms[j])
+        valid = t >= 0
+        q, t, d = q[valid], t[valid], d[valid]
 
-                        # Listar valor do comprimento 
-                        data.append(bond_length)
+        # Contando cada par uma única vez
+        pairs = np.stack([np.minimum(q, t), np.maximum(q, t)], axis=1)
+        _, unique = np.unique(pairs, axis=0, return_index=True)
 
         # Retornar primeiros "n" resultados da lista ordenada
-        return sorted(data)[0:n]
+        return np.sort(d[unique])[0:n].tolist()
 
     ############ Escrita/cópia de arquivos
 
@@ -1140,6 +1607,45 @@ class Structure:
         if not isinstance(frame_out, str|Path):
             raise TypeError("frame_out must be str or Path.")
 
+        # Convertendo tudo em texto (string formatada)
+        data = self.frame_text(ignore_charges=ignore_charges)
+
+        # Convertendo endereço em caminho Path
+        frame_out = Path(frame_out).expanduser()
+        # Criando diretórios necessários para a escrita
+        Path.mkdir(frame_out.parent, exist_ok=True, parents=True)
+
+        # Escrevendo em arquivo no endereço passado
+        with open(frame_out, mode = 'w') as file:
+            file.write(data)
+
+        # Imprimir endereço do arquivo escrito
+        print(frame_out)
+
+    def frame_text(self, ignore_charges: bool=False) -> str:
+        """
+        Gera o texto do arquivo xyz do último frame da estrutura (ver
+        "frame"), sem escrevê-lo.
+
+        Parameters
+        ----------
+
+        ignore_charges : bool, default = False
+            Se True as cargas não são escritas.
+
+        Returns
+        -------
+
+        str
+            Conteúdo do arquivo xyz.
+
+        Raises
+        ------
+
+        ValueError
+            This Structure has no atoms.
+        """
+
         # Lista para receber dados
         data = []
 
@@ -1152,31 +1658,24 @@ class Structure:
         else:
             data.append("frame")
 
-        if len(self.atoms) > 0:
+        if self.size > 0:
+
+            # Colunas como listas de floats do Python
+            elems = self.elems.tolist()
+            coords = self.coords.tolist()
+
             # Para cada átomo, adicionar uma linha com: elemento, X, Y, Z 
-            if self.atoms[0].charge is None or ignore_charges:           
-                for atom in self.atoms:
-                    data.append(" ".join( [ atom.elem ] + [ str(round(number, 8)) for number in atom.coord]))
+            if not self.has_charges() or ignore_charges:           
+                for elem, coord in zip(elems, coords):
+                    data.append(" ".join( [ elem ] + [ str(round(number, 8)) for number in coord]))
             else:
-                for atom in self.atoms:
-                    data.append(" ".join( [ atom.elem ] + [ str(round(number, 8)) for number in atom.coord] + [str(atom.charge)]))
+                for elem, coord, charge in zip(elems, coords, self.charges.tolist()):
+                    data.append(" ".join( [ elem ] + [ str(round(number, 8)) for number in coord] + [str(charge)]))
         else:
             raise ValueError("This Structure has no atoms.")
 
         # Convertendo tudo em texto (string formatada)
-        data = "\n".join(data)
-
-        # Convertendo endereço em caminho Path
-        frame_out = Path(frame_out).expanduser()
-        # Criando diretórios necessários para a escrita
-        Path.mkdir(frame_out.parent, exist_ok=True, parents=True)
-
-        # Escrevendo em arquivo no endereço passado
-        with open(frame_out, mode = 'w') as file:
-            file.write(data)
-
-        # Imprimir endereço do arquivo escrito
-        print(frame_out)
+        return "\n".join(data)
 
     def output(self, output_dest: str|Path) -> None:
 
@@ -1215,9 +1714,35 @@ class Structure:
         Retorna uma cópia da estrutura original.
         """
 
-        from copy import deepcopy
+        from copy import copy
 
-        return deepcopy(self)
+        # Cópia rasa dos atributos, e cópia dos arrays, já sem a 
+        # capacidade extra
+        struct = copy(self)
+        struct.__dict__.update(self.__getstate__())
+
+        return struct
+
+    def __getstate__(self) -> dict:
+        """
+        Estado usado para pickle e cópia: os arrays são copiados apenas 
+        até o número de átomos da estrutura.
+        """
+
+        state = self.__dict__.copy()
+
+        state["_codes"] = self.elem_codes.copy()
+        state["_coords"] = self.coords.copy()
+        state["_charges"] = self.charges.copy()
+
+        # O índice de vizinhos é reconstruído sob demanda
+        state["_neighbors"] = None
+
+        # Cada cópia lê suas próprias propriedades pendentes
+        state["_lazy"] = set(self._lazy)
+        state["_cache_pending"] = set(self._cache_pending)
+
+        return state
 
     def name(self) -> str|None:
         """
@@ -1240,39 +1765,4 @@ class Structure:
         else:
             return f"{self.material}-{self.dop_elem}-{self.base}-{self.site}"
         
-    def write_struct_pickle(self, pkl_path: str|Path) -> None:
-        """
-        Escreve o objeto Strucutre como um arquivo pickle no 
-        armazenamento.
-
-        Parameters
-        ----------
-
-        pkl_path : str or Path
-            O caminho do arquivo pickle a ser salvo.
-        """
-
-        Path.mkdir(Path(pkl_path).parent, parents=True, exist_ok=True)
-
-        import pickle
-        with open(pkl_path, "wb") as file:
-            pickle.dump(self, file)
-
-    @staticmethod
-    def read_struct_pickle(pkl_dir: str|Path) -> Structure:
-        """
-        Lê um arquivo pickle onde foi escrito um objeto Strucutre,
-        cria tal objeto e o retorna.
-
-        Parameters
-        ----------
-
-        pkl_path : str or Path
-            O caminho do arquivo pickle a ser lido.
-        """
-
-        import pickle
-        with open(pkl_dir, "rb") as file:
-            return pickle.load(file)
-
 ####################################################################################
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import os
+import json
+import numpy as np
+from pathlib import Path
+
+"Este módulo contém a classe Trajectory"
+
+# Versão do formato dos arquivos auxiliares. Se mudar, são reconstruídos
+TRAJ_FORMAT_VERSION = 2
+
+class Trajectory:
+
+    """
+    Acesso aleatório aos frames de uma trajetória de otimização em
+    formato xyz (geo_end.xyz).
+
+    Na primeira utilização, o arquivo xyz é lido uma única vez, e são
+    gerados dois arquivos auxiliares, ao lado dele ou em outro local
+    (por exemplo, no diretório do cache, ver 
+    "StructRead.read_trajectory"):
+
+    - "<nome>.traj.npy": array binário (n_frames, N, 3) das coordenadas
+      de todos os frames, lido por memory-map.
+    - "<nome>.traj.json": índice com a posição (em bytes) de cada frame
+      no xyz, os elementos dos átomos, o endereço e a assinatura 
+      (tamanho e data de modificação) do xyz usado.
+
+    Nas próximas utilizações, se o xyz não tiver mudado, os frames são
+    acessados direto do binário, sem reler o texto. Frames incompletos
+    no final do arquivo (otimização em andamento) são ignorados.
+
+    Attributes
+    ----------
+
+    path : Path
+        Endereço do arquivo xyz.
+
+    n_frames : int
+        Número de frames completos na trajetória.
+
+    n_atoms : int
+        Número de átomos em cada frame.
+
+    elems : np.ndarray[str]
+        Símbolos dos elementos dos átomos, lidos do primeiro frame.
+
+    offsets : np.ndarray[int]
+        Posição (em bytes) do início de cada frame no arquivo xyz.
+
+    coords : np.ndarray[float]
+        Array (n_frames, N, 3), somente leitura, mapeado do arquivo
+        binário auxiliar.
+
+    Methods
+    -------
+
+    __init__(self, path: str|Path, sidecar: str|Path=None) -> None
+
+        Abre a trajetória, construindo os arquivos auxiliares se
+        necessário.
+
+    frame(self, index: int) -> np.ndarray
+
+        Retorna as coordenadas (N, 3) de um frame.
+
+    frames(self, start: int=None, stop: int=None, step: int=None) -> np.ndarray
+
+        Retorna as coordenadas (n, N, 3) de um subconjunto de frames.
+    """
+
+    def __init__(self, path: str|Path, sidecar: str|Path=None) -> None:
+        """
+        Abre a trajetória, construindo os arquivos auxiliares se
+        necessário.
+
+        Parameters
+        ----------
+
+        path : str|Path
+            Endereço do arquivo xyz da trajetória.
+
+        sidecar : str|Path, default = None
+            Endereço dos arquivos auxiliares, sem a extensão (são 
+            acrescentados ".traj.npy" e ".traj.json"). Se None, ficam ao
+            lado do xyz.
+
+        Raises
+        ------
+
+        FileNotFoundError
+            Se o arquivo xyz não existir.
+
+        ValueError
+            "Malformed xyz header."
+        """
+
+        self.path = Path(path).expanduser()
+
+        # Arquivos auxiliares
+        if sidecar is None:
+            sidecar = self.path.with_suffix("")
+        sidecar = Path(sidecar).expanduser()
+
+        Path.mkdir(sidecar.parent, parents=True, exist_ok=True)
+
+        self._coords_path = sidecar.with_name(sidecar.name + ".traj.npy")
+        self._index_path = sidecar.with_name(sidecar.name + ".traj.json")
+
+        stat = os.stat(self.path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        index = self._read_index()
+
+        # Reconstruir se não existir, ou se o xyz mudou
+        if (index is None or index["signature"] != signature
+            or index["path"] != str(self.path)
+            or not self._coords_path.is_file()):
+            index = self._build(signature)
+
+        self.n_atoms = index["n_atoms"]
+        self.elems = np.array(index["elems"], dtype=str)
+        self.offsets = np.array(index["offsets"], dtype=np.int64)
+        self.n_frames = self.offsets.size
+
+        self.coords = np.load(self._coords_path, mmap_mode="r")
+
+    def _read_index(self) -> dict|None:
+        """
+        Lê o índice auxiliar, se existir e for da versão atual.
+        """
+
+        try:
+            with open(self._index_path) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if index.get("version") != TRAJ_FORMAT_VERSION:
+            return None
+
+        return index
+
+    def _build(self, signature: list[int]) -> dict:
+        """
+        Lê o arquivo xyz uma única vez, escrevendo o binário das
+        coordenadas e o índice de frames.
+        """
+
+        # Primeira passagem: posição de cada frame completo
+        offsets = []
+        elems = []
+
+        with open(self.path, "rb") as file:
+
+            try:
+                n_atoms = int(file.readline())
+            except ValueError:
+                raise ValueError("Malformed xyz header.")
+
+            page_size = n_atoms + 2
+            file.seek(0)
+
+            offset = 0
+            line_number = 0
+
+            for linha in file:
+
+                # Início de um frame
+                if line_number % page_size == 0:
+                    frame_start = offset
+
+                # Elementos, lidos do primeiro frame
+                if 2 <= line_number < page_size:
+                    elems.append(linha.split()[0].decode())
+
+                # Última linha de um frame: o frame está completo
+                if line_number % page_size == page_size - 1:
+                    offsets.append(frame_start)
+
+                offset += len(linha)
+                line_number += 1
+
+        # Segunda passagem: coordenadas de cada frame, escritas direto no
+        # arquivo binário
+        tmp_path = self._coords_path.with_name(self._coords_path.name + ".tmp")
+
+        coords = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float64,
+                                           shape=(len(offsets), n_atoms, 3))
+
+        with open(self.path, "rb") as file:
+
+            for i, frame_start in enumerate(offsets):
+
+                file.seek(frame_start)
+
+                # Pulando cabeçalho
+                file.readline()
+                file.readline()
+
+                coords[i] = [ linha.split()[1:4]
+                              for linha in (file.readline() for _ in range(n_atoms)) ]
+
+        coords.flush()
+        del coords
+
+        os.replace(tmp_path, self._coords_path)
+
+        index = {"version"   : TRAJ_FORMAT_VERSION,
+                 "path"      : str(self.path),
+                 "signature" : signature,
+                 "n_atoms"   : n_atoms,
+                 "elems"     : elems,
+                 "offsets"   : offsets}
+
+        # Escrevendo índice por último, e de forma atômica
+        tmp_path = self._index_path.with_name(self._index_path.name + ".tmp")
+
+        with open(tmp_path, "w") as file:
+            json.dump(index, file)
+
+        os.replace(tmp_path, self._index_path)
+
+        return index
+
+    def __len__(self) -> int:
+
+        return self.n_frames
+
+    def __getitem__(self, index: int|slice) -> np.ndarray:
+
+        return self.coords[index]
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        Retorna as coordenadas (N, 3) de um frame, como vista do
+        arquivo binário. Aceita índices negativos.
+
+        Parameters
+        ----------
+
+        index : int
+            Índice do frame.
+
+        Returns
+        -------
+
+        np.ndarray[float]
+            Coordenadas dos átomos no frame.
+        """
+
+        return self.coords[index]
+
+    def frames(self, start: int=None, stop: int=None,
+               step: int=None) -> np.ndarray:
+        """
+        Retorna as coordenadas (n, N, 3) de um subconjunto de frames,
+        como vista do arquivo binário (sem cópia).
+
+        Parameters
+        ----------
+
+        start, stop, step : int, default = None
+            Mesmo significado que em um fatiamento "[start:stop:step]".
+
+        Returns
+        -------
+
+        np.ndarray[float]
+            Coordenadas dos átomos em cada frame selecionado.
+        """
+
+        return self.coords[start:stop:step]
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# Substituto do DFTB+ para testar o escalonamento das otimizações (ver
+# opt_dry_run.py). Escreve no stdout um output no formato do DFTB+, com
+# alguns passos de otimização, sem calcular nada.
+#
+# Variáveis de ambiente:
+#   STANDIN_STEPS  número de passos (padrão 5)
+#   STANDIN_DELAY  segundos por passo (padrão 0.2)
+#   STANDIN_FAIL   se "1", nenhum passo tem o SCC convergido
+
+import os
+import sys
+import time
+
+steps = int(os.environ.get("STANDIN_STEPS", 5))
+delay = float(os.environ.get("STANDIN_DELAY", 0.2))
+fail = os.environ.get("STANDIN_FAIL") == "1"
+
+start = time.time()
+
+print(f"Stand-in for DFTB+ in {os.getcwd()} (OMP_NUM_THREADS={os.environ.get('OMP_NUM_THREADS')})")
+
+for step in range(steps):
+
+    print(f"  Geometry step: {step}")
+
+    if fail:
+        print("  SCC is NOT converged, maximal SCC iterations exceeded")
+
+    energy = -3224.0 - 0.1 / (step + 1)
+    print(f"Total Energy:                     {energy / 27.2114:.10f} H     {energy:.4f} eV")
+
+    sys.stdout.flush()
+    time.sleep(delay)
+
+print(f"Extrapolated to 0K:               {energy / 27.2114:.10f} H     {energy:.4f} eV")
+print("Geometry NOT converged" if fail else "Geometry converged")
+
+elapsed = time.time() - start
+print(f"Total                      =  {elapsed:11.2f} (100.0%) {elapsed:11.2f} (100.0%)")
@@ -5,7 +5,6 @@ sys.path.append("../" )
 
 # Bibliotecas internas
 from dopings.structure import Structure
-from dopings.atom import Atom
 from dopings.config import dops_data, dirs_data, h2_gen_data
 from dopings.h2_gen import H2Gen
 
@@ -81,9 +80,10 @@ def gen_H2_flake(struct, nH2, output_path, both_sides=False, vertical=False,
 
     ###########################################################################
 
-    # Adicionar todos os átomos de H na estrutura
-    for coord in R3_H2_coords:
-        struct.append(Atom(elem="H", coord=np.round(coord, decimals=8).tolist()))
+    # Adicionar todos os átomos de H na estrutura, de uma vez
+    if len(R3_H2_coords) > 0:
+        struct.append_arrays(elems=["H"] * len(R3_H2_coords), 
+                             coords=np.round(R3_H2_coords, decimals=8))
 
     # Gerar aquivo .xyz da estrutura
     struct.frame(output_path)
@@ -5,7 +5,6 @@ sys.path.append("../" )
 
 # Bibliotecas internas
 from dopings.structure import Structure
-from dopings.atom import Atom
 from dopings.config import dirs_data, h2_gen_data
 from dopings.h2_gen import H2Gen
 
@@ -52,8 +51,7 @@ def gen_H2_periodic(p_struct: "PeriodicStructure",
     struct = p_struct.struct.copy()
 
     # Movendo célula pro (0,0,0)
-    for i in range(struct.size):
-        struct.atoms[i].coord -= p_struct.initial_vec
+    struct.coords -= p_struct.initial_vec
 
     # Se both sides, distribuir contagem dos dois lados
     H2_gen_count =  (H2_count//2) if (both_sides) else (H2_count)
@@ -93,9 +91,10 @@ def gen_H2_periodic(p_struct: "PeriodicStructure",
 
     ###########################################################################
 
-    # Adicionar todos os átomos de H na estrutura
-    for coord in R3_H2_coords:
-        struct.append(Atom(elem="H", coord=np.round(coord, decimals=8).tolist()))
+    # Adicionar todos os átomos de H na estrutura, de uma vez
+    if len(R3_H2_coords) > 0:
+        struct.append_arrays(elems=["H"] * len(R3_H2_coords), 
+                             coords=np.round(R3_H2_coords, decimals=8))
 
     # Gerar aquivo .xyz da estrutura
     struct.frame(output_path, ignore_charges=True)
@@ -0,0 +1,42 @@
+# Incluindo endereço do diretório mãe
+import sys
+sys.path.append("../" )
+
+import shutil
+import tempfile
+from pathlib import Path
+
+# Bibliotecas internas
+from dopings.config import dops_data, dirs_data, main_config
+from dopings.doping_set import DopingSet
+from dopings.opt_scheduler import OptScheduler
+
+###############################################################################
+
+# Testa o escalonamento das otimizações (OptScheduler) sem o DFTB+: os 
+# arquivos de um conjunto são escritos em uma árvore temporária e as 
+# otimizações rodam com o substituto dftb_standin.py. Ctrl-C durante a 
+# execução deve encerrar as otimizações que estão rodando sem iniciar 
+# as da fila
+
+# Árvore de otimizações temporária
+dirs_data["dopings_opt"] = Path(tempfile.mkdtemp(prefix="opt_dry_run_"))
+
+try:
+
+    # Escrever os arquivos de um conjunto de dopagens
+    set = DopingSet(dop_elem="N", dops_info=dops_data["graphine"], mode="write")
+
+    # Otimizar com o substituto do DFTB+
+    scheduler = OptScheduler(n_jobs=main_config.get("opt_jobs", 1), 
+                             threads_per_job=1, 
+                             bin_dir=Path("dftb_standin.py").resolve(),
+                             pin_cores=main_config.get("opt_pin_cores", True))
+
+    failed = scheduler.run(set.structs, overwrite=False, verbose=False, 
+                           skip_hard_to_conv_SCC=True, resume_unfineshed=False)
+
+    print(f"{len(set.structs) - len(failed)} finished, {len(failed)} failed")
+
+finally:
+    shutil.rmtree(dirs_data["dopings_opt"])
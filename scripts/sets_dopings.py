@@ -9,11 +9,19 @@ from dopings.doping_set import DopingSet
 
 ###############################################################################
 
+# Conjuntos de dopagens com arquivos a serem escritos
+sets = []
+
 # Para cada material
 for material in ["graphine", "graphene"]:
 
     # Para cada elemento
     for dop_elem in ["Al", "B", "Li", "Mg", "N", "Na", "O", "P", "Si", "Ti", "Zn"]:
 
-        # Escrever arquivos de um conjunto de dopagens
-        set = DopingSet(dop_elem = dop_elem, dops_info=dops_data[material], mode="write")
\ No newline at end of file
+        # Preparar os arquivos de um conjunto de dopagens
+        sets.append(DopingSet(dop_elem = dop_elem, dops_info=dops_data[material], 
+                              mode="write", defer_write=True))
+
+# Escrever os arquivos de todos os conjuntos de uma vez, em paralelo 
+# conforme "write_workers" de main_config.json
+DopingSet.write_sets(sets)
@@ -1,22 +1,44 @@
-
 # Incluindo endereço do diretório mãe
 import sys
 sys.path.append("../" )
 
 # Bibliotecas internas
-from dopings.config import dops_data
+from dopings.config import dops_data, main_config
 from dopings.doping_set import DopingSet
+from dopings.job_queue import JobQueue
 
 ###############################################################################
 
+# Fila de otimizações, persistente entre execuções
+queue = JobQueue()
+
+# Conjuntos de dopagens com arquivos a serem escritos
+sets = []
+
 # Para cada material
 for material in ["graphine", "graphene"]:
 
     # Para cada elemento
     for dop_elem in ["Al", "B", "Li", "Mg", "N", "Na", "O", "P", "Si", "Ti", "Zn"]:
 
-        # Escrever arquivos de um conjunto de dopagens
-        set = DopingSet(dop_elem = dop_elem, dops_info=dops_data[material], mode="write")
+        # Preparar os arquivos de um conjunto de dopagens
+        sets.append(DopingSet(dop_elem = dop_elem, dops_info=dops_data[material], 
+                              mode="write", queue=queue, defer_write=True))
+
+# Escrever os arquivos de todos os conjuntos de uma vez, e colocar as 
+# otimizações na fila
+DopingSet.write_sets(sets)
+
+# Otimizações já na fila mantêm o estado: tentar novamente as que 
+# falharam (erro, processo interrompido, ou não convergiu). Para tentar
+# também as encerradas por parada antecipada, usar 
+# states=("failed", "skipped")
+print(f"Retrying {queue.requeue(states=('failed',))} failed optimizations")
 
-        # Otimizar em fila as estruturas
-        set.map_opt(only_report=False, inverse_order=False, verbose=True)
\ No newline at end of file
+# Otimizar as estruturas da fila. Outros processos podem ajudar a 
+# esvaziá-la com sets_worker.py
+queue.drain(n_jobs=main_config.get("opt_jobs", 1), 
+            threads_per_job=main_config.get("opt_threads_per_job"),
+            pin_cores=main_config.get("opt_pin_cores", True),
+            overwrite=False, verbose=True, skip_hard_to_conv_SCC=True, 
+            resume_unfineshed=False)
@@ -0,0 +1,60 @@
+# Incluindo endereço do diretório mãe
+import sys
+sys.path.append("../" )
+
+# Bibliotecas internas
+from dopings.structure import Structure
+from dopings.doping_set import DopingSet
+from dopings.archive import DatasetArchive
+from dopings.struct_read import StructRead
+from dopings.config import dops_data, dirs_data
+
+###############################################################################
+
+# Gera o arquivo consolidado com todas as estruturas convergidas, lido por 
+# sets_proc.py e structs_proc.py sem percorrer os diretórios
+
+groups = {"dopings" : [], "bases" : [], "h2" : []}
+names = {"h2" : []}
+
+# Para cada material
+for material in ["graphine", "graphene"]:
+
+    # Para cada elemento
+    for dop_elem in ["Al", "B", "Li", "Mg", "N", "Na", "O", "P", "Si", "Ti", "Zn"]:
+
+        # Reportar início de leitura
+        print(f"Lendo {material}-{dop_elem}...")
+
+        # Ler conjunto (apenas estruturas convergidas)
+        set = DopingSet(dop_elem=dop_elem, dops_info=dops_data[material], 
+                        mode="read")
+
+        groups["dopings"] += set.structs
+
+    # Bases do material
+    for base, struct in set.bases.items():
+
+        struct.material = material
+        struct.base = base
+
+        groups["bases"].append(struct)
+
+# Estruturas com H2 geradas, identificadas pelo caminho relativo
+for xyz_path in sorted(dirs_data["h2_gen_output"].rglob("*.xyz")):
+
+    with open(xyz_path) as file:
+        lines = file.read().splitlines()
+
+    codes, coords, charges = StructRead.parse_frame(lines[2:])
+
+    struct = Structure()
+    struct.append_arrays(elems=codes, coords=coords, charges=charges)
+
+    groups["h2"].append(struct)
+    names["h2"].append(xyz_path.relative_to(dirs_data["h2_gen_output"]).with_suffix("").as_posix())
+
+# Escrevendo arquivo
+DatasetArchive.pack(dirs_data["dataset_archive"], groups, names=names)
+
+print(dirs_data["dataset_archive"])
@@ -4,13 +4,18 @@ import sys
 sys.path.append("../" )
 
 # Bibliotecas internas
-from dopings.config import dops_data
+from dopings.config import dops_data, dirs_data
+from dopings.archive import DatasetArchive
 from dopings.doping_set import DopingSet
 from dopings.graphine_viz import GraphineViz 
 from dopings.set_viz import SetViz 
 
 ########################################################################################
 
+# Arquivo consolidado (gerado por sets_pack.py), se existir e estiver 
+# atualizado em relação à árvore de otimizações
+archive = DatasetArchive.open_if_fresh(dirs_data["dataset_archive"])
+
 # Para cada material
 for material in ["graphine", "graphene"]:
 
@@ -25,7 +30,7 @@ for material in ["graphine", "graphene"]:
 
         # Ler conjunto e acumular na lista de conjuntos
         set = DopingSet(dop_elem=dop_elem, dops_info=dops_data[material], 
-                        mode="read")
+                        mode="read", archive=archive)
 
         sets.append(set)
 
@@ -48,4 +53,8 @@ for material in ["graphine", "graphene"]:
     # Gerar gráfico de energia por sítio
     SetViz.energ_site_graph(sets, second_var=None)     # Só energia
     SetViz.energ_site_graph(sets, second_var="dipole") # Correlação com dipolo
-    SetViz.energ_site_graph(sets, second_var="std")    # Correlação com std das cargas
\ No newline at end of file
+    SetViz.energ_site_graph(sets, second_var="std")    # Correlação com std das cargas
+
+    # Gravar no cache as propriedades lidas durante o processamento
+    for set in sets:
+        set.flush_cache()
\ No newline at end of file
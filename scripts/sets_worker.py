@@ -0,0 +1,28 @@
+# Incluindo endereço do diretório mãe
+import sys
+sys.path.append("../" )
+
+# Bibliotecas internas
+from dopings.job_queue import JobQueue
+from dopings.config import main_config
+
+###############################################################################
+
+# Retira otimizações da fila (preenchida por sets_opt.py) até esvaziá-la. 
+# Vários processos podem rodar este script ao mesmo tempo, e um processo 
+# interrompido pode ser simplesmente reiniciado
+
+queue = JobQueue()
+
+# Estado da fila
+print(queue.counts())
+
+# Otimizar, com até "opt_jobs" otimizações simultâneas
+queue.drain(n_jobs=main_config.get("opt_jobs", 1), 
+            threads_per_job=main_config.get("opt_threads_per_job"),
+            pin_cores=main_config.get("opt_pin_cores", True),
+            overwrite=False, verbose=True, skip_hard_to_conv_SCC=True, 
+            resume_unfineshed=False)
+
+# Estado final da fila
+print(queue.counts())
@@ -7,10 +7,15 @@ sys.path.append("../" )
 from dopings.structure import Structure
 from dopings.doping_set import DopingSet
 from dopings.struct_viz import StructViz
-from dopings.config import dops_data
+from dopings.archive import DatasetArchive
+from dopings.config import dops_data, dirs_data
 
 ###############################################################################
 
+# Arquivo consolidado (gerado por sets_pack.py), se existir e estiver 
+# atualizado em relação à árvore de otimizações
+archive = DatasetArchive.open_if_fresh(dirs_data["dataset_archive"])
+
 # Para cada material
 for material in ["graphine", "graphene"]:
 
@@ -18,7 +23,8 @@ for material in ["graphine", "graphene"]:
     for dop_elem in ["Al", "B", "Li", "Mg", "N", "Na", "O", "P", "Si", "Ti", "Zn"]:
 
         # Ler um conjunto de dopagens
-        set = DopingSet(dop_elem=dop_elem, dops_info=dops_data[material], mode="read")
+        set = DopingSet(dop_elem=dop_elem, dops_info=dops_data[material], mode="read",
+                        archive=archive)
         
         #### Gerar arquivos individuais para todas as estruturas
         set.map(method=Structure.output, suffix=".out")         # Output
@@ -28,4 +34,7 @@ for material in ["graphine", "graphene"]:
 
         #### Gerar arquivos CSV com todas as estruturas do conjunto
         set.map_to_csv(method=Structure.homo_lumo)              # CSV de homo-lumo
-        set.map_to_csv(method=Structure.formation_energy)       # CSV de energia de formação
\ No newline at end of file
+        set.map_to_csv(method=Structure.formation_energy)       # CSV de energia de formação
+
+        # Gravar no cache as propriedades lidas durante o processamento
+        set.flush_cache()
\ No newline at end of file
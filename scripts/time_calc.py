@@ -31,7 +31,16 @@ for material in ["graphine", "graphene"]:
 
         for struct in set.structs:
 
-            tempo = StructRead.read_time(struct)
+            # Resumo da otimização, e da anterior ao restart, se houver
+            log = StructRead.read_opt_log(struct)
+            restart_log = StructRead.read_opt_log(struct, restart=True)
+
+            tempo = log.wall_time if log is not None else None
+
+            # A parte anterior ao restart foi interrompida, e em geral 
+            # não tem o tempo total: conta como 0 nesse caso
+            if tempo is not None and restart_log is not None and restart_log.wall_time is not None:
+                tempo += restart_log.wall_time
 
             if tempo:
                 soma += tempo